@@ -0,0 +1,198 @@
+import logging
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence, compress_string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+logger = logging.getLogger("core.queries")
+
+
+class QueryRecorder:
+    """``execute_wrapper`` counting queries and their time on a connection."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+def resolved_view(request):
+    """Class (or function) of the view that served ``request``."""
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return None
+    func = match.func
+    return getattr(func, "view_class", None) or getattr(func, "cls", None) or func
+
+
+def view_name(request):
+    """Class (or function) name of the view that served ``request``."""
+    view = resolved_view(request)
+    return None if view is None else view.__name__
+
+
+class QueryMetricsMiddleware:
+    """
+    Count the SQL queries and database time of every request.
+
+    Totals are logged on ``core.queries`` tagged with the resolved view,
+    and with QUERY_METRICS_HEADERS (on by default under DEBUG) returned
+    as ``X-DB-Queries`` and ``Server-Timing`` headers.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        wrappers = [
+            connections[alias].execute_wrapper(recorder)
+            for alias in connections
+        ]
+        for wrapper in wrappers:
+            wrapper.__enter__()
+        try:
+            response = self.get_response(request)
+        finally:
+            for wrapper in reversed(wrappers):
+                wrapper.__exit__(None, None, None)
+
+        view = view_name(request)
+        duration_ms = recorder.duration * 1000
+        logger.debug(
+            "%s %s: %s queries in %.1fms",
+            view, request.path, recorder.count, duration_ms,
+            extra={
+                "view": view,
+                "db_queries": recorder.count,
+                "db_time_ms": duration_ms,
+            },
+        )
+
+        if settings.QUERY_METRICS_HEADERS:
+            response["X-DB-Queries"] = str(recorder.count)
+            response["Server-Timing"] = (
+                f'db;dur={duration_ms:.1f};desc="{recorder.count} queries"'
+            )
+        return response
+
+
+# -----------------------------
+# Response compression
+# -----------------------------
+
+def accepted_encodings(header):
+    """Content codings of an Accept-Encoding header not refused with q=0."""
+    accepted = set()
+    for part in header.split(","):
+        coding, *params = [item.strip() for item in part.split(";")]
+        refused = any(
+            param.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+            for param in params
+        )
+        if coding and not refused:
+            accepted.add(coding.lower())
+    return accepted
+
+
+# random gzip header padding against BREACH, as in Django's GZipMiddleware
+GZIP_MAX_RANDOM_BYTES = 100
+
+
+def gzip_string(content):
+    return compress_string(content, max_random_bytes=GZIP_MAX_RANDOM_BYTES)
+
+
+def gzip_sequence(sequence):
+    return compress_sequence(sequence, max_random_bytes=GZIP_MAX_RANDOM_BYTES)
+
+
+def brotli_string(content):
+    return brotli.compress(content, quality=settings.COMPRESSION_BROTLI_QUALITY)
+
+
+def brotli_sequence(sequence):
+    compressor = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+    for chunk in sequence:
+        data = compressor.process(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+# preferred first
+COMPRESSORS = {
+    "br": (brotli_string, brotli_sequence),
+    "gzip": (gzip_string, gzip_sequence),
+}
+
+
+class CompressionMiddleware:
+    """
+    Compress response bodies of at least COMPRESSION_MIN_SIZE bytes with
+    brotli (when installed) or gzip, whichever the client accepts first.
+    Streaming responses are compressed chunk by chunk.
+
+    Brotli has no room for random padding, so views whose responses
+    reflect user input next to secrets (tokens) set
+    ``compress_response = False`` and are sent uncompressed.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        if response.has_header("Content-Encoding"):
+            return response
+        if not getattr(resolved_view(request), "compress_response", True):
+            return response
+        if response.streaming:
+            if getattr(response, "is_async", False):
+                return response
+        elif len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = self.negotiate(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if encoding is None:
+            return response
+
+        compress, compress_stream = COMPRESSORS[encoding]
+        if response.streaming:
+            response.streaming_content = compress_stream(response.streaming_content)
+            del response["Content-Length"]
+        else:
+            response.content = compress(response.content)
+            response["Content-Length"] = str(len(response.content))
+
+        # the body is no longer byte for byte the one a strong ETag named
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        response["Content-Encoding"] = encoding
+        return response
+
+    @staticmethod
+    def negotiate(header):
+        accepted = accepted_encodings(header)
+        for encoding in COMPRESSORS:
+            if encoding in accepted and (encoding != "br" or brotli is not None):
+                return encoding
+        return None
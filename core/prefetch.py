@@ -0,0 +1,199 @@
+"""
+Query plans derived from serializers.
+
+``plan_queryset(queryset, serializer)`` walks the fields ``serializer``
+renders (nested serializers, dotted ``source=`` paths, ``many=True``
+relations) and returns ``queryset`` with the matching ``select_related()``,
+``prefetch_related()`` and ``only()``, so serializing any number of rows
+runs a fixed number of queries. ``PlannedQuerysetMixin`` applies it to
+generic list / retrieve views.
+
+Serializers describe what the walk cannot see:
+
+- ``method_sources = {"method_field": ("relation.column", ...)}``: the
+  paths a SerializerMethodField reads. A method field without an entry
+  loads every column of its model.
+- ``related_via = {"app_label.Model": "relation"}``: the serializer also
+  accepts that model and follows ``relation`` to its own (e.g.
+  ProductCardSerializer given a Product reads ``product.card``).
+
+Fields that are not model fields (properties, methods) load every column
+of their model, so ``only()`` never defers something the response reads.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework.relations import ManyRelatedField, RelatedField
+from rest_framework.serializers import (
+    BaseSerializer,
+    ListSerializer,
+    SerializerMethodField,
+)
+
+
+def _model_field(model, name):
+    """Field, reverse relation (by accessor name) or None."""
+    for relation in model._meta.related_objects:
+        if relation.get_accessor_name() == name:
+            return relation
+    try:
+        return model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+
+
+class Node:
+    """Columns and relations read from one model."""
+
+    def __init__(self, model, annotations=()):
+        self.model = model
+        self.annotations = set(annotations)
+        self.columns = {model._meta.pk.name}
+        self.all_columns = False
+        self.selected = {}
+        self.prefetched = {}
+
+    def relation(self, field):
+        """Node of relation ``field``, joined when single valued."""
+        if field.many_to_one or field.one_to_one:
+            if field.concrete:
+                name = field.name
+                self.columns.add(name)
+            else:
+                name = field.field.related_query_name()
+            nodes = self.selected
+        else:
+            name = field.get_accessor_name() if field.auto_created else field.name
+            nodes = self.prefetched
+
+        if name not in nodes:
+            nodes[name] = Node(field.related_model)
+            if field.auto_created and not field.many_to_many:
+                # the reverse side is matched on its foreign key
+                nodes[name].columns.add(field.field.name)
+        return nodes[name]
+
+    def only(self, prefix=""):
+        """``only()`` names of this node and the nodes joined to it."""
+        if self.all_columns:
+            columns = {field.name for field in self.model._meta.concrete_fields}
+        else:
+            columns = self.columns
+        names = {prefix + column for column in columns}
+        for name, node in self.selected.items():
+            names |= node.only(f"{prefix}{name}__")
+        return names
+
+    def select_related(self, prefix=""):
+        paths = []
+        for name, node in self.selected.items():
+            paths.append(prefix + name)
+            paths += node.select_related(f"{prefix}{name}__")
+        return paths
+
+    def prefetch_related(self, prefix=""):
+        lookups = [
+            Prefetch(prefix + name, queryset=node.apply(node.model._default_manager.all()))
+            for name, node in self.prefetched.items()
+        ]
+        for name, node in self.selected.items():
+            lookups += node.prefetch_related(f"{prefix}{name}__")
+        return lookups
+
+    def apply(self, queryset):
+        select = self.select_related()
+        if select:
+            queryset = queryset.select_related(*select)
+        prefetch = self.prefetch_related()
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset.only(*self.only())
+
+
+def _follow(node, attrs, field=None):
+    """Record reading ``attrs`` (a dotted source) through ``field``."""
+    *relations, last = attrs
+    for attr in relations:
+        model_field = _model_field(node.model, attr)
+        if model_field is None or not model_field.is_relation:
+            node.all_columns = True
+            return
+        node = node.relation(model_field)
+
+    if last in node.annotations:
+        return
+    model_field = _model_field(node.model, last)
+    if model_field is None:
+        node.all_columns = True
+        return
+
+    if isinstance(field, ManyRelatedField):
+        field = field.child_relation
+    pk_only = isinstance(field, RelatedField) and field.use_pk_only_optimization()
+    single = model_field.many_to_one or model_field.one_to_one
+    reads_id = pk_only or last == getattr(model_field, "attname", None)
+    if not model_field.is_relation or (reads_id and single and model_field.concrete):
+        # plain column, or the id of a foreign key
+        node.columns.add(model_field.name)
+        return
+
+    related = node.relation(model_field)
+    if isinstance(field, BaseSerializer):
+        _walk(field, related)
+    elif field is not None and not pk_only:
+        # e.g. a StringRelatedField rendering str(related object)
+        related.all_columns = True
+
+
+def _walk(serializer, node):
+    if isinstance(serializer, ListSerializer):
+        serializer = serializer.child
+
+    via = getattr(serializer, "related_via", {}).get(node.model._meta.label)
+    if via:
+        node = node.relation(_model_field(node.model, via))
+
+    method_sources = getattr(serializer, "method_sources", {})
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if isinstance(field, SerializerMethodField):
+            if name not in method_sources:
+                node.all_columns = True
+            for source in method_sources.get(name, ()):
+                _follow(node, source.split("."))
+        elif field.source == "*":
+            if isinstance(field, BaseSerializer):
+                _walk(field, node)
+            else:
+                node.all_columns = True
+        else:
+            _follow(node, field.source_attrs, field)
+
+
+def query_plan(serializer, queryset):
+    """Root Node of what ``serializer`` reads from the rows of ``queryset``."""
+    node = Node(queryset.model, annotations=queryset.query.annotations)
+    # cursor pagination reads the ordering columns off the last row
+    for ordering in queryset.query.order_by:
+        if isinstance(ordering, str) and "__" not in ordering:
+            name = ordering.lstrip("-")
+            if name not in ("pk", "?"):
+                _follow(node, [name])
+    _walk(serializer, node)
+    return node
+
+
+def plan_queryset(queryset, serializer):
+    """``queryset`` with the joins, prefetches and columns ``serializer`` needs."""
+    return query_plan(serializer, queryset).apply(queryset)
+
+
+class PlannedQuerysetMixin:
+    """
+    Generic views: ``filter_queryset`` (used by ``list`` and
+    ``get_object``) adds the query plan of the view's serializer.
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        return plan_queryset(queryset, self.get_serializer())
@@ -0,0 +1,87 @@
+"""
+pytest plugin asserting per-endpoint SQL query budgets.
+
+Budgets live in ``core/query_budgets.json`` as ``{"name": max_queries}``.
+Tests wrap a request in the ``query_budget`` fixture::
+
+    with query_budget("ProductListAPIView:subcategory"):
+        client.get("/api/products/", {"subcategory": slug})
+
+and fail when the block runs more queries than its budget. Run pytest
+with ``--update-query-budgets`` to write the observed counts back to the
+baseline after an intended change.
+"""
+import json
+from contextlib import contextmanager
+from pathlib import Path
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+BASELINE = Path(__file__).with_name("query_budgets.json")
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--update-query-budgets",
+        action="store_true",
+        help="Rewrite core/query_budgets.json with the observed query counts",
+    )
+
+
+def _load():
+    if BASELINE.exists():
+        return json.loads(BASELINE.read_text())
+    return {}
+
+
+def pytest_configure(config):
+    config._query_budgets = _load()
+    config._observed_query_budgets = {}
+
+
+def pytest_sessionfinish(session, exitstatus):
+    config = session.config
+    if not config.getoption("--update-query-budgets"):
+        return
+    observed = config._observed_query_budgets
+    if not observed:
+        return
+
+    budgets = {**_load(), **observed}
+    BASELINE.write_text(json.dumps(dict(sorted(budgets.items())), indent=2) + "\n")
+
+
+@pytest.fixture
+def query_budget(request):
+    config = request.config
+    update = config.getoption("--update-query-budgets")
+
+    @contextmanager
+    def check(name):
+        with CaptureQueriesContext(connection) as ctx:
+            yield ctx
+
+        count = len(ctx.captured_queries)
+        if update:
+            config._observed_query_budgets[name] = count
+            return
+
+        budget = config._query_budgets.get(name)
+        if budget is None:
+            pytest.fail(
+                f"No query budget for {name!r} ({count} queries); "
+                f"run pytest --update-query-budgets to record it"
+            )
+        if count > budget:
+            queries = "\n".join(
+                f"{i}. {query['sql']}"
+                for i, query in enumerate(ctx.captured_queries, start=1)
+            )
+            pytest.fail(
+                f"{name} ran {count} queries, budget is {budget}:\n{queries}"
+            )
+
+    return check
@@ -0,0 +1,63 @@
+"""
+Response renderers registered in REST_FRAMEWORK.
+
+ORJSONRenderer is a drop-in for DRF's JSONRenderer: same compact UTF-8
+output, and the types orjson does not handle natively (Decimal, lazy
+strings, querysets, ...) or that DRF formats its own way (datetimes end
+in ``Z``) go through DRF's encoder, so payloads are unchanged.
+
+MessagePackRenderer answers ``Accept: application/msgpack`` when msgpack
+is installed.
+"""
+import orjson
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+_encoder = JSONEncoder()
+
+ORJSON_OPTIONS = (
+    orjson.OPT_NON_STR_KEYS
+    | orjson.OPT_PASSTHROUGH_DATETIME
+    | orjson.OPT_SERIALIZE_NUMPY
+)
+
+
+def to_builtin(obj):
+    """What DRF's JSONEncoder turns ``obj`` into; used as ``default`` hook."""
+    return _encoder.default(obj)
+
+
+def orjson_dumps(data, indent=False):
+    options = ORJSON_OPTIONS | (orjson.OPT_INDENT_2 if indent else 0)
+    return orjson.dumps(data, default=to_builtin, option=options)
+
+
+class ORJSONRenderer(BaseRenderer):
+    media_type = "application/json"
+    format = "json"
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        # the browsable API asks for indented output
+        indent = (renderer_context or {}).get("indent")
+        return orjson_dumps(data, indent=bool(indent))
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return msgpack.packb(data, default=to_builtin, use_bin_type=True)
@@ -11,9 +11,10 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
 import os
+import importlib.util
 from pathlib import Path
 from datetime import timedelta
-from decouple import config
+from decouple import Csv, config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -44,6 +45,7 @@ INSTALLED_APPS = [
 	'django.contrib.sessions',
 	'django.contrib.messages',
 	'django.contrib.staticfiles',
+	'django.contrib.postgres',
 	"corsheaders",
 	'rest_framework',
 	"rest_framework_simplejwt.token_blacklist",
@@ -60,6 +62,7 @@ AUTH_USER_MODEL = "users.User"
 
 MIDDLEWARE = [
 	'django.middleware.security.SecurityMiddleware',
+	'core.middleware.CompressionMiddleware',
 	'django.contrib.sessions.middleware.SessionMiddleware',
 	'django.middleware.common.CommonMiddleware',
 	'django.middleware.csrf.CsrfViewMiddleware',
@@ -67,6 +70,7 @@ MIDDLEWARE = [
 	'django.contrib.messages.middleware.MessageMiddleware',
 	'django.middleware.clickjacking.XFrameOptionsMiddleware',
 	'corsheaders.middleware.CorsMiddleware',
+	'core.middleware.QueryMetricsMiddleware',
 ]
 
 ROOT_URLCONF = 'core.urls'
@@ -94,8 +98,22 @@ REST_FRAMEWORK = {
 	"DEFAULT_AUTHENTICATION_CLASSES": (
         "rest_framework_simplejwt.authentication.JWTAuthentication",
     ),
+	"DEFAULT_RENDERER_CLASSES": [
+		"core.renderers.ORJSONRenderer",
+		"rest_framework.renderers.BrowsableAPIRenderer",
+	],
+	"DEFAULT_PARSER_CLASSES": [
+		"rest_framework.parsers.JSONParser",
+		"rest_framework.parsers.FormParser",
+		"rest_framework.parsers.MultiPartParser",
+	],
 }
 
+# MessagePack bodies for clients sending/accepting application/msgpack
+if importlib.util.find_spec("msgpack") is not None:
+	REST_FRAMEWORK["DEFAULT_RENDERER_CLASSES"].append("core.renderers.MessagePackRenderer")
+	REST_FRAMEWORK["DEFAULT_PARSER_CLASSES"].append("core.parsers.MessagePackParser")
+
 WSGI_APPLICATION = 'core.wsgi.application'
 
 # Database
@@ -180,6 +198,67 @@ SIMPLE_JWT = {
 }
 
 
+CACHES = {
+	"default": {
+		"BACKEND": config(
+			"CACHE_BACKEND",
+			default="django.core.cache.backends.locmem.LocMemCache",
+		),
+		"LOCATION": config("CACHE_LOCATION", default="rubikon"),
+	}
+}
+
+# X-DB-Queries / Server-Timing headers of core.middleware.QueryMetricsMiddleware
+QUERY_METRICS_HEADERS = config("QUERY_METRICS_HEADERS", default=DEBUG, cast=bool)
+
+# Seconds a product list total is reused across pages of the same filters
+PRODUCT_COUNT_CACHE_TIMEOUT = config("PRODUCT_COUNT_CACHE_TIMEOUT", default=60, cast=int)
+
+# Bitmap filter index of ProductListAPIView (products/facets.py)
+FACET_INDEX_ENABLED = config("FACET_INDEX_ENABLED", default=True, cast=bool)
+
+# Product cards of lists, wishlist and cart built from values() rows
+# (products/card_rows.py) instead of ProductCardSerializer
+CARD_ROWS_ENABLED = config("CARD_ROWS_ENABLED", default=True, cast=bool)
+
+# Write-behind product view counter (products/view_buffer.py): views are
+# written every VIEW_BUFFER_FLUSH_INTERVAL seconds or VIEW_BUFFER_MAX_EVENTS views
+VIEW_BUFFER_FLUSH_INTERVAL = config("VIEW_BUFFER_FLUSH_INTERVAL", default=5, cast=float)
+VIEW_BUFFER_MAX_EVENTS = config("VIEW_BUFFER_MAX_EVENTS", default=1000, cast=int)
+VIEW_BUFFER_MAX_PENDING = config("VIEW_BUFFER_MAX_PENDING", default=100000, cast=int)
+
+# Seconds clients and proxies may cache product detail responses
+PRODUCT_DETAIL_CACHE_TIMEOUT = config("PRODUCT_DETAIL_CACHE_TIMEOUT", default=30, cast=int)
+
+# Trending rankings of the home page (products/trending.py)
+TRENDING_SIZE = config("TRENDING_SIZE", default=480, cast=int)
+TRENDING_WINDOW_DAYS = config("TRENDING_WINDOW_DAYS", default=7, cast=int)
+TRENDING_WEIGHTS = {
+	"sold": config("TRENDING_WEIGHT_SOLD", default=1.0, cast=float),
+	"recent_sold": config("TRENDING_WEIGHT_RECENT_SOLD", default=5.0, cast=float),
+	"recent_views": config("TRENDING_WEIGHT_RECENT_VIEWS", default=0.05, cast=float),
+}
+
+# Marketplace feeds written to MEDIA_ROOT/feeds/ (products/feeds.py)
+FEED_SHOP_NAME = config("FEED_SHOP_NAME", default="Rubikon")
+FEED_COMPANY = config("FEED_COMPANY", default="Rubikon")
+FEED_SITE_URL = config("FEED_SITE_URL", default="https://rubikon.live")
+FEED_PRODUCT_URL = config("FEED_PRODUCT_URL", default=FEED_SITE_URL + "/products/{slug}")
+FEED_MEDIA_URL = config("FEED_MEDIA_URL", default=FEED_SITE_URL + MEDIA_URL)
+FEED_CURRENCY = config("FEED_CURRENCY", default="RUB")
+
+# Responsive image variants (products/images.py): widths rendered for every
+# upload and threads rendering them after uploads
+IMAGE_VARIANT_WIDTHS = config("IMAGE_VARIANT_WIDTHS", default="320,640,1280", cast=Csv(int))
+IMAGE_VARIANT_WORKERS = config("IMAGE_VARIANT_WORKERS", default=2, cast=int)
+IMAGE_VARIANTS_ASYNC = config("IMAGE_VARIANTS_ASYNC", default=True, cast=bool)
+
+# core.middleware.CompressionMiddleware: smallest body worth compressing
+# (bytes) and the brotli quality (0-11) used when brotli is installed
+COMPRESSION_MIN_SIZE = config("COMPRESSION_MIN_SIZE", default=1024, cast=int)
+COMPRESSION_BROTLI_QUALITY = config("COMPRESSION_BROTLI_QUALITY", default=5, cast=int)
+
+
 # SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "http")
 FORCE_SCRIPT_NAME = os.environ.get("FORCE_SCRIPT_NAME", "")
 
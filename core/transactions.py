@@ -0,0 +1,49 @@
+from weakref import WeakValueDictionary
+
+from django.db import transaction
+
+
+class _DeferredBatch:
+    """on_commit callback calling ``func`` once with every collected id."""
+
+    def __init__(self, func, pending, key):
+        self.func = func
+        self.ids = set()
+        self.pending = pending
+        self.key = key
+
+    def __call__(self):
+        # ids deferred after this point start a new batch
+        if self.pending.get(self.key) is self:
+            del self.pending[self.key]
+        self.func(sorted(self.ids))
+
+
+def defer_for_ids(func, ids):
+    """
+    Call ``func(ids)`` once the current transaction commits.
+
+    Ids collected by several calls inside one atomic block are merged, so a
+    product saved together with its inlines is only processed once. Open
+    batches are tracked per connection and atomic block, weakly: when a
+    rollback drops a batch from the on_commit queue it is forgotten here
+    too, and ids deferred by an inner block never outlive its rollback.
+    """
+    ids = {pk for pk in ids if pk is not None}
+    if not ids:
+        return
+
+    connection = transaction.get_connection()
+    pending = connection.__dict__.setdefault("deferred_batches", WeakValueDictionary())
+    key = (func, tuple(connection.savepoint_ids))
+
+    batch = pending.get(key) if connection.in_atomic_block else None
+    if batch is not None:
+        batch.ids.update(ids)
+        return
+
+    batch = _DeferredBatch(func, pending, key)
+    batch.ids.update(ids)
+    if connection.in_atomic_block:
+        pending[key] = batch
+    transaction.on_commit(batch)
@@ -0,0 +1,62 @@
+# Generated by Django 5.1.3 on 2026-10-18 11:41
+
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def _keys(through, owner_column):
+    selections = defaultdict(list)
+    for owner_id, value_id in through.objects.values_list(owner_column, "filtervalue_id"):
+        selections[owner_id].append(value_id)
+    return {
+        owner_id: ",".join(str(pk) for pk in sorted(set(value_ids)))
+        for owner_id, value_ids in selections.items()
+    }
+
+
+def backfill_variant_keys(apps, schema_editor):
+    CartItem = apps.get_model("orders", "CartItem")
+    OrderItem = apps.get_model("orders", "OrderItem")
+
+    for model, owner_column in ((CartItem, "cartitem_id"), (OrderItem, "orderitem_id")):
+        keys = _keys(model.filter_values.through, owner_column)
+        items = list(model.objects.filter(id__in=keys).only("id"))
+        for item in items:
+            item.variant_key = keys[item.id]
+        model.objects.bulk_update(items, ["variant_key"], batch_size=1000)
+
+    # lines of the same variant were kept apart before; merge them into
+    # the oldest one so the unique constraint can be added
+    lines = defaultdict(list)
+    for item in CartItem.objects.order_by("id"):
+        lines[item.user_id, item.product_id, item.variant_key].append(item)
+    for first, *duplicates in lines.values():
+        if duplicates:
+            first.quantity += sum(item.quantity for item in duplicates)
+            first.save(update_fields=["quantity"])
+            CartItem.objects.filter(id__in=[item.id for item in duplicates]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_cartitem'),
+        ('products', '0016_image_variants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cartitem',
+            name='variant_key',
+            field=models.CharField(blank=True, default='', editable=False, help_text='Sorted ids of the selected filter values', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='variant_key',
+            field=models.CharField(blank=True, default='', editable=False, help_text='Sorted ids of the selected filter values', max_length=255),
+        ),
+        migrations.RunPython(backfill_variant_keys, migrations.RunPython.noop),
+    ]
@@ -6,6 +6,11 @@ from products.models import FilterValue
 from django.core.validators import MinValueValidator, MaxValueValidator
 
 
+def variant_key_for(filter_value_ids):
+    """Canonical key of a filter value selection: sorted unique ids, ``"3,8,12"``."""
+    return ",".join(str(pk) for pk in sorted({int(pk) for pk in filter_value_ids}))
+
+
 class Wishlist(models.Model):
     product = models.ForeignKey(
         Product,
@@ -64,6 +69,13 @@ class OrderItem(models.Model):
         related_name="order_items",
         help_text="Selected filter values",
     )
+    variant_key = models.CharField(
+        max_length=255,
+        blank=True,
+        default="",
+        editable=False,
+        help_text="Sorted ids of the selected filter values",
+    )
 
     def get_total(self):
         return self.price * self.quantity
@@ -79,6 +91,22 @@ class CartItem(models.Model):
         related_name="cart_items",
         help_text="Selected filter values",
     )
+    variant_key = models.CharField(
+        max_length=255,
+        blank=True,
+        default="",
+        editable=False,
+        help_text="Sorted ids of the selected filter values",
+    )
+
+    class Meta:
+        constraints = [
+            # one line per product variant, see orders/services.py add_to_cart
+            models.UniqueConstraint(
+                fields=["user", "product", "variant_key"],
+                name="cart_item_variant_unique",
+            ),
+        ]
 
     def get_total(self):
         return self.product.price * self.quantity
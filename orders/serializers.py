@@ -1,11 +1,20 @@
+from collections import defaultdict
+
 from rest_framework.serializers import ModelSerializer, SerializerMethodField
 from orders.models import CartItem
-from products.serializers import ProductSmallSerializer
+from products.card_rows import CardRows
+from products.serializers import ProductCardSerializer
 from orders.models import Order, OrderItem
 
 
+def cart_line_total(price, sale, quantity):
+    if sale:
+        price = price - (price * sale / 100)
+    return price * quantity
+
+
 class CartItemSerializer(ModelSerializer):
-    product = ProductSmallSerializer(read_only=True)
+    product = ProductCardSerializer(read_only=True)
     filter_values = SerializerMethodField()
     total = SerializerMethodField()
 
@@ -19,12 +28,14 @@ class CartItemSerializer(ModelSerializer):
             "total",
         )
 
+    # columns read by the method fields (core/prefetch.py)
+    method_sources = {
+        "filter_values": ("filter_values.value", "filter_values.value_ru"),
+        "total": ("product.price", "product.sale"),
+    }
+
     def get_total(self, obj):
-        price = obj.product.price
-        if obj.product.sale:
-            price = price - (price * obj.product.sale / 100)
-        total = price * obj.quantity
-        return total
+        return cart_line_total(obj.product.price, obj.product.sale, obj.quantity)
 
     def get_filter_values(self, obj):
         return [
@@ -37,9 +48,66 @@ class CartItemSerializer(ModelSerializer):
         ]
 
 
+def cart_items_data(items, context=None):
+    """
+    ``CartItemSerializer(items, many=True).data`` read from ``values()``
+    rows, cards included (products/card_rows.py). With a side-loading
+    ``context`` the taxonomy of the cards ends up in ``cards.included``.
+
+    Returns ``(data, included)``.
+    """
+    cards = CardRows(
+        context or {},
+        prefix="product__card__",
+        product_column="product_id",
+    )
+    rows = list(items.values(
+        "id",
+        "quantity",
+        "product_id",
+        "product__price",
+        "product__sale",
+        *cards.columns,
+    ))
+
+    filter_values = defaultdict(list)
+    if rows:
+        links = (
+            CartItem.filter_values.through.objects
+            .filter(cartitem_id__in=[row["id"] for row in rows])
+            .order_by("id")
+            .values_list(
+                "cartitem_id",
+                "filtervalue_id",
+                "filtervalue__value",
+                "filtervalue__value_ru",
+            )
+        )
+        for item_id, value_id, value, value_ru in links:
+            filter_values[item_id].append({
+                "id": value_id,
+                "name": value,
+                "name_ru": value_ru,
+            })
+
+    data = [
+        {
+            "id": row["id"],
+            "product": cards(row),
+            "quantity": row["quantity"],
+            "filter_values": filter_values[row["id"]],
+            "total": cart_line_total(
+                row["product__price"], row["product__sale"], row["quantity"]
+            ),
+        }
+        for row in rows
+    ]
+    return data, cards.included
+
+
 class OrderItemSerializer(ModelSerializer):
     filter_values = SerializerMethodField()
-    product = ProductSmallSerializer()
+    product = ProductCardSerializer()
 
     class Meta:
         model = OrderItem
@@ -53,6 +121,11 @@ class OrderItemSerializer(ModelSerializer):
             "filter_values",
         )
 
+    # columns read by the method fields (core/prefetch.py)
+    method_sources = {
+        "filter_values": ("filter_values.value", "filter_values.value_ru"),
+    }
+
     def get_filter_values(self, obj):
         return [
             {
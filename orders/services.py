@@ -1,54 +1,137 @@
+from collections import Counter, defaultdict
+
 from orders.models import Order, OrderItem, OrderStatus
-from orders.models import CartItem
-from django.db import transaction
+from orders.models import CartItem, variant_key_for
+from django.db import connection, transaction
 from decimal import Decimal
+from products.services import record_product_sales
+
+
+def _upsert_cart_line_sql():
+    meta = CartItem._meta
+    quote = connection.ops.quote_name
+    table = quote(meta.db_table)
+    user, product, quantity, key = (
+        quote(meta.get_field(name).column)
+        for name in ("user", "product", "quantity", "variant_key")
+    )
+    if connection.vendor == "postgresql":
+        # xmax is only 0 on a row version this statement inserted
+        inserted = "(xmax = 0)"
+    else:
+        # no xmax (SQLite test runs): a fresh line holds exactly the quantity
+        inserted = f"{table}.{quantity} = %(quantity)s"
+    return (
+        f"INSERT INTO {table} ({user}, {product}, {quantity}, {key}) "
+        f"VALUES (%(user)s, %(product)s, %(quantity)s, %(key)s) "
+        f"ON CONFLICT ({user}, {product}, {key}) "
+        f"DO UPDATE SET {quantity} = {table}.{quantity} + EXCLUDED.{quantity} "
+        f"RETURNING {quote(meta.pk.column)}, {inserted}"
+    )
+
+
+@transaction.atomic
+def add_to_cart(user, product_id, quantity, filter_value_ids=()):
+    """
+    Add ``quantity`` of a product variant to ``user``'s cart in one
+    statement, whatever the size of the cart: the line of the same
+    ``(product, variant_key)`` is incremented, or a new one inserted. Racing
+    requests for the same variant meet on the unique constraint instead of
+    creating duplicate lines.
+
+    Returns ``(cart_item_id, created)``.
+    """
+    filter_value_ids = sorted({int(pk) for pk in filter_value_ids})
+    with connection.cursor() as cursor:
+        cursor.execute(_upsert_cart_line_sql(), {
+            "user": user.pk,
+            "product": product_id,
+            "quantity": quantity,
+            "key": variant_key_for(filter_value_ids),
+        })
+        item_id, created = cursor.fetchone()
+
+    created = bool(created)
+    if created and filter_value_ids:
+        Through = CartItem.filter_values.through
+        Through.objects.bulk_create(
+            Through(cartitem_id=item_id, filtervalue_id=pk)
+            for pk in filter_value_ids
+        )
+    return item_id, created
 
 
 @transaction.atomic
 def create_order_from_cart(user, note=""):
-    cart_items = (
+    """
+    Turn ``user``'s cart into an order in a fixed number of queries,
+    whatever the number of lines: order items and their filter values are
+    bulk inserted and the sales are applied to the statistics in one
+    aggregated update per table.
+    """
+    cart_items = list(
         CartItem.objects
-        .select_related("product")
-        .prefetch_related("filter_values")
         .filter(user=user)
+        .select_related("product")
+        .only("id", "quantity", "variant_key", "product__price", "product__sale")
+        .select_for_update(of=("self",))
+        .order_by("id")
     )
 
-    if not cart_items.exists():
+    if not cart_items:
         raise ValueError("Cart is empty")
 
-    total = Decimal("0.00")
+    Through = CartItem.filter_values.through
+    filter_values = defaultdict(list)
+    for item_id, value_id in (
+        Through.objects
+        .filter(cartitem_id__in=[item.id for item in cart_items])
+        .order_by("id")
+        .values_list("cartitem_id", "filtervalue_id")
+    ):
+        filter_values[item_id].append(value_id)
 
-    order = Order.objects.create(
-        buyer=user,
-        status=OrderStatus.PLACED,
-        total=0,
-        note=note,
-    )
+    total = Decimal("0.00")
+    lines = []
+    sold = Counter()
 
     for item in cart_items:
         product = item.product
         price = product.price
         sale = product.sale or 0
 
-        order_item = OrderItem.objects.create(
-            order=order,
+        lines.append(OrderItem(
             product=product,
             price=price,
             quantity=item.quantity,
             sale=sale,
-        )
+            variant_key=item.variant_key,
+        ))
+        sold[product.id] += item.quantity
 
         if sale:
             price = price - (price * Decimal(sale) / Decimal(100))
-        line_total = price * item.quantity
-        total += line_total
+        total += price * item.quantity
+
+    order = Order.objects.create(
+        buyer=user,
+        status=OrderStatus.PLACED,
+        total=total,
+        note=note,
+    )
+    for line in lines:
+        line.order = order
+    lines = OrderItem.objects.bulk_create(lines)
+
+    OrderItem.filter_values.through.objects.bulk_create([
+        OrderItem.filter_values.through(orderitem_id=line.id, filtervalue_id=value_id)
+        for line, item in zip(lines, cart_items)
+        for value_id in filter_values[item.id]
+    ])
 
-        if item.filter_values.exists():
-            order_item.filter_values.set(item.filter_values.all())
-    print(total)
-    order.total = total
-    order.save(update_fields=["total"])
+    # bulk_create sends no post_save: record every sale at once
+    record_product_sales(sold)
 
-    cart_items.delete()
+    CartItem.objects.filter(id__in=[item.id for item in cart_items]).delete()
 
     return order
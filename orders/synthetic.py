@@ -0,0 +1,161 @@
+import random
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+
+from products.models import Product
+from users.models import User
+from .models import CartItem, Order, OrderItem, OrderStatus, Wishlist, variant_key_for
+
+
+SYNTHETIC_PASSWORD = "Synthetic-Passw0rd"
+
+ORDER_STATUSES = (
+    OrderStatus.PLACED,
+    OrderStatus.CONFIRMED,
+    OrderStatus.COMPLETED,
+    OrderStatus.CANCELLED,
+)
+
+
+def _line_total(price, sale, quantity):
+    if sale:
+        price = price - (price * Decimal(sale) / Decimal(100))
+    return price * quantity
+
+
+def _products(product_ids, batch_size):
+    """``{id: (price, sale, [filter value ids])}`` of ``product_ids``."""
+    products = {}
+    through = Product.filters.through
+    product_ids = list(product_ids)
+
+    for start in range(0, len(product_ids), batch_size):
+        chunk = product_ids[start:start + batch_size]
+        for pk, price, sale in (
+            Product.objects.filter(id__in=chunk).values_list("id", "price", "sale")
+        ):
+            products[pk] = (price, sale or 0, [])
+        for product_id, value_id in (
+            through.objects
+            .filter(product_id__in=chunk)
+            .values_list("product_id", "filtervalue_id")
+        ):
+            products[product_id][2].append(value_id)
+
+    return products
+
+
+def generate_customers(
+    product_ids,
+    users=100,
+    cart_items=3,
+    wishlist_items=3,
+    orders=2,
+    order_items=3,
+    seed=0,
+    batch_size=2000,
+):
+    """
+    Bulk insert synthetic customers with carts, wishlists and order
+    history over ``product_ids`` and return the new users.
+
+    Everything but ``users`` is per user. Every user logs in with their
+    email and SYNTHETIC_PASSWORD, hashed once for all of them.
+    """
+    rnd = random.Random(seed)
+    password = make_password(SYNTHETIC_PASSWORD)
+
+    user_objs = User.objects.bulk_create([
+        User(
+            username=f"synthetic-{seed}-{i}@example.com",
+            email=f"synthetic-{seed}-{i}@example.com",
+            first_name=f"Customer {i}",
+            password=password,
+        )
+        for i in range(users)
+    ], batch_size=batch_size)
+
+    picks = {
+        user.id: {
+            "cart": rnd.sample(product_ids, min(cart_items, len(product_ids))),
+            "wishlist": rnd.sample(product_ids, min(wishlist_items, len(product_ids))),
+            "orders": [
+                rnd.sample(product_ids, min(order_items, len(product_ids)))
+                for _ in range(orders)
+            ],
+        }
+        for user in user_objs
+    }
+    products = _products(
+        {
+            product_id
+            for user_picks in picks.values()
+            for product_id in (
+                user_picks["cart"]
+                + [pk for order in user_picks["orders"] for pk in order]
+            )
+        },
+        batch_size,
+    )
+
+    Wishlist.objects.bulk_create([
+        Wishlist(user_id=user_id, product_id=product_id)
+        for user_id, user_picks in picks.items()
+        for product_id in user_picks["wishlist"]
+    ], batch_size=batch_size)
+
+    cart_objs = CartItem.objects.bulk_create([
+        CartItem(
+            user_id=user_id,
+            product_id=product_id,
+            quantity=rnd.randint(1, 3),
+            variant_key=variant_key_for(products[product_id][2]),
+        )
+        for user_id, user_picks in picks.items()
+        for product_id in user_picks["cart"]
+    ], batch_size=batch_size)
+    CartItem.filter_values.through.objects.bulk_create([
+        CartItem.filter_values.through(cartitem_id=item.id, filtervalue_id=value_id)
+        for item in cart_objs
+        for value_id in products[item.product_id][2]
+    ], batch_size=batch_size)
+
+    order_lines = []
+    order_objs = []
+    for user_id, user_picks in picks.items():
+        for order_products in user_picks["orders"]:
+            lines = [
+                (product_id, rnd.randint(1, 3))
+                for product_id in order_products
+            ]
+            order_lines.append(lines)
+            order_objs.append(Order(
+                buyer_id=user_id,
+                status=rnd.choice(ORDER_STATUSES),
+                total=sum(
+                    _line_total(*products[product_id][:2], quantity)
+                    for product_id, quantity in lines
+                ),
+            ))
+    order_objs = Order.objects.bulk_create(order_objs, batch_size=batch_size)
+
+    item_objs = OrderItem.objects.bulk_create([
+        OrderItem(
+            order_id=order.id,
+            product_id=product_id,
+            price=products[product_id][0],
+            sale=products[product_id][1],
+            quantity=quantity,
+            variant_key=variant_key_for(products[product_id][2]),
+        )
+        for order, lines in zip(order_objs, order_lines)
+        for product_id, quantity in lines
+    ], batch_size=batch_size)
+    OrderItem.filter_values.through.objects.bulk_create([
+        OrderItem.filter_values.through(orderitem_id=item.id, filtervalue_id=value_id)
+        for item in item_objs
+        for value_id in products[item.product_id][2]
+    ], batch_size=batch_size)
+
+    return user_objs
@@ -1,3 +1,193 @@
-from django.test import TestCase
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from orders.models import CartItem, Wishlist
+from orders.services import create_order_from_cart
+from products.models import Product, ProductCard, ProductStatistic
+from products.synthetic import generate_catalog
+from users.models import User
+
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def client():
+    return APIClient()
+
+
+@pytest.fixture
+def buyer(client):
+    user = User.objects.create_user(username="buyer", password="secret")
+    client.force_authenticate(user)
+
+    generate_catalog(products=10, categories=1, subcategories=1, seed=2)
+    for product in Product.objects.prefetch_related("filters"):
+        item = CartItem.objects.create(user=user, product=product, quantity=2)
+        item.filter_values.set(product.filters.all())
+    return user
+
+
+def test_cart_query_budget(client, buyer, query_budget):
+    with query_budget("CartListAPIView"):
+        response = client.get("/api/orders/cart/")
+    assert response.status_code == 200
+    assert len(response.json()) == 10
+
+
+def test_order_query_budget(client, buyer, query_budget):
+    order = create_order_from_cart(buyer)
+
+    with query_budget("OrderListAPIView"):
+        response = client.get("/api/orders/")
+    assert response.status_code == 200
+
+    with query_budget("OrderRetrieveAPIView"):
+        response = client.get(f"/api/orders/{order.id}/")
+    assert response.status_code == 200
+    assert len(response.json()["items"]) == 10
+
+
+def test_cart_card_rows_match_serializer(client, buyer, settings):
+    def cart(**params):
+        data = client.get("/api/orders/cart/", params).json()
+        items = data["results"] if params else data
+        for item in items:
+            item["filter_values"].sort(key=lambda value: value["id"])
+        return data
+
+    settings.CARD_ROWS_ENABLED = True
+    fast = cart()
+    side_loaded = cart(include="category")
+    settings.CARD_ROWS_ENABLED = False
+    assert fast == cart()
+    assert side_loaded == cart(include="category")
+    assert all(item["filter_values"] for item in fast)
+
+
+def test_side_loaded_orders(client, buyer):
+    order = create_order_from_cart(buyer)
+
+    nested = client.get(f"/api/orders/{order.id}/").json()
+    side_loaded = client.get(f"/api/orders/{order.id}/", {"include": "category"}).json()
+    subcategory = nested["items"][0]["product"]["category"]
+    assert list(side_loaded["included"]["subcategories"]) == [str(subcategory["id"])]
+    category_id = str(subcategory["category"]["id"])
+    assert list(side_loaded["included"]["categories"]) == [category_id]
+    assert all(
+        item["product"]["category_id"] == subcategory["id"]
+        and "category" not in item["product"]
+        for item in side_loaded["items"]
+    )
+
+    listed = client.get("/api/orders/", {"include": "category"}).json()
+    assert listed["results"][0]["items"] == side_loaded["items"]
+    assert listed["included"] == side_loaded["included"]
+
+
+def test_planned_query_counts_do_not_grow_with_rows(client, settings):
+    # the serializer paths, whose queries come from core/prefetch.py
+    settings.CARD_ROWS_ENABLED = False
+    generate_catalog(products=10, categories=1, subcategories=1, seed=4)
+    products = list(Product.objects.prefetch_related("filters"))
+
+    def fill_cart(user, products):
+        for product in products:
+            item = CartItem.objects.create(user=user, product=product, quantity=1)
+            item.filter_values.set(product.filters.all())
+
+    def shop(username, products):
+        user = User.objects.create_user(username=username, password="secret")
+        fill_cart(user, products)
+        order = create_order_from_cart(user)
+        fill_cart(user, products)
+        Wishlist.objects.bulk_create(
+            Wishlist(user=user, product=product) for product in products
+        )
+
+        client.force_authenticate(user)
+        counts = {}
+        for url in (
+            "/api/orders/cart/",
+            "/api/orders/",
+            f"/api/orders/{order.id}/",
+            "/api/users/wishlist/",
+        ):
+            with CaptureQueriesContext(connection) as ctx:
+                assert client.get(url).status_code == 200
+            counts[url.replace(str(order.id), "<id>")] = len(ctx)
+        return counts
+
+    assert shop("one", products[:1]) == shop("ten", products)
+
+
+def test_add_to_cart_upserts_the_variant_line(client, buyer):
+    product = Product.objects.prefetch_related("filters").first()
+    values = sorted(value.id for value in product.filters.all())
+    line = CartItem.objects.get(user=buyer, product=product)
+    assert line.variant_key == ",".join(map(str, values))
+
+    def add(filter_values, quantity=1):
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.post("/api/orders/cart/add/", {
+                "product": product.id,
+                "quantity": quantity,
+                "filter_values": filter_values,
+            }, format="json")
+        return response, len(ctx)
+
+    # same selection in any order increments the existing line
+    response, queries = add(values[::-1], quantity=3)
+    assert response.status_code == 200
+    assert response.json()["id"] == line.id
+    line.refresh_from_db()
+    assert line.quantity == 5
+
+    # another selection is a line of its own
+    response, _ = add(values[:1])
+    assert response.status_code == 201
+    assert [value["id"] for value in response.json()["filter_values"]] == values[:1]
+    assert CartItem.objects.filter(user=buyer, product=product).count() == 2
+
+    # the upsert does not read the rest of the cart
+    CartItem.objects.filter(user=buyer).exclude(product=product).delete()
+    assert add(values)[1] == queries
+
+
+def test_checkout_query_count_does_not_grow_with_lines(client):
+    generate_catalog(products=10, categories=1, subcategories=2, seed=5)
+    products = list(Product.objects.prefetch_related("filters").order_by("id"))
+    sold = dict(ProductCard.objects.values_list("product_id", "sold"))
+
+    def checkout(username, products):
+        user = User.objects.create_user(username=username, password="secret")
+        for product in products:
+            item = CartItem.objects.create(user=user, product=product, quantity=2)
+            item.filter_values.set(product.filters.all())
+
+        client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.post("/api/orders/checkout/", {"note": "fast"})
+        assert response.status_code == 201
+        return response.json(), len(ctx)
+
+    # first sales put the products in the trending rankings; after that
+    # every checkout takes the same path
+    checkout("first", products)
+    _, one = checkout("one", products[:1])
+    order, ten = checkout("ten", products)
+    assert one == ten
+
+    assert len(order["items"]) == 10
+    assert all(item["filter_values"] for item in order["items"])
+    assert not CartItem.objects.filter(user__username="ten").exists()
+    # 2 of every product in "first" and "ten", 2 more of the first one in "one"
+    sold[products[0].id] += 2
+    assert dict(ProductCard.objects.values_list("product_id", "sold")) == {
+        pk: count + 4 for pk, count in sold.items()
+    }
+    assert dict(ProductStatistic.objects.values_list("product_id", "sold")) == {
+        pk: count + 4 for pk, count in sold.items()
+    }
@@ -3,26 +3,40 @@ from rest_framework.response import Response
 from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
+from django.conf import settings
 from django.db import transaction
+from core.prefetch import plan_queryset
 from .models import Order, OrderItem, OrderStatus, CartItem
 from .serializers import OrderSerializer
-from .services import create_order_from_cart
+from .services import add_to_cart, create_order_from_cart
 from .models import CartItem
 from products.models import Product, FilterValue
-from .serializers import CartItemSerializer
+from products.sideload import new_included, request_includes, side_load_items
+from .serializers import CartItemSerializer, cart_items_data
 
 
 class CartListAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        items = (
-            CartItem.objects
-            .filter(user=request.user)
-            .select_related("product")
-            .prefetch_related("filter_values")
-        )
-        return Response(CartItemSerializer(items, many=True).data)
+        include = request_includes(request)
+        items = CartItem.objects.filter(user=request.user).order_by("id")
+
+        # cards straight from values() rows
+        if settings.CARD_ROWS_ENABLED:
+            data, included = cart_items_data(items, {"include": include})
+        else:
+            items = plan_queryset(items, CartItemSerializer())
+            data = CartItemSerializer(items, many=True).data
+            included = None
+            if "category" in include:
+                included = new_included()
+                data = side_load_items(data, included)
+
+        # 🧩 ?include=category
+        if included is not None:
+            return Response({"results": data, "included": included})
+        return Response(data)
 
 
 class CartAddAPIView(APIView):
@@ -33,32 +47,24 @@ class CartAddAPIView(APIView):
         quantity = int(request.data.get("quantity", 1))
         filter_ids = request.data.get("filter_values", [])
 
-        product = Product.objects.get(id=product_id)
-        filters = FilterValue.objects.filter(id__in=filter_ids)
-
-        # check existing cart item with same filters
-        existing = (
-            CartItem.objects
-            .filter(user=request.user, product=product)
-            .prefetch_related("filter_values")
-        )
-
-        for item in existing:
-            if set(item.filter_values.all()) == set(filters):
-                item.quantity += quantity
-                item.save()
-                return Response(CartItemSerializer(item).data)
-
-        item = CartItem.objects.create(
-            user=request.user,
-            product=product,
-            quantity=quantity,
-        )
-        item.filter_values.set(filters)
+        if quantity <= 0:
+            raise ValidationError({"quantity": "Must be at least 1"})
+        if not Product.objects.filter(id=product_id).exists():
+            raise ValidationError({"product": "Invalid product"})
+        filter_ids = FilterValue.objects.filter(
+            id__in=filter_ids
+        ).values_list("id", flat=True)
+
+        # one upsert on (user, product, variant_key), whatever the cart size
+        item_id, created = add_to_cart(request.user, product_id, quantity, filter_ids)
+        item = plan_queryset(
+            CartItem.objects.filter(user=request.user),
+            CartItemSerializer(),
+        ).get(id=item_id)
 
         return Response(
             CartItemSerializer(item).data,
-            status=status.HTTP_201_CREATED,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
         )
 
 
@@ -68,7 +74,10 @@ class CartUpdateAPIView(APIView):
     def patch(self, request, pk):
         quantity = int(request.data.get("quantity"))
 
-        item = CartItem.objects.get(id=pk, user=request.user)
+        item = plan_queryset(
+            CartItem.objects.filter(user=request.user),
+            CartItemSerializer(),
+        ).get(id=pk)
 
         if quantity <= 0:
             item.delete()
@@ -163,6 +172,10 @@ class CheckoutAPIView(APIView):
         except ValueError as e:
             raise ValidationError(str(e))
 
+        order = plan_queryset(
+            Order.objects.filter(pk=order.pk),
+            OrderSerializer(),
+        ).get()
         return Response(
             OrderSerializer(order).data,
             status=201,
@@ -173,21 +186,40 @@ class OrderListAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        orders = (
-            Order.objects
-            .filter(buyer=request.user)
-            .prefetch_related("items__filter_values")
-            .order_by("-created_at")
+        orders = plan_queryset(
+            Order.objects.filter(buyer=request.user).order_by("-created_at"),
+            OrderSerializer(),
         )
-        return Response(OrderSerializer(orders, many=True).data)
+        data = OrderSerializer(orders, many=True).data
+
+        # 🧩 ?include=category
+        if "category" in request_includes(request):
+            included = new_included()
+            data = [
+                {**order, "items": side_load_items(order["items"], included)}
+                for order in data
+            ]
+            return Response({"results": data, "included": included})
+        return Response(data)
 
 
 class OrderRetrieveAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, pk):
-        order = Order.objects.prefetch_related(
-            "items__filter_values"
-        ).get(id=pk, buyer=request.user)
-
-        return Response(OrderSerializer(order).data)
+        order = plan_queryset(
+            Order.objects.filter(buyer=request.user),
+            OrderSerializer(),
+        ).get(id=pk)
+
+        data = OrderSerializer(order).data
+
+        # 🧩 ?include=category
+        if "category" in request_includes(request):
+            included = new_included()
+            data = {
+                **data,
+                "items": side_load_items(data["items"], included),
+                "included": included,
+            }
+        return Response(data)
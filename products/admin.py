@@ -1,4 +1,12 @@
-from django.contrib import admin
+import io
+
+from django import forms
+from django.contrib import admin, messages
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+
+from .importer import READERS, detect_format, import_products
 from .models import (
     Product,
     Category,
@@ -14,7 +22,71 @@ from .models import (
 )
 
 
-admin.site.register(Product)
+class ProductImportForm(forms.Form):
+    file = forms.FileField(help_text="CSV or JSON lines, see products.importer")
+    format = forms.ChoiceField(
+        choices=[("", "From the file extension")]
+        + [(name, name) for name in sorted(READERS)],
+        required=False,
+    )
+
+    def clean(self):
+        cleaned = super().clean()
+        upload = cleaned.get("file")
+        if upload and not cleaned.get("format"):
+            try:
+                cleaned["format"] = detect_format(upload.name)
+            except ValueError as e:
+                raise forms.ValidationError(str(e))
+        return cleaned
+
+
+@admin.register(Product)
+class ProductAdmin(admin.ModelAdmin):
+    change_list_template = "admin/products/product/change_list.html"
+
+    def get_urls(self):
+        return [
+            path(
+                "import/",
+                self.admin_site.admin_view(self.import_view),
+                name="products_product_import",
+            ),
+        ] + super().get_urls()
+
+    def import_view(self, request):
+        if not self.has_add_permission(request):
+            return redirect("admin:products_product_changelist")
+
+        form = ProductImportForm(request.POST or None, request.FILES or None)
+        if request.method == "POST" and form.is_valid():
+            upload = form.cleaned_data["file"]
+            # streamed from the upload's temporary file, not read into memory
+            stream = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+            report = import_products(stream, form.cleaned_data["format"])
+
+            messages.success(
+                request,
+                f"Imported {report['rows']} rows: {report['created']} created, "
+                f"{report['updated']} updated, {report['failed']} failed "
+                f"({report['rows_per_second']} rows/s)",
+            )
+            for error in report["errors"]:
+                messages.warning(request, f"Row {error['row']}: {error['error']}")
+            return redirect("admin:products_product_changelist")
+
+        return TemplateResponse(
+            request,
+            "admin/products/product/import.html",
+            {
+                **self.admin_site.each_context(request),
+                "opts": self.model._meta,
+                "form": form,
+                "title": "Import products",
+            },
+        )
+
+
 admin.site.register(Category)
 admin.site.register(SubCategory)
 admin.site.register(ProductImage)
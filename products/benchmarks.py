@@ -0,0 +1,778 @@
+import itertools
+import math
+import statistics
+import time
+
+from django.db import connection
+from django.db.models import Q, Count, Case, When, F, FilteredRelation
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.middleware import COMPRESSORS, brotli
+from core.renderers import MessagePackRenderer, ORJSONRenderer, msgpack
+from orders import urls as orders_urls
+from orders.models import CartItem, Order
+from orders.synthetic import SYNTHETIC_PASSWORD, generate_customers
+from users import urls as users_urls
+from users.models import User
+from . import urls as products_urls
+from .card_rows import CardRows
+from .feeds import build_feeds
+from .importer import ProductImporter
+from .models import Product, ProductCard, SubCategory
+from .plans import check_hot_queries
+from .search import search_products
+from .synthetic import generate_catalog
+from .trending import refresh_trending
+from .serializers import (
+    ProductBigSerializer,
+    ProductCardSerializer,
+    ProductSmallSerializer,
+)
+
+
+PAGE_SIZE = 48
+
+
+def seed_shop(products, seed=0):
+    """The catalog, customers and rankings every benchmark run starts from."""
+    product_ids = generate_catalog(products=products, reviews=3, seed=seed)
+    generate_customers(product_ids, users=max(10, products // 100), seed=seed)
+    refresh_trending()
+    return product_ids
+
+
+def measure(func, repeat=20):
+    """Run ``func`` ``repeat`` times; latency percentiles and query count."""
+    timings = []
+    queries = 0
+
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        queries = len(ctx.captured_queries)
+
+    return {**percentiles(timings), "queries": queries}
+
+
+def percentiles(timings):
+    timings = sorted(timings)
+    return {
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[math.ceil(0.95 * len(timings)) - 1], 3),
+    }
+
+
+# -----------------------------
+# search
+# -----------------------------
+
+def _legacy_search_page(q):
+    """The icontains queries both search endpoints ran before the index."""
+    subcategory = (
+        SubCategory.objects
+        .annotate(
+            relevance=Case(
+                When(name__iexact=q, then=3),
+                When(name_ru__iexact=q, then=3),
+                When(name__icontains=q, then=2),
+                When(name_ru__icontains=q, then=2),
+                default=0,
+            )
+        )
+        .filter(relevance__gt=0)
+        .order_by("-relevance")
+        .first()
+    )
+    SubCategory.objects.filter(
+        Q(name__icontains=q) | Q(name_ru__icontains=q)
+        | Q(product__name__icontains=q) | Q(product__name_ru__icontains=q)
+    ).annotate(
+        product_hits=Count(
+            "product",
+            filter=Q(product__name__icontains=q) | Q(product__name_ru__icontains=q),
+            distinct=True,
+        )
+    ).order_by("-product_hits").first()
+
+    if subcategory:
+        list(Product.objects.filter(category=subcategory).order_by("-created_at")[:PAGE_SIZE])
+
+
+def _indexed_search_page(q):
+    list(search_products(q).order_by("-search_rank", "-created_at")[:PAGE_SIZE])
+
+
+def bench_search(repeat):
+    queries = ("jacket", "куртка", "leathr boots", "тёплый")
+    results = []
+
+    for q in queries:
+        results.append({
+            "query": q,
+            "legacy": measure(lambda: _legacy_search_page(q), repeat),
+            "indexed": measure(lambda: _indexed_search_page(q), repeat),
+        })
+
+    return results
+
+
+# -----------------------------
+# cards
+# -----------------------------
+
+def _largest_subcategory():
+    return (
+        Product.objects
+        .values_list("category", flat=True)
+        .annotate(n=Count("id"))
+        .order_by("-n")
+        .first()
+    )
+
+
+def _legacy_card_page(subcategory_id):
+    products = (
+        Product.objects
+        .filter(category_id=subcategory_id)
+        .select_related("category", "statistics")
+        .prefetch_related("productimage_set", "filters")
+        .order_by("-created_at")[:PAGE_SIZE]
+    )
+    return ProductSmallSerializer(products, many=True).data
+
+
+def _projected_card_page(subcategory_id):
+    cards = (
+        ProductCard.objects
+        .filter(subcategory_id=subcategory_id)
+        .order_by("-created_at", "-product_id")[:PAGE_SIZE]
+    )
+    return ProductCardSerializer(cards, many=True).data
+
+
+def _card_rows_page(subcategory_id):
+    cards = CardRows({})
+    rows = (
+        ProductCard.objects
+        .filter(subcategory_id=subcategory_id)
+        .order_by("-created_at", "-product_id")
+        .values(*cards.columns)[:PAGE_SIZE]
+    )
+    return [cards(row) for row in rows]
+
+
+def bench_cards(repeat):
+    subcategory_id = _largest_subcategory()
+    return [{
+        "page_size": PAGE_SIZE,
+        "product_small_serializer": measure(
+            lambda: _legacy_card_page(subcategory_id), repeat
+        ),
+        "product_card_projection": measure(
+            lambda: _projected_card_page(subcategory_id), repeat
+        ),
+        "card_rows": measure(
+            lambda: _card_rows_page(subcategory_id), repeat
+        ),
+    }]
+
+
+# -----------------------------
+# localized / sparse card pages
+# -----------------------------
+
+# serializer context of ProductListAPIView for ?lang= and ?fields=
+CARD_PAGE_SHAPES = {
+    "both_languages": {},
+    "lang_en": {"lang": "en"},
+    "lang_ru": {"lang": "ru"},
+    "lang_ru_sparse": {
+        "lang": "ru",
+        "fields": frozenset({"id", "name", "slug", "price", "sale", "image"}),
+    },
+}
+
+
+def _rendered_card_page(cards, context):
+    return ORJSONRenderer().render(
+        ProductCardSerializer(cards, many=True, context=context).data
+    )
+
+
+def bench_localization(repeat):
+    """Payload and serialization time of one 48-card page per response shape."""
+    cards = list(
+        ProductCard.objects
+        .filter(subcategory_id=_largest_subcategory())
+        .order_by("-created_at", "-product_id")[:PAGE_SIZE]
+    )
+    results = []
+    for shape, context in CARD_PAGE_SHAPES.items():
+        results.append({
+            "shape": shape,
+            "bytes": len(_rendered_card_page(cards, context)),
+            **measure(lambda: _rendered_card_page(cards, context), repeat),
+        })
+    return results
+
+
+# -----------------------------
+# side-loaded taxonomy
+# -----------------------------
+
+def _rendered_card_rows_page(subcategory_id, include):
+    cards = CardRows({"include": include})
+    rows = (
+        ProductCard.objects
+        .filter(subcategory_id=subcategory_id)
+        .order_by("-created_at", "-product_id")
+        .values(*cards.columns)[:PAGE_SIZE]
+    )
+    data = {"results": [cards(row) for row in rows]}
+    if cards.included is not None:
+        data["included"] = cards.included
+    return ORJSONRenderer().render(data)
+
+
+def bench_side_loading(repeat):
+    """48-card page with nested vs ``?include=category`` taxonomy."""
+    subcategory_id = _largest_subcategory()
+    results = []
+    for shape, include in (
+        ("nested", frozenset()),
+        ("side_loaded", frozenset({"category"})),
+    ):
+        results.append({
+            "shape": shape,
+            "bytes": len(_rendered_card_rows_page(subcategory_id, include)),
+            **measure(lambda: _rendered_card_rows_page(subcategory_id, include), repeat),
+        })
+    return results
+
+
+# -----------------------------
+# rendering and compression
+# -----------------------------
+
+def _renderers():
+    renderers = {
+        "drf_json": JSONRenderer(),
+        "orjson": ORJSONRenderer(),
+    }
+    if msgpack is not None:
+        renderers["msgpack"] = MessagePackRenderer()
+    return renderers
+
+
+def _rendering_payloads():
+    subcategory_id = _largest_subcategory()
+    product = (
+        Product.objects
+        .filter(category_id=subcategory_id)
+        .select_related("category__category", "statistics")
+        .prefetch_related(
+            "filters",
+            "productimage_set",
+            "productproperty_set",
+            "productdescriptionitem_set",
+        )
+        .first()
+    )
+    cards = (
+        ProductCard.objects
+        .filter(subcategory_id=subcategory_id)
+        .order_by("-created_at", "-product_id")[:PAGE_SIZE]
+    )
+    return {
+        "product_detail": ProductBigSerializer(product).data,
+        "card_page": ProductCardSerializer(cards, many=True).data,
+    }
+
+
+def bench_rendering(repeat):
+    """Renderer time and size per payload, then compression of the JSON."""
+    results = []
+    for payload, data in _rendering_payloads().items():
+        for name, renderer in _renderers().items():
+            results.append({
+                "payload": payload,
+                "renderer": name,
+                "bytes": len(renderer.render(data)),
+                **measure(lambda: renderer.render(data), repeat),
+            })
+
+        body = ORJSONRenderer().render(data)
+        for encoding, (compress, _) in COMPRESSORS.items():
+            if encoding == "br" and brotli is None:
+                continue
+            results.append({
+                "payload": payload,
+                "encoding": encoding,
+                "bytes": len(compress(body)),
+                **measure(lambda: compress(body), repeat),
+            })
+    return results
+
+
+# -----------------------------
+# trending
+# -----------------------------
+
+def _legacy_trending_page():
+    products = (
+        Product.objects
+        .select_related("category", "statistics")
+        .prefetch_related("productimage_set", "filters")
+        .order_by("-statistics__sold")[:PAGE_SIZE]
+    )
+    return ProductSmallSerializer(products, many=True).data
+
+
+def _ranked_trending_page():
+    cards = (
+        ProductCard.objects
+        .annotate(ranking=FilteredRelation(
+            "rankings",
+            condition=Q(rankings__subcategory__isnull=True),
+        ))
+        .filter(ranking__isnull=False)
+        .annotate(trending_score=F("ranking__score"))
+        .order_by("-trending_score", "-product_id")[:PAGE_SIZE]
+    )
+    return ProductCardSerializer(cards, many=True).data
+
+
+def bench_trending(repeat):
+    return [{
+        "page_size": PAGE_SIZE,
+        "refresh_trending": measure(refresh_trending, 1),
+        "statistics_sold_order": measure(_legacy_trending_page, repeat),
+        "precomputed_ranking": measure(_ranked_trending_page, repeat),
+    }]
+
+
+# -----------------------------
+# plans
+# -----------------------------
+
+def bench_plans(repeat):
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+    return [
+        {"query": name, **{key: value for key, value in result.items() if key != "plan"}}
+        for name, result in check_hot_queries().items()
+    ]
+
+
+# -----------------------------
+# import
+# -----------------------------
+
+def _import_rows(count):
+    """Half updates of seeded products, half new products."""
+    subcategories = list(SubCategory.objects.values_list("slug", flat=True))
+    vendor_codes = list(
+        Product.objects.order_by("id").values_list("vendor_code", flat=True)[:count // 2]
+    )
+    vendor_codes += [f"IMPORT-{i}" for i in range(count - len(vendor_codes))]
+
+    for i, vendor_code in enumerate(vendor_codes):
+        yield {
+            "vendor_code": vendor_code,
+            "name": f"Imported product {i}",
+            "name_ru": f"Импортированный товар {i}",
+            "price": f"{100 + i % 900}.00",
+            "quantity": i % 50,
+            "subcategory": subcategories[i % len(subcategories)],
+            "images": [f"products/images/import-{i}.jpg"],
+            "properties": [
+                {
+                    "name": "Material",
+                    "name_ru": "Материал",
+                    "value": "oak",
+                    "value_ru": "дуб",
+                },
+            ],
+            "description_items": [
+                {"text": "Imported", "text_ru": "Импортирован"},
+            ],
+        }
+
+
+def bench_import(repeat):
+    """One import of as many rows as seeded products; repeat is ignored."""
+    count = Product.objects.count()
+    with CaptureQueriesContext(connection) as ctx:
+        stats = ProductImporter().run(_import_rows(count))
+    return [{**stats, "queries": len(ctx.captured_queries)}]
+
+
+# -----------------------------
+# feeds
+# -----------------------------
+
+def bench_feeds(repeat):
+    """Full build, an incremental one after 1% of products changed, a no-op one."""
+    full = build_feeds()
+    changed = list(Product.objects.order_by("?").values_list("id", flat=True)[
+        :max(1, Product.objects.count() // 100)
+    ])
+    Product.objects.filter(id__in=changed).update(updated_at=timezone.now())
+    incremental = build_feeds()
+    noop = build_feeds()
+
+    return [
+        {"build": build, "rendered": result["rendered"], "seconds": result["seconds"]}
+        for build, result in (
+            ("full", full),
+            ("incremental", incremental),
+            ("unchanged", noop),
+        )
+    ]
+
+
+# -----------------------------
+# endpoints
+# -----------------------------
+
+URLCONFS = {
+    "products": ("/api/products/", products_urls),
+    "orders": ("/api/orders/", orders_urls),
+    "users": ("/api/users/", users_urls),
+}
+
+ENDPOINTS = []
+
+
+def endpoint(app, pattern, method="get", variant=None, user=None):
+    """
+    Register a request on ``pattern`` of ``app``'s urls.
+
+    The decorated function gets the benchmark context, prepares whatever
+    the request consumes (outside the timing) and returns its path
+    relative to the app prefix and its query params or body. ``user``
+    names the context user to authenticate as.
+    """
+    def register(build):
+        ENDPOINTS.append({
+            "app": app,
+            "pattern": pattern,
+            "method": method,
+            "variant": variant,
+            "user": user,
+            "build": build,
+        })
+        return build
+    return register
+
+
+def missing_endpoints():
+    """``app:pattern`` of the routes no registered endpoint drives."""
+    covered = {(spec["app"], spec["pattern"]) for spec in ENDPOINTS}
+    return sorted(
+        f"{app}:{route.pattern}"
+        for app, (prefix, urlconf) in URLCONFS.items()
+        for route in urlconf.urlpatterns
+        if (app, str(route.pattern)) not in covered
+    )
+
+
+def endpoint_context():
+    """Sample objects of the seeded shop the endpoints are driven with."""
+    buyer_id = (
+        Order.objects
+        .values_list("buyer", flat=True)
+        .annotate(n=Count("id"))
+        .order_by("-n")
+        .first()
+    )
+    product = (
+        Product.objects
+        .filter(statistics__isnull=False)
+        .order_by("-statistics__reviews_count", "id")
+        .first()
+    )
+    subcategory = SubCategory.objects.select_related("category").get(
+        id=_largest_subcategory()
+    )
+
+    return {
+        "user": User.objects.get(id=buyer_id),
+        "admin": User.objects.create_user(
+            username="benchmark-admin", password=SYNTHETIC_PASSWORD, is_staff=True
+        ),
+        "shopper": User.objects.create_user(
+            username="benchmark-shopper", password=SYNTHETIC_PASSWORD
+        ),
+        "product": product,
+        "filter_values": list(product.filters.values_list("id", flat=True)),
+        "subcategory": subcategory,
+        "category": subcategory.category,
+        "order": Order.objects.filter(buyer_id=buyer_id).latest("created_at"),
+        "search": product.name.split()[0],
+        "serial": itertools.count(),
+    }
+
+
+# products
+
+@endpoint("products", "banners/")
+def _banners(ctx):
+    return "banners/", None
+
+
+@endpoint("products", "categories/")
+def _categories(ctx):
+    return "categories/", None
+
+
+@endpoint("products", "search/")
+def _search(ctx):
+    return "search/", {"search": ctx["search"]}
+
+
+@endpoint("products", "categories/<slug:slug>/")
+def _category(ctx):
+    return f"categories/{ctx['category'].slug}/", None
+
+
+@endpoint("products", "categories/subcategories/<slug:slug>/")
+def _subcategory(ctx):
+    return f"categories/subcategories/{ctx['subcategory'].slug}/", None
+
+
+@endpoint("products", "categories/<slug:slug>/subcategories/")
+def _subcategories(ctx):
+    return f"categories/{ctx['category'].slug}/subcategories/", None
+
+
+@endpoint("products", "filters/")
+def _filters(ctx):
+    return "filters/", {"subcategory": ctx["subcategory"].slug}
+
+
+@endpoint("products", "metrics/view-buffer/", user="admin")
+def _view_buffer(ctx):
+    return "metrics/view-buffer/", None
+
+
+@endpoint("products", "export/", variant="ndjson", user="admin")
+def _export_ndjson(ctx):
+    return "export/", None
+
+
+@endpoint("products", "export/", variant="csv", user="admin")
+def _export_csv(ctx):
+    return "export/", {"output": "csv"}
+
+
+@endpoint("products", "", variant="home")
+def _product_list_home(ctx):
+    return "", {"home": "1"}
+
+
+@endpoint("products", "", variant="subcategory")
+def _product_list_subcategory(ctx):
+    return "", {"subcategory": ctx["subcategory"].slug}
+
+
+@endpoint("products", "", variant="filters")
+def _product_list_filters(ctx):
+    return "", {
+        "subcategory": ctx["product"].category.slug,
+        "filters": ",".join(map(str, ctx["filter_values"][:2])),
+        "price_min": "10",
+    }
+
+
+@endpoint("products", "", variant="search")
+def _product_list_search(ctx):
+    return "", {"search": ctx["search"]}
+
+
+@endpoint("products", "<slug:slug>/")
+def _product_detail(ctx):
+    return f"{ctx['product'].slug}/", None
+
+
+@endpoint("products", "<slug:slug>/reviews/")
+def _product_reviews(ctx):
+    return f"{ctx['product'].slug}/reviews/", None
+
+
+@endpoint("products", "<slug:slug>/reviews/create/", method="post")
+def _product_review_create(ctx):
+    return f"{ctx['product'].slug}/reviews/create/", {
+        "name": "Benchmark",
+        "email": "benchmark@example.com",
+        "rating": 4,
+        "text": "Solid.",
+    }
+
+
+# orders
+
+def _cart_item(ctx, user):
+    item, _ = CartItem.objects.update_or_create(
+        user=ctx[user],
+        product=ctx["product"],
+        variant_key="",
+        defaults={"quantity": 1},
+    )
+    return item
+
+
+@endpoint("orders", "cart/", user="user")
+def _cart(ctx):
+    return "cart/", None
+
+
+@endpoint("orders", "cart/add/", method="post", user="user")
+def _cart_add(ctx):
+    return "cart/add/", {
+        "product": ctx["product"].id,
+        "quantity": 1,
+        "filter_values": ctx["filter_values"],
+    }
+
+
+@endpoint("orders", "cart/<int:pk>/", method="patch", user="shopper")
+def _cart_update(ctx):
+    return f"cart/{_cart_item(ctx, 'shopper').id}/", {"quantity": 2}
+
+
+@endpoint("orders", "cart/<int:pk>/remove/", method="delete", user="shopper")
+def _cart_remove(ctx):
+    return f"cart/{_cart_item(ctx, 'shopper').id}/remove/", None
+
+
+@endpoint("orders", "checkout/", method="post", user="shopper")
+def _checkout(ctx):
+    CartItem.objects.filter(user=ctx["shopper"]).delete()
+    _cart_item(ctx, "shopper")
+    return "checkout/", {"note": "benchmark"}
+
+
+@endpoint("orders", "", user="user")
+def _orders(ctx):
+    return "", None
+
+
+@endpoint("orders", "<int:pk>/", user="user")
+def _order(ctx):
+    return f"{ctx['order'].id}/", None
+
+
+# users
+
+@endpoint("users", "register/", method="post")
+def _register(ctx):
+    email = f"benchmark-{next(ctx['serial'])}@example.com"
+    return "register/", {
+        "email": email,
+        "first_name": "Bench",
+        "last_name": "Mark",
+        "password": SYNTHETIC_PASSWORD,
+        "password_confirm": SYNTHETIC_PASSWORD,
+    }
+
+
+@endpoint("users", "login/", method="post")
+def _login(ctx):
+    return "login/", {
+        "username": ctx["user"].username,
+        "password": SYNTHETIC_PASSWORD,
+    }
+
+
+@endpoint("users", "refresh/", method="post")
+def _refresh(ctx):
+    return "refresh/", {"refresh": str(RefreshToken.for_user(ctx["user"]))}
+
+
+@endpoint("users", "change-password/", method="post", user="shopper")
+def _change_password(ctx):
+    return "change-password/", {
+        "old_password": SYNTHETIC_PASSWORD,
+        "new_password": SYNTHETIC_PASSWORD,
+    }
+
+
+@endpoint("users", "wishlist/", user="user")
+def _wishlist(ctx):
+    return "wishlist/", None
+
+
+@endpoint("users", "wishlist/add/", method="post", user="shopper")
+def _wishlist_add(ctx):
+    return "wishlist/add/", {"product_id": ctx["product"].id}
+
+
+@endpoint("users", "wishlist/remove/<int:product_id>/", method="delete", user="shopper")
+def _wishlist_remove(ctx):
+    return f"wishlist/remove/{ctx['product'].id}/", None
+
+
+@endpoint("users", "me/", user="user")
+def _me(ctx):
+    return "me/", None
+
+
+def measure_endpoint(spec, ctx, repeat):
+    client = APIClient()
+    if spec["user"]:
+        client.force_authenticate(ctx[spec["user"]])
+    prefix = URLCONFS[spec["app"]][0]
+    request = getattr(client, spec["method"])
+
+    timings = []
+    for _ in range(repeat):
+        path, data = spec["build"](ctx)
+        kwargs = {} if spec["method"] == "get" else {"format": "json"}
+
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = request(prefix + path, data, **kwargs)
+            body = response.getvalue()
+            timings.append((time.perf_counter() - start) * 1000)
+
+    return {
+        **percentiles(timings),
+        "queries": len(queries.captured_queries),
+        "bytes": len(body),
+        "status": response.status_code,
+    }
+
+
+def bench_endpoints(repeat):
+    ctx = endpoint_context()
+    return [
+        {
+            "endpoint": (
+                f"{spec['method'].upper()} {URLCONFS[spec['app']][0]}{spec['pattern']}"
+            ),
+            "variant": spec["variant"],
+            **measure_endpoint(spec, ctx, repeat),
+        }
+        for spec in ENDPOINTS
+    ]
+
+
+SCENARIOS = {
+    "search": bench_search,
+    "cards": bench_cards,
+    "localization": bench_localization,
+    "side_loading": bench_side_loading,
+    "rendering": bench_rendering,
+    "trending": bench_trending,
+    "plans": bench_plans,
+    "endpoints": bench_endpoints,
+    "import": bench_import,
+    "feeds": bench_feeds,
+}
@@ -0,0 +1,43 @@
+from django.db.models import Case, IntegerField, Value, When
+
+
+def unique_slug(field, value, taken):
+    """
+    Same slug AutoSlugField would pick, resolved against the in-memory
+    ``taken`` set instead of one query per candidate.
+    """
+    base = field.slugify(value)[:field.max_length] or field.model._meta.model_name
+    slug = base
+    index = 1
+
+    while slug in taken:
+        index += 1
+        tail = f"{field.index_sep}{index}"
+        slug = f"{base[:field.max_length - len(tail)]}{tail}"
+
+    taken.add(slug)
+    return slug
+
+
+def precomputed_slugs(objs):
+    """
+    Mark ``objs`` (whose slugs were already made unique with
+    ``unique_slug``) so ProductSlugField keeps their slug instead of probing
+    the table once per row on save / bulk_create. The database unique
+    constraint still applies.
+    """
+    for obj in objs:
+        obj._precomputed_slug = True
+    return objs
+
+
+def add_by(key, counts, output_field=None):
+    """
+    Per-row delta of ``counts`` (``{key value: delta}``) for one multi-row
+    ``UPDATE ... SET field = field + CASE key WHEN ... END``.
+    """
+    return Case(
+        *[When(**{key: pk}, then=Value(delta)) for pk, delta in counts.items()],
+        default=Value(0),
+        output_field=output_field or IntegerField(),
+    )
@@ -0,0 +1,170 @@
+"""
+Product cards built straight from ``values()`` rows.
+
+ProductCardSerializer turns every ProductCard instance into a card
+through three nested serializers, which dominates the CPU time of a 48
+card page. ``CardRows`` reads the same fields off the serializer once
+per response shape (language, ``?fields=``, ``?include=``), compiles them into one
+function mapping a ``values()`` row to the card dict, and reuses it for
+every later request of that shape. The output is the one of
+ProductCardSerializer and ProductSmallSerializer, field for field; the
+contract is checked in products/tests.py.
+"""
+from functools import lru_cache, partial
+
+from django.core.files.storage import default_storage
+from rest_framework.fields import ImageField
+from rest_framework.serializers import Serializer
+
+from .images import srcset
+from .models import Product
+from .serializers import (
+    ImageVariantsField,
+    ProductCardSerializer,
+    ProductSmallSerializer,
+)
+from .sideload import new_included, side_load
+
+
+def _image_url(name, request=None):
+    # ImageField.to_representation for a stored name
+    if not name:
+        return None
+    url = default_storage.url(name)
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+def _converter(field):
+    """Callable (or request bound marker) rendering one non-null column."""
+    if isinstance(field, ImageVariantsField):
+        return "srcset"
+    if isinstance(field, ImageField):
+        return "image"
+    if "." in field.source:
+        raise TypeError(f"Card field {field.field_name} reads a related attribute")
+    return field.to_representation
+
+
+def _expression(serializer, prefix, converters, columns, side_loaded=None):
+    """
+    Dict display building ``serializer``'s output from row ``r``. With a
+    ``side_loaded`` list, nested serializers named in ``side_loaded``
+    become ``<key>_id`` and their own displays are collected in the list.
+    """
+    nullable = getattr(serializer, "nullable_nested", {})
+    items = []
+
+    for key, field in serializer.fields.items():
+        if isinstance(field, Serializer) and field.source == "*":
+            if side_loaded is not None and key in serializer.side_loaded:
+                collection, id_column = serializer.side_loaded[key]
+                column = prefix + id_column
+                columns.append(column)
+                side_loaded.append((
+                    collection,
+                    column,
+                    _expression(field, prefix, converters, columns, side_loaded),
+                ))
+                items.append(f"{key + '_id'!r}: r[{column!r}]")
+                continue
+            expression = _expression(field, prefix, converters, columns)
+        else:
+            column = prefix + field.source
+            columns.append(column)
+            converters.append(_converter(field))
+            expression = (
+                f"(None if r[{column!r}] is None "
+                f"else c[{len(converters) - 1}](r[{column!r}]))"
+            )
+
+        if key in nullable:
+            column = prefix + nullable[key]
+            columns.append(column)
+            expression = f"(None if r[{column!r}] is None else {expression})"
+        items.append(f"{key!r}: {expression}")
+
+    return "{" + ", ".join(items) + "}"
+
+
+@lru_cache(maxsize=256)
+def _compile(lang, fields, prefix, include):
+    serializer = ProductCardSerializer(context={"lang": lang, "fields": fields})
+    converters, columns = [], []
+    side_loaded = [] if include else None
+    source = (
+        "def to_card(r, c):\n"
+        f"    return {_expression(serializer, prefix, converters, columns, side_loaded)}\n"
+    )
+    for index, (_, _, expression) in enumerate(side_loaded or ()):
+        source += f"def side_{index}(r, c):\n    return {expression}\n"
+
+    namespace = {}
+    exec(compile(source, "<product card row>", "exec"), namespace)
+    side_loaded = tuple(
+        (collection, column, namespace[f"side_{index}"])
+        for index, (collection, column, _) in enumerate(side_loaded or ())
+    )
+    return (
+        namespace["to_card"],
+        side_loaded,
+        tuple(converters),
+        tuple(dict.fromkeys(columns)),
+    )
+
+
+class CardRows:
+    """
+    Card builder for one request.
+
+    ``columns`` are the names to pass to ``values()``; ``prefix`` reaches
+    the card from another model (``"product__card__"``), in which case
+    ``product_column`` names the product id column used to fall back to
+    ProductSmallSerializer for products whose card is not built yet.
+
+    With ``"category"`` in ``context["include"]`` the cards are
+    side-loaded (products/sideload.py) and ``included`` collects the
+    subcategories and categories of every card built.
+    """
+
+    def __init__(self, context, prefix="", product_column=None):
+        self.context = context
+        fields = None if prefix else context.get("fields")
+        include = "category" in context.get("include", ())
+        self._to_card, self._side_loaded, converters, self.columns = _compile(
+            context.get("lang"), fields, prefix, include
+        )
+        self.included = new_included() if include else None
+
+        request = context.get("request")
+        bound = {
+            "image": partial(_image_url, request=request),
+            "srcset": partial(srcset, request=request),
+        }
+        self._converters = tuple(
+            bound[converter] if isinstance(converter, str) else converter
+            for converter in converters
+        )
+        self.card_column = prefix + "product_id"
+        self.product_column = product_column
+
+    def __call__(self, row):
+        if self.product_column and row[self.card_column] is None:
+            return self.fallback(row[self.product_column])
+
+        card = self._to_card(row, self._converters)
+        for collection, column, build in self._side_loaded:
+            pk = row[column]
+            if pk is not None and pk not in self.included[collection]:
+                self.included[collection][pk] = build(row, self._converters)
+        return card
+
+    def fallback(self, product_id):
+        product = (
+            Product.objects
+            .select_related("category__category", "statistics")
+            .get(pk=product_id)
+        )
+        card = ProductSmallSerializer(product, context=self.context).data
+        if self.included is not None:
+            return side_load(card, self.included)
+        return card
@@ -0,0 +1,119 @@
+from decimal import Decimal
+
+from django.db.models import F, JSONField, OuterRef, Subquery
+
+from .bulk import add_by
+from .models import Product, ProductCard, ProductImage
+
+
+CARD_CHUNK_SIZE = 1000
+
+CARD_FIELDS = (
+    "name",
+    "name_ru",
+    "slug",
+    "price",
+    "discounted_price",
+    "sale",
+    "vendor_code_public",
+    "image",
+    "image_variants",
+    "created_at",
+    "subcategory_id",
+    "subcategory_name",
+    "subcategory_name_ru",
+    "subcategory_slug",
+    "subcategory_image",
+    "subcategory_image_variants",
+    "category_id",
+    "category_name",
+    "category_name_ru",
+    "category_slug",
+    "category_image",
+    "category_image_variants",
+    "views",
+    "sold",
+    "rating",
+    "reviews_count",
+)
+
+
+def discounted_price(price, sale):
+    if not sale:
+        return price
+    price = price - (price * Decimal(sale) / Decimal(100))
+    return price.quantize(Decimal("0.01"))
+
+
+def build_card(product):
+    """Card of a product loaded by ``refresh_cards``."""
+    subcategory = product.category
+    category = subcategory.category if subcategory else None
+    stats = getattr(product, "statistics", None)
+
+    return ProductCard(
+        product=product,
+        name=product.name,
+        name_ru=product.name_ru,
+        slug=product.slug,
+        price=product.price,
+        discounted_price=discounted_price(product.price, product.sale),
+        sale=product.sale,
+        vendor_code_public=product.vendor_code_public,
+        image=product.primary_image,
+        image_variants=product.primary_image_variants or {},
+        created_at=product.created_at,
+        subcategory_id=subcategory.id if subcategory else None,
+        subcategory_name=subcategory.name if subcategory else "",
+        subcategory_name_ru=subcategory.name_ru if subcategory else "",
+        subcategory_slug=subcategory.slug if subcategory else "",
+        subcategory_image=subcategory.image.name if subcategory else None,
+        subcategory_image_variants=subcategory.image_variants if subcategory else {},
+        category_id=category.id if category else None,
+        category_name=category.name if category else "",
+        category_name_ru=category.name_ru if category else "",
+        category_slug=category.slug if category else "",
+        category_image=category.image.name if category else None,
+        category_image_variants=category.image_variants if category else {},
+        views=stats.views if stats else 0,
+        sold=stats.sold if stats else 0,
+        rating=stats.rating if stats else 0,
+        reviews_count=stats.reviews_count if stats else 0,
+    )
+
+
+def refresh_cards(product_ids):
+    """(Re)build the cards of the given products."""
+    product_ids = list(product_ids)
+    first_image = (
+        ProductImage.objects
+        .filter(product=OuterRef("pk"))
+        .order_by("id")
+    )
+
+    for start in range(0, len(product_ids), CARD_CHUNK_SIZE):
+        products = (
+            Product.objects
+            .filter(id__in=product_ids[start:start + CARD_CHUNK_SIZE])
+            .select_related("category__category", "statistics")
+            .annotate(
+                primary_image=Subquery(first_image.values("image")[:1]),
+                primary_image_variants=Subquery(
+                    first_image.values("image_variants")[:1],
+                    output_field=JSONField(),
+                ),
+            )
+        )
+        ProductCard.objects.bulk_create(
+            [build_card(product) for product in products],
+            update_conflicts=True,
+            unique_fields=["product"],
+            update_fields=CARD_FIELDS,
+        )
+
+
+def bump_card_stats(field, counts):
+    """Mirror ``{product_id: delta}`` increments already made to ProductStatistic."""
+    ProductCard.objects.filter(product_id__in=counts).update(**{
+        field: F(field) + add_by("product_id", counts)
+    })
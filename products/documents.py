@@ -0,0 +1,120 @@
+from core.renderers import ORJSONRenderer
+
+from .models import Product, ProductDetailDocument, ProductStatistic
+from .ratings import STAR_FIELDS
+from .serializers import (
+    ProductDetailDocumentSerializer,
+    ProductRatingStatisticSerializer,
+    ReviewSummarySerializer,
+)
+
+
+DOCUMENT_CHUNK_SIZE = 500
+
+# stands in for "scheme://host" in absolute media urls; private use
+# character, so it cannot collide with catalog text
+ORIGIN_PLACEHOLDER = "\ue000"
+ORIGIN_PLACEHOLDER_BYTES = ORIGIN_PLACEHOLDER.encode()
+
+# ProductStatistic columns behind ProductRatingStatisticSerializer
+STATISTIC_FIELDS = ("views", "sold", "rating", "reviews_count") + STAR_FIELDS
+
+
+class _PlaceholderRequest:
+    """Just enough of a request for serializers building media urls."""
+
+    def build_absolute_uri(self, location):
+        return ORIGIN_PLACEHOLDER + location
+
+
+def render_document(product):
+    data = ProductDetailDocumentSerializer(
+        product,
+        context={"request": _PlaceholderRequest()},
+    ).data
+    return ORJSONRenderer().render(data)
+
+
+def refresh_documents(product_ids):
+    """(Re)render the detail documents of the given products."""
+    product_ids = list(product_ids)
+
+    for start in range(0, len(product_ids), DOCUMENT_CHUNK_SIZE):
+        products = (
+            Product.objects
+            .filter(id__in=product_ids[start:start + DOCUMENT_CHUNK_SIZE])
+            .select_related("category__category")
+            .prefetch_related(
+                "filters",
+                "productimage_set",
+                "productproperty_set",
+                "productdescriptionitem_set",
+            )
+        )
+        ProductDetailDocument.objects.bulk_create(
+            [
+                ProductDetailDocument(
+                    product=product,
+                    slug=product.slug,
+                    body=render_document(product),
+                )
+                for product in products
+            ],
+            update_conflicts=True,
+            unique_fields=["product"],
+            update_fields=["slug", "body", "updated_at"],
+        )
+
+
+def _load(slug):
+    return (
+        ProductDetailDocument.objects
+        .filter(slug=slug)
+        .values_list(
+            "product_id",
+            "body",
+            *(f"product__statistics__{field}" for field in STATISTIC_FIELDS),
+        )
+        .first()
+    )
+
+
+def load_document(slug):
+    """
+    ``(product_id, document)`` of the product with ``slug``, statistics
+    and review summary included and media urls pointing to ``ORIGIN_PLACEHOLDER``; ``None``
+    when there is no such product. Missing documents are rendered on
+    the spot.
+    """
+    row = _load(slug)
+    if row is None:
+        product_id = (
+            Product.objects
+            .filter(slug=slug)
+            .values_list("id", flat=True)
+            .first()
+        )
+        if product_id is None:
+            return None
+        refresh_documents([product_id])
+        row = _load(slug)
+
+    product_id, body, *stats = row
+    statistics = summary = b"null"
+    if stats[0] is not None:
+        instance = ProductStatistic(**dict(zip(STATISTIC_FIELDS, stats)))
+        statistics = ORJSONRenderer().render(
+            ProductRatingStatisticSerializer(instance).data
+        )
+        summary = ORJSONRenderer().render(ReviewSummarySerializer(instance).data)
+
+    return product_id, (
+        bytes(body)[:-1]
+        + b',"statistics":' + statistics
+        + b',"reviews":' + summary
+        + b"}"
+    )
+
+
+def with_origin(document, origin):
+    return document.replace(ORIGIN_PLACEHOLDER_BYTES, origin.encode())
@@ -0,0 +1,120 @@
+"""
+Streaming export of the whole catalog as NDJSON or CSV.
+
+Products are read with a server-side cursor (``iterator(chunk_size)``,
+images and filter values prefetched per chunk) and written one row at a
+time, so memory stays flat whatever the catalog size. Rows use the keys
+of ``products.importer`` and can be imported back as they are.
+"""
+import csv
+import json
+
+from django.db.models import Prefetch
+
+from .cards import discounted_price
+from .models import FilterValue, Product, ProductImage
+
+
+CHUNK_SIZE = 2000
+
+CSV_COLUMNS = (
+    "id",
+    "vendor_code",
+    "vendor_code_public",
+    "slug",
+    "name",
+    "name_ru",
+    "category",
+    "subcategory",
+    "price",
+    "sale",
+    "sale_price",
+    "quantity",
+    "images",
+    "filters",
+    "updated_at",
+)
+
+CONTENT_TYPES = {
+    "ndjson": "application/x-ndjson; charset=utf-8",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def export_queryset(updated_since=None):
+    products = (
+        Product.objects
+        .select_related("category__category")
+        .prefetch_related(
+            Prefetch(
+                "productimage_set",
+                queryset=ProductImage.objects.order_by("id"),
+            ),
+            Prefetch(
+                "filters",
+                queryset=FilterValue.objects.select_related("filter").order_by("id"),
+            ),
+        )
+        .order_by("id")
+    )
+    if updated_since is not None:
+        products = products.filter(updated_at__gte=updated_since)
+    return products
+
+
+def export_row(product):
+    subcategory = product.category
+
+    return {
+        "id": product.id,
+        "vendor_code": product.vendor_code,
+        "vendor_code_public": product.vendor_code_public,
+        "slug": product.slug,
+        "name": product.name,
+        "name_ru": product.name_ru,
+        "category": subcategory.category.slug if subcategory else None,
+        "subcategory": subcategory.slug if subcategory else None,
+        "price": str(product.price),
+        "sale": product.sale,
+        "sale_price": str(discounted_price(product.price, product.sale)),
+        "quantity": product.quantity,
+        "images": [image.image.name for image in product.productimage_set.all()],
+        "filters": [
+            f"{value.filter.name}={value.value}"
+            for value in product.filters.all()
+        ],
+        "updated_at": product.updated_at.isoformat(),
+    }
+
+
+def export_rows(updated_since=None, chunk_size=CHUNK_SIZE):
+    for product in export_queryset(updated_since).iterator(chunk_size=chunk_size):
+        yield export_row(product)
+
+
+class _Echo:
+    """File-like object handing back what csv.writer writes."""
+
+    def write(self, value):
+        return value
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + "\n"
+
+
+def csv_lines(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for row in rows:
+        yield writer.writerow([
+            "|".join(row[column]) if isinstance(row[column], list) else row[column]
+            for column in CSV_COLUMNS
+        ])
+
+
+WRITERS = {
+    "ndjson": ndjson_lines,
+    "csv": csv_lines,
+}
@@ -0,0 +1,363 @@
+import logging
+import threading
+from decimal import Decimal, InvalidOperation
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+from .models import Product, SubCategory
+
+
+logger = logging.getLogger(__name__)
+
+# set bits per byte value
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+_indexes = {}
+_building = set()
+_lock = threading.Lock()
+
+
+def _set_bit(bits, position, on):
+    byte, bit = divmod(position, 8)
+    if on:
+        bits[byte] |= 0x80 >> bit
+    else:
+        bits[byte] &= ~(0x80 >> bit) & 0xFF
+
+
+class SubCategoryFacetIndex:
+    """
+    Per-process bitsets of one subcategory's products.
+
+    Every product gets a position; each FilterValue id maps to a packed
+    bitset over those positions, so AND matching several values is a
+    bitwise intersection. ``version`` mirrors ``SubCategory.facet_version``
+    at build time and tells readers when the index went stale.
+    """
+
+    def __init__(self, subcategory_id, version):
+        self.subcategory_id = subcategory_id
+        self.version = version
+        self.size = 0
+        self.product_ids = np.zeros(0, dtype=np.int64)
+        self.prices = np.zeros(0, dtype=np.float64)
+        self.alive = np.zeros(0, dtype=np.uint8)
+        self.bitsets = {}
+        self.positions = {}
+        self._price_order = None
+
+    @classmethod
+    def build(cls, subcategory_id):
+        """
+        Index of the subcategory as one snapshot sees it, labelled with the
+        ``facet_version`` read in that snapshot; ``None`` when the
+        subcategory is not visible (e.g. created by an uncommitted
+        transaction).
+        """
+        if connection.vendor == "postgresql" and not connection.in_atomic_block:
+            with transaction.atomic():
+                # the version, products and links are read in one snapshot
+                with connection.cursor() as cursor:
+                    cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+                return cls._read(subcategory_id)
+        return cls._read(subcategory_id)
+
+    @classmethod
+    def _read(cls, subcategory_id):
+        version = (
+            SubCategory.objects
+            .filter(id=subcategory_id)
+            .values_list("facet_version", flat=True)
+            .first()
+        )
+        if version is None:
+            return None
+
+        index = cls(subcategory_id, version)
+        products = list(
+            Product.objects
+            .filter(category_id=subcategory_id)
+            .order_by("id")
+            .values_list("id", "price")
+        )
+        links = (
+            Product.filters.through.objects
+            .filter(product__category_id=subcategory_id)
+            .values_list("product_id", "filtervalue_id")
+        )
+
+        filters = {}
+        for product_id, value_id in links:
+            filters.setdefault(product_id, set()).add(value_id)
+
+        for product_id, price in products:
+            index.upsert(product_id, price, filters.get(product_id, ()))
+        return index
+
+    def _grow(self, size):
+        capacity = len(self.product_ids)
+        if size <= capacity:
+            return
+
+        capacity = max(size, capacity * 2, 64)
+        nbytes = (capacity + 7) // 8
+        self.product_ids = np.resize(self.product_ids, capacity)
+        self.prices = np.resize(self.prices, capacity)
+        self.alive = self._resize_bits(self.alive, nbytes)
+        for value_id, bits in self.bitsets.items():
+            self.bitsets[value_id] = self._resize_bits(bits, nbytes)
+
+    @staticmethod
+    def _resize_bits(bits, nbytes):
+        grown = np.zeros(nbytes, dtype=np.uint8)
+        grown[:len(bits)] = bits
+        return grown
+
+    def upsert(self, product_id, price, value_ids):
+        position = self.positions.get(product_id)
+        if position is None:
+            position = self.size
+            self._grow(position + 1)
+            self.positions[product_id] = position
+            self.product_ids[position] = product_id
+            self.size += 1
+
+        self.prices[position] = float(price)
+        _set_bit(self.alive, position, True)
+
+        value_ids = set(value_ids)
+        for value_id, bits in self.bitsets.items():
+            if value_id not in value_ids:
+                _set_bit(bits, position, False)
+        for value_id in value_ids:
+            bits = self.bitsets.get(value_id)
+            if bits is None:
+                bits = np.zeros(len(self.alive), dtype=np.uint8)
+                self.bitsets[value_id] = bits
+            _set_bit(bits, position, True)
+
+        self._price_order = None
+
+    def remove(self, product_id):
+        position = self.positions.get(product_id)
+        if position is not None:
+            _set_bit(self.alive, position, False)
+
+    def _price_mask(self, price_min, price_max):
+        if self._price_order is None:
+            self._price_order = np.argsort(self.prices[:self.size], kind="stable")
+        order = self._price_order
+        sorted_prices = self.prices[:self.size][order]
+
+        low = 0
+        high = self.size
+        if price_min is not None:
+            low = np.searchsorted(sorted_prices, float(price_min), side="left")
+        if price_max is not None:
+            high = np.searchsorted(sorted_prices, float(price_max), side="right")
+
+        mask = np.zeros(self.size, dtype=bool)
+        mask[order[low:high]] = True
+        return mask
+
+    def _select(self, filter_ids):
+        selected = self.alive.copy()
+        for value_id in filter_ids:
+            bits = self.bitsets.get(value_id)
+            if bits is None:
+                selected[:] = 0
+                break
+            np.bitwise_and(selected, bits, out=selected)
+        return np.unpackbits(selected, count=self.size).astype(bool)
+
+    def match(self, filter_ids, price_min=None, price_max=None):
+        """Ids of live products having every filter value within the bounds."""
+        mask = self._select(filter_ids)
+        if price_min is not None or price_max is not None:
+            mask &= self._price_mask(price_min, price_max)
+
+        return self.product_ids[:self.size][mask].tolist()
+
+    def facets(self, filter_ids, price_min=None, price_max=None):
+        """
+        Per FilterValue match counts of the selection, plus its price range.
+
+        The range ignores the price bounds so the slider keeps its limits;
+        the counts honour them.
+        """
+        selected = self._select(filter_ids)
+        prices = self.prices[:self.size][selected]
+        price_range = (
+            (float(prices.min()), float(prices.max())) if len(prices) else (None, None)
+        )
+
+        mask = selected
+        if price_min is not None or price_max is not None:
+            mask = selected & self._price_mask(price_min, price_max)
+        packed = np.packbits(mask)
+
+        counts = {}
+        for value_id, bits in self.bitsets.items():
+            count = int(POPCOUNT[np.bitwise_and(bits[:len(packed)], packed)].sum())
+            if count:
+                counts[value_id] = count
+        return counts, price_range
+
+
+def _store(index):
+    with _lock:
+        current = _indexes.get(index.subcategory_id)
+        if current is None or current.version < index.version:
+            _indexes[index.subcategory_id] = index
+
+
+def _build_in_background(subcategory_id):
+    try:
+        index = SubCategoryFacetIndex.build(subcategory_id)
+        if index is not None:
+            _store(index)
+    except Exception:
+        logger.exception("Facet index build failed for subcategory %s", subcategory_id)
+    finally:
+        with _lock:
+            _building.discard(subcategory_id)
+        connection.close()
+
+
+def _schedule_build(subcategory_id):
+    with _lock:
+        if subcategory_id in _building:
+            return
+        _building.add(subcategory_id)
+
+    threading.Thread(
+        target=_build_in_background,
+        args=(subcategory_id,),
+        daemon=True,
+    ).start()
+
+
+def build_indexes(subcategory_ids):
+    """
+    Build the indexes of ``subcategory_ids`` now, on this connection, so
+    they reflect the current transaction's rows.
+    """
+    for subcategory_id in subcategory_ids:
+        index = SubCategoryFacetIndex.build(subcategory_id)
+        if index is not None:
+            _store(index)
+
+
+def drop_indexes():
+    """Forget every index of this process, e.g. after a rollback."""
+    with _lock:
+        _indexes.clear()
+
+
+def _parse_price(value):
+    if value in (None, ""):
+        return None
+    return Decimal(value)
+
+
+def _query(subcategory, method, filter_ids, price_min, price_max):
+    if not getattr(settings, "FACET_INDEX_ENABLED", True):
+        return None
+
+    try:
+        price_min = _parse_price(price_min)
+        price_max = _parse_price(price_max)
+    except InvalidOperation:
+        return None
+
+    index = _indexes.get(subcategory.id)
+    if index is None or index.version != subcategory.facet_version:
+        _schedule_build(subcategory.id)
+        return None
+
+    with _lock:
+        return getattr(index, method)(filter_ids, price_min, price_max)
+
+
+def match_products(subcategory, filter_ids, price_min=None, price_max=None):
+    """
+    Product ids matching every filter value (and the price bounds) inside
+    ``subcategory``, or ``None`` when the caller must use the ORM path:
+    the index is disabled, not built yet, or older than the subcategory's
+    ``facet_version``. Missing and stale indexes are rebuilt in the
+    background.
+    """
+    return _query(subcategory, "match", filter_ids, price_min, price_max)
+
+
+def facet_counts(subcategory, filter_ids, price_min=None, price_max=None):
+    """
+    ``(counts, (min_price, max_price))`` of the selection, see
+    ``SubCategoryFacetIndex.facets``; ``None`` under the same conditions
+    as ``match_products``.
+    """
+    return _query(subcategory, "facets", filter_ids, price_min, price_max)
+
+
+def refresh_products(product_ids):
+    """
+    Apply product, price and filter changes to this process's indexes.
+
+    Bumps ``facet_version`` of every affected subcategory so other
+    processes fall back to the ORM and rebuild; the local index is patched
+    in place when nothing else changed it in between.
+    """
+    product_ids = list(product_ids)
+    rows = {
+        product_id: (category_id, price)
+        for product_id, category_id, price in (
+            Product.objects
+            .filter(id__in=product_ids)
+            .values_list("id", "category_id", "price")
+        )
+    }
+    filters = {}
+    for product_id, value_id in (
+        Product.filters.through.objects
+        .filter(product_id__in=product_ids)
+        .values_list("product_id", "filtervalue_id")
+    ):
+        filters.setdefault(product_id, set()).add(value_id)
+
+    with _lock:
+        affected = {category_id for category_id, _ in rows.values()}
+        for subcategory_id, index in _indexes.items():
+            if any(product_id in index.positions for product_id in product_ids):
+                affected.add(subcategory_id)
+    affected.discard(None)
+    if not affected:
+        return
+
+    SubCategory.objects.filter(id__in=affected).update(
+        facet_version=F("facet_version") + 1
+    )
+    versions = dict(
+        SubCategory.objects
+        .filter(id__in=affected)
+        .values_list("id", "facet_version")
+    )
+
+    with _lock:
+        for subcategory_id in affected:
+            index = _indexes.get(subcategory_id)
+            if index is None:
+                continue
+            if index.version + 1 != versions.get(subcategory_id):
+                del _indexes[subcategory_id]
+                continue
+
+            for product_id in product_ids:
+                category_id, price = rows.get(product_id, (None, None))
+                if category_id == subcategory_id:
+                    index.upsert(product_id, price, filters.get(product_id, ()))
+                else:
+                    index.remove(product_id)
+            index.version += 1
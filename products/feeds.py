@@ -0,0 +1,254 @@
+"""
+Marketplace feeds: Google Merchant (RSS 2.0, English fields) and Yandex
+YML (Russian fields), written under MEDIA_ROOT/feeds/ and served by nginx.
+
+Every product's ``<item>`` and ``<offer>`` are rendered once into a
+ProductFeedFragment. A build only re-renders products whose updated_at
+moved past their fragment (or whose fragment was dropped by a change to
+images, properties, description or taxonomy), then streams the stored
+fragments in id order between the feed header and footer.
+"""
+import os
+import time
+from xml.sax.saxutils import escape, quoteattr
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .cards import discounted_price
+from .models import Product, ProductFeedFragment, SubCategory
+
+
+FRAGMENT_CHUNK_SIZE = 500
+MAX_IMAGES = 10
+
+FEED_FILES = {
+    "google": "feeds/google.xml",
+    "yandex": "feeds/yandex.yml",
+}
+
+
+def _media_url(name):
+    return settings.FEED_MEDIA_URL + name
+
+
+def _product_url(product):
+    return settings.FEED_PRODUCT_URL.format(slug=product.slug)
+
+
+def _tag(name, value):
+    return f"<{name}>{escape(str(value))}</{name}>"
+
+
+# -----------------------------
+# fragments
+# -----------------------------
+
+def render_google_item(product):
+    currency = settings.FEED_CURRENCY
+    images = [image.image.name for image in product.productimage_set.all()][:MAX_IMAGES]
+    subcategory = product.category
+
+    parts = [
+        _tag("g:id", product.vendor_code_public or product.id),
+        _tag("title", product.name),
+        _tag("description", product.description_en or product.name),
+        _tag("link", _product_url(product)),
+        _tag("g:availability", "in_stock" if product.quantity > 0 else "out_of_stock"),
+        _tag("g:price", f"{product.price} {currency}"),
+    ]
+    if product.sale:
+        sale_price = discounted_price(product.price, product.sale)
+        parts.append(_tag("g:sale_price", f"{sale_price} {currency}"))
+    if images:
+        parts.append(_tag("g:image_link", _media_url(images[0])))
+        parts += [
+            _tag("g:additional_image_link", _media_url(name))
+            for name in images[1:]
+        ]
+    if subcategory:
+        parts.append(_tag(
+            "g:product_type", f"{subcategory.category.name} > {subcategory.name}"
+        ))
+    if product.vendor_code:
+        parts.append(_tag("g:mpn", product.vendor_code))
+    parts += [
+        "<g:product_detail>"
+        + _tag("g:attribute_name", prop.name)
+        + _tag("g:attribute_value", prop.value)
+        + "</g:product_detail>"
+        for prop in product.productproperty_set.all()
+    ]
+    return "<item>" + "".join(parts) + "</item>\n"
+
+
+def render_yandex_offer(product):
+    images = [image.image.name for image in product.productimage_set.all()][:MAX_IMAGES]
+    available = "true" if product.quantity > 0 else "false"
+
+    parts = [
+        _tag("url", _product_url(product)),
+        _tag("price", discounted_price(product.price, product.sale)),
+    ]
+    if product.sale:
+        parts.append(_tag("oldprice", product.price))
+    parts.append(_tag("currencyId", settings.FEED_CURRENCY))
+    if product.category_id:
+        parts.append(_tag("categoryId", product.category_id))
+    parts += [_tag("picture", _media_url(name)) for name in images]
+    parts += [
+        _tag("name", product.name_ru or product.name),
+        _tag("description", product.description_ru or product.name_ru),
+    ]
+    if product.vendor_code:
+        parts.append(_tag("vendorCode", product.vendor_code))
+    parts += [
+        f"<param name={quoteattr(prop.name_ru)}>{escape(prop.value_ru)}</param>"
+        for prop in product.productproperty_set.all()
+    ]
+    return (
+        f"<offer id={quoteattr(str(product.id))} available={quoteattr(available)}>"
+        + "".join(parts)
+        + "</offer>\n"
+    )
+
+
+def stale_product_ids():
+    """Products without fragments or changed since they were rendered."""
+    return list(
+        Product.objects
+        .filter(
+            Q(feed_fragment__isnull=True)
+            | ~Q(feed_fragment__source_updated_at=F("updated_at"))
+        )
+        .order_by("id")
+        .values_list("id", flat=True)
+    )
+
+
+def refresh_feed_fragments(product_ids):
+    """(Re)render the feed fragments of the given products."""
+    product_ids = list(product_ids)
+
+    for start in range(0, len(product_ids), FRAGMENT_CHUNK_SIZE):
+        products = (
+            Product.objects
+            .filter(id__in=product_ids[start:start + FRAGMENT_CHUNK_SIZE])
+            .select_related("category__category")
+            .prefetch_related("productimage_set", "productproperty_set")
+        )
+        ProductFeedFragment.objects.bulk_create(
+            [
+                ProductFeedFragment(
+                    product=product,
+                    google=render_google_item(product),
+                    yandex=render_yandex_offer(product),
+                    source_updated_at=product.updated_at,
+                )
+                for product in products
+            ],
+            update_conflicts=True,
+            unique_fields=["product"],
+            update_fields=["google", "yandex", "source_updated_at"],
+        )
+
+
+def forget_feed_fragments(product_ids):
+    """Drop fragments whose source changed without touching updated_at."""
+    ProductFeedFragment.objects.filter(product_id__in=product_ids).delete()
+
+
+# -----------------------------
+# files
+# -----------------------------
+
+def google_header():
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<rss version="2.0" xmlns:g="http://base.google.com/ns/1.0">\n'
+        "<channel>\n"
+        + _tag("title", settings.FEED_SHOP_NAME)
+        + _tag("link", settings.FEED_SITE_URL)
+        + _tag("description", settings.FEED_SHOP_NAME)
+        + "\n"
+    )
+
+
+def google_footer():
+    return "</channel>\n</rss>\n"
+
+
+def yandex_header():
+    categories = "".join(
+        f"<category id={quoteattr(str(pk))}>{escape(name)}</category>\n"
+        for pk, name in SubCategory.objects.order_by("id").values_list("id", "name_ru")
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f"<yml_catalog date={quoteattr(timezone.now().isoformat(timespec='minutes'))}>\n"
+        "<shop>\n"
+        + _tag("name", settings.FEED_SHOP_NAME)
+        + _tag("company", settings.FEED_COMPANY)
+        + _tag("url", settings.FEED_SITE_URL)
+        + "\n<currencies>"
+        + f"<currency id={quoteattr(settings.FEED_CURRENCY)} rate=\"1\"/>"
+        + "</currencies>\n"
+        + "<categories>\n" + categories + "</categories>\n"
+        + "<offers>\n"
+    )
+
+
+def yandex_footer():
+    return "</offers>\n</shop>\n</yml_catalog>\n"
+
+
+FEEDS = {
+    "google": (google_header, google_footer),
+    "yandex": (yandex_header, yandex_footer),
+}
+
+
+def write_feed(name):
+    """
+    Concatenate the header, every stored fragment and the footer of feed
+    ``name`` into its file. The file is written next to the old one and
+    swapped in with a rename, so nginx never serves a partial feed.
+    """
+    header, footer = FEEDS[name]
+    path = default_storage.path(FEED_FILES[name])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = f"{path}.partial"
+
+    with open(partial, "w", encoding="utf-8") as fh:
+        fh.write(header())
+        for fragment in (
+            ProductFeedFragment.objects
+            .order_by("product_id")
+            .values_list(name, flat=True)
+            .iterator(chunk_size=FRAGMENT_CHUNK_SIZE * 4)
+        ):
+            fh.write(fragment)
+        fh.write(footer())
+
+    os.replace(partial, path)
+    return path
+
+
+def build_feeds(names=None):
+    """Re-render stale fragments, then rewrite the feed files."""
+    started = time.perf_counter()
+    stale = stale_product_ids()
+    refresh_feed_fragments(stale)
+
+    files = {
+        name: write_feed(name)
+        for name in FEEDS
+        if names is None or name in names
+    }
+    return {
+        "rendered": len(stale),
+        "files": files,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
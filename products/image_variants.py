@@ -0,0 +1,158 @@
+"""
+Keeps the ``<field>_variants`` columns of uploaded images in step with
+their files.
+
+Saving a model of IMAGE_FIELDS with a new image schedules a render once
+the transaction commits. Renders run on a small thread pool
+(IMAGE_VARIANT_WORKERS) so uploads return immediately; until one
+finishes, serializers keep returning the original image and a null
+srcset. The ``build_image_variants`` command backfills existing media
+with a process pool.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection
+
+from .images import delete_variant_files, render_variants, variant_names
+from .models import Category, Product, ProductImage, PromoBanner, SubCategory
+from .services import rebuild_product_projections
+
+
+logger = logging.getLogger(__name__)
+
+IMAGE_FIELDS = {
+    ProductImage: ("image",),
+    Category: ("image",),
+    SubCategory: ("image",),
+    PromoBanner: ("image", "image_mobile"),
+}
+
+# how products reach the models whose variants their cards and
+# detail documents embed
+PRODUCT_LOOKUPS = {
+    ProductImage: "productimage",
+    SubCategory: "category",
+    Category: "category__category",
+}
+
+_executor = None
+_lock = threading.Lock()
+
+
+def variants_field(field):
+    return f"{field}_variants"
+
+
+def needs_variants(instance, field):
+    name = getattr(instance, field).name or None
+    return name != getattr(instance, variants_field(field)).get("source")
+
+
+def pending_images(model, field, force=False):
+    """``(pk, name)`` of the images of ``model.field`` without current variants."""
+    rows = (
+        model.objects
+        .exclude(**{f"{field}__isnull": True})
+        .exclude(**{field: ""})
+        .order_by("pk")
+        .values_list("pk", field, variants_field(field))
+    )
+    for pk, name, variants in rows.iterator():
+        if force or variants.get("source") != name:
+            yield pk, name
+
+
+def store_variants(model, pk, field, variants):
+    """
+    Save ``variants`` rendered for ``model.field`` of row ``pk``, unless the
+    image was replaced while they were rendered. Returns whether they were
+    saved; files of the previous render are deleted.
+    """
+    column = variants_field(field)
+    previous = model.objects.filter(pk=pk).values_list(column, flat=True).first()
+    updated = (
+        model.objects
+        .filter(pk=pk, **{field: variants["source"]})
+        .update(**{column: variants})
+    )
+
+    rendered = set(variant_names(variants))
+    if not updated:
+        delete_variant_files(rendered)
+        return False
+
+    delete_variant_files(set(variant_names(previous or {})) - rendered)
+    return True
+
+
+def build_variants(model, pk, field, force=False):
+    """Render and store the variants of one image; returns whether they changed."""
+    column = variants_field(field)
+    row = model.objects.filter(pk=pk).values_list(field, column).first()
+    if row is None:
+        return False
+
+    name, variants = row
+    if not name:
+        if not variants:
+            return False
+        model.objects.filter(pk=pk).update(**{column: {}})
+        delete_variant_files(variant_names(variants))
+        return True
+
+    if variants.get("source") == name and not force:
+        return False
+    return store_variants(model, pk, field, render_variants(name))
+
+
+def refresh_image_projections(model, pks):
+    """Rebuild the cards and detail documents embedding variants of ``pks``."""
+    lookup = PRODUCT_LOOKUPS.get(model)
+    if lookup is None:
+        return
+
+    product_ids = (
+        Product.objects
+        .filter(**{f"{lookup}__in": pks})
+        .values_list("id", flat=True)
+        .distinct()
+    )
+    rebuild_product_projections(product_ids, only=("cards", "documents"))
+
+
+# -----------------------------
+# background renders
+# -----------------------------
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_VARIANT_WORKERS,
+                thread_name_prefix="image-variants",
+            )
+        return _executor
+
+
+def _build_in_background(model, pk, field):
+    try:
+        if build_variants(model, pk, field):
+            refresh_image_projections(model, [pk])
+    except Exception:
+        logger.exception(
+            "Image variants failed for %s %s.%s", model.__name__, pk, field
+        )
+    finally:
+        connection.close()
+
+
+def schedule_variants(model, pk, field):
+    """Render the variants of one image, on the pool unless IMAGE_VARIANTS_ASYNC is off."""
+    if settings.IMAGE_VARIANTS_ASYNC:
+        _get_executor().submit(_build_in_background, model, pk, field)
+    elif build_variants(model, pk, field):
+        refresh_image_projections(model, [pk])
@@ -0,0 +1,165 @@
+"""
+Responsive derivatives of uploaded images.
+
+An upload is rendered once into WebP and JPEG copies at the widths of
+IMAGE_VARIANT_WIDTHS (never wider than the original) plus a 16px wide
+placeholder. The result is kept as JSON next to the image field
+(``<field>_variants``)::
+
+    {
+        "source": "products/images/photo.jpg",
+        "width": 2400,
+        "height": 1600,
+        "placeholder": "data:image/webp;base64,...",
+        "webp": [{"width": 320, "height": 213, "name": "variants/..."}, ...],
+        "jpeg": [...],
+    }
+
+and served to clients as a ``srcset`` structure (see ``srcset``).
+Nothing here touches the database; products/image_variants.py stores the
+results and schedules the work.
+"""
+import base64
+import io
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+
+VARIANTS_DIR = "variants"
+PLACEHOLDER_WIDTH = 16
+
+# format -> (Pillow format, file extension, save options)
+FORMATS = {
+    "webp": ("WEBP", "webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "jpg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+
+def variant_widths(width):
+    """Widths rendered for an original ``width`` pixels wide."""
+    widest = min(width, max(settings.IMAGE_VARIANT_WIDTHS))
+    return sorted(w for w in settings.IMAGE_VARIANT_WIDTHS if w < widest) + [widest]
+
+
+def variant_name(source, width, extension):
+    # the full source name: photo.jpg and photo.png must not share variants
+    return f"{VARIANTS_DIR}/{source}-{width}.{extension}"
+
+
+def variant_names(variants):
+    """Files written for ``variants`` (empty for failed renders)."""
+    return [
+        variant["name"]
+        for key in FORMATS
+        for variant in variants.get(key, ())
+    ]
+
+
+def _encode(image, key, **options):
+    pil_format, _, defaults = FORMATS[key]
+    if pil_format == "JPEG" and image.mode != "RGB":
+        image = _flatten(image)
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, **{**defaults, **options})
+    return buffer.getvalue()
+
+
+def _flatten(image):
+    """RGB copy of ``image`` with transparency laid over white."""
+    image = image.convert("RGBA")
+    background = Image.new("RGB", image.size, (255, 255, 255))
+    background.paste(image, mask=image.getchannel("A"))
+    return background
+
+
+def _resized(image, width):
+    if width >= image.width:
+        return image
+    height = max(1, round(image.height * width / image.width))
+    return image.resize((width, height), Image.Resampling.LANCZOS)
+
+
+def _save(name, content):
+    # same name for every render of a source: replace instead of letting
+    # the storage pick a free name
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    return default_storage.save(name, ContentFile(content))
+
+
+def render_variants(source):
+    """
+    Render every derivative of the stored image ``source``. A file that
+    cannot be decoded yields ``{"source": ..., "error": ...}`` so it is
+    not retried until it changes.
+    """
+    try:
+        with default_storage.open(source, "rb") as fh:
+            image = Image.open(fh)
+            image = ImageOps.exif_transpose(image)
+            image.load()
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        return {"source": source, "error": str(e) or e.__class__.__name__}
+
+    if image.mode not in ("RGB", "RGBA"):
+        has_alpha = image.mode in ("LA", "PA") or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+
+    variants = {
+        "source": source,
+        "width": image.width,
+        "height": image.height,
+    }
+    for key, (_, extension, _) in FORMATS.items():
+        variants[key] = []
+        for width in variant_widths(image.width):
+            resized = _resized(image, width)
+            variants[key].append({
+                "width": resized.width,
+                "height": resized.height,
+                "name": _save(
+                    variant_name(source, resized.width, extension),
+                    _encode(resized, key),
+                ),
+            })
+
+    placeholder = _encode(_resized(image, PLACEHOLDER_WIDTH), "webp", quality=40)
+    variants["placeholder"] = (
+        "data:image/webp;base64," + base64.b64encode(placeholder).decode()
+    )
+    return variants
+
+
+def delete_variant_files(names):
+    for name in names:
+        default_storage.delete(name)
+
+
+def srcset(variants, request=None):
+    """
+    Client side of ``variants``: intrinsic size, placeholder and one
+    ``srcset`` string per format, or None while nothing is rendered.
+    Urls are absolute when a request is given, like DRF's ImageField.
+    """
+    if not variants or "error" in variants:
+        return None
+
+    def url(name):
+        location = default_storage.url(name)
+        return request.build_absolute_uri(location) if request else location
+
+    return {
+        "width": variants["width"],
+        "height": variants["height"],
+        "placeholder": variants["placeholder"],
+        "srcset": {
+            key: ", ".join(
+                f"{url(variant['name'])} {variant['width']}w"
+                for variant in variants[key]
+            )
+            for key in FORMATS
+        },
+    }
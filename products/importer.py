@@ -0,0 +1,458 @@
+"""
+Streaming bulk import of products from CSV or JSON lines.
+
+Rows are upserted by ``vendor_code`` in chunks, each in its own
+transaction, with a fixed number of bulk statements per chunk: slugs are
+made unique in memory (``bulk.unique_slug``) instead of AutoSlugField
+probing the database, statistics rows are created in bulk instead of by
+the post_save signal, and the read models are rebuilt once per chunk.
+
+Row keys (all but ``vendor_code`` optional on update; ``name``,
+``name_ru`` and ``price`` required to create a product):
+
+    vendor_code, vendor_code_public, name, name_ru, price, quantity, sale,
+    description_en, description_ru, subcategory (slug),
+    images          storage paths
+    filters         ``{"Color": "Red"}`` / ``["Color=Red"]`` in the
+                    category of the product's subcategory
+    properties      ``[{"name", "name_ru", "value", "value_ru"}]``
+    description_items  ``[{"text", "text_ru"}]``
+
+In CSV, ``images`` and ``filters`` cells are ``|`` separated and
+``properties`` / ``description_items`` cells hold JSON. A present list
+key replaces the product's existing children of that kind.
+"""
+import csv
+import json
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+
+from .bulk import precomputed_slugs, unique_slug
+from .models import (
+    FilterValue,
+    Product,
+    ProductDescriptionItem,
+    ProductImage,
+    ProductProperty,
+    ProductStatistic,
+    SubCategory,
+    public_vendor_code,
+)
+from .rollups import refresh_rollups
+from .services import rebuild_product_projections
+
+
+CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+
+TEXT_FIELDS = (
+    "name",
+    "name_ru",
+    "description_en",
+    "description_ru",
+    "vendor_code_public",
+)
+PRODUCT_FIELDS = TEXT_FIELDS + ("price", "quantity", "sale", "category_id")
+REQUIRED_ON_CREATE = ("name", "name_ru", "price")
+LIST_FIELDS = ("images", "filters", "properties", "description_items")
+
+
+# -----------------------------
+# readers
+# -----------------------------
+
+def _split(cell):
+    return [item.strip() for item in cell.split("|") if item.strip()]
+
+
+def read_csv(stream):
+    for row in csv.DictReader(stream):
+        row = {key.strip(): value for key, value in row.items() if key}
+        for key in ("images", "filters"):
+            if key in row:
+                row[key] = _split(row[key] or "")
+        for key in ("properties", "description_items"):
+            if key in row:
+                try:
+                    row[key] = json.loads(row[key] or "[]")
+                except ValueError:
+                    row[key] = ValueError(f"{key} must be a JSON list")
+        yield row
+
+
+def read_jsonl(stream):
+    for line in stream:
+        line = line.strip()
+        if not line:
+            yield None
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield ValueError(f"invalid JSON: {e}")
+
+
+READERS = {
+    "csv": read_csv,
+    "jsonl": read_jsonl,
+}
+
+
+def detect_format(filename):
+    if filename.lower().endswith(".csv"):
+        return "csv"
+    if filename.lower().endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    raise ValueError(f"Unknown import format of {filename!r} (csv or jsonl)")
+
+
+# -----------------------------
+# cleaning
+# -----------------------------
+
+def _decimal(value, field, max_digits, decimal_places=2):
+    try:
+        value = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise ValueError(f"{field} must be a number") from None
+    # NaN / sNaN / Infinity do not compare, check them first
+    if not value.is_finite() or value < 0:
+        raise ValueError(f"{field} must be a positive number")
+    try:
+        value = value.quantize(Decimal(1).scaleb(-decimal_places))
+    except InvalidOperation:
+        raise ValueError(f"{field} is out of range") from None
+    if value.adjusted() >= max_digits - decimal_places:
+        raise ValueError(f"{field} is out of range")
+    return value
+
+
+def _int(value, field, maximum=None):
+    try:
+        value = int(str(value).strip())
+    except ValueError:
+        raise ValueError(f"{field} must be an integer") from None
+    if value < 0 or (maximum is not None and value > maximum):
+        raise ValueError(f"{field} is out of range")
+    return value
+
+
+def _filter_pairs(value):
+    if isinstance(value, dict):
+        pairs = []
+        for name, values in value.items():
+            for item in values if isinstance(values, list) else [values]:
+                pairs.append((name, item))
+        return pairs
+
+    pairs = []
+    for item in value:
+        name, sep, filter_value = str(item).partition("=")
+        if not sep:
+            raise ValueError(f"filter {item!r} must look like Type=Value")
+        pairs.append((name, filter_value))
+    return pairs
+
+
+def _children(value, key, fields):
+    if not isinstance(value, list) or not all(isinstance(i, dict) for i in value):
+        raise ValueError(f"{key} must be a list of objects")
+    children = []
+    for item in value:
+        missing = [field for field in fields if not item.get(field)]
+        if missing:
+            raise ValueError(f"{key} item is missing {', '.join(missing)}")
+        children.append({field: str(item[field]) for field in fields})
+    return children
+
+
+class ProductImporter:
+    """
+    Upsert product rows by ``vendor_code``.
+
+    Lookups (subcategories, filter values, taken slugs) are loaded once,
+    so each chunk costs the same handful of statements whatever its size.
+    ``progress`` is called with ``stats()`` after every chunk.
+    """
+
+    def __init__(self, chunk_size=CHUNK_SIZE, progress=None):
+        self.chunk_size = chunk_size
+        self.progress = progress
+
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+        self._started = None
+        self._subcategory_ids = set()
+
+        self.subcategories = {
+            slug: (pk, category_id)
+            for pk, slug, category_id in SubCategory.objects.values_list(
+                "id", "slug", "category_id"
+            )
+        }
+        self.category_of = {
+            pk: category_id for pk, category_id in self.subcategories.values()
+        }
+        self.filter_values = {
+            (category_id, name.casefold(), value.casefold()): pk
+            for pk, category_id, name, value in FilterValue.objects.values_list(
+                "id", "filter__category_id", "filter__name", "value"
+            )
+        }
+        self.slug_field = Product._meta.get_field("slug")
+        self.taken = set(Product.objects.values_list("slug", flat=True))
+        self.max_lengths = {
+            field: Product._meta.get_field(field).max_length
+            for field in TEXT_FIELDS
+        }
+        self.price_field = Product._meta.get_field("price")
+
+    def stats(self):
+        elapsed = time.perf_counter() - self._started if self._started else 0
+        return {
+            "rows": self.rows,
+            "created": self.created,
+            "updated": self.updated,
+            "failed": self.failed,
+            "seconds": round(elapsed, 2),
+            "rows_per_second": round(self.rows / elapsed) if elapsed else 0,
+        }
+
+    def error(self, row, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "error": message})
+
+    def run(self, rows):
+        """Import an iterable of row dicts; returns ``stats()``."""
+        self._started = time.perf_counter()
+        rows = enumerate(rows, start=1)
+
+        while chunk := list(islice(rows, self.chunk_size)):
+            self.import_chunk(chunk)
+            if self.progress:
+                self.progress(self.stats())
+
+        if self._subcategory_ids:
+            refresh_rollups(self._subcategory_ids)
+        return self.stats()
+
+    # -----------------------------
+    # rows
+    # -----------------------------
+
+    def clean(self, raw):
+        if isinstance(raw, Exception):
+            raise raw
+        if not isinstance(raw, dict):
+            raise ValueError("row must be an object")
+
+        vendor_code = str(raw.get("vendor_code") or "").strip()
+        if not vendor_code:
+            raise ValueError("vendor_code is required")
+        row = {"vendor_code": vendor_code}
+
+        for field in TEXT_FIELDS:
+            if field in raw:
+                value = str(raw[field] or "").strip()
+                if not value and field in REQUIRED_ON_CREATE:
+                    raise ValueError(f"{field} cannot be blank")
+                if len(value) > self.max_lengths[field]:
+                    raise ValueError(
+                        f"{field} is longer than {self.max_lengths[field]}"
+                    )
+                row[field] = value
+        if "price" in raw:
+            row["price"] = _decimal(
+                raw["price"],
+                "price",
+                self.price_field.max_digits,
+                self.price_field.decimal_places,
+            )
+        if "quantity" in raw:
+            row["quantity"] = _int(raw["quantity"], "quantity")
+        if "sale" in raw:
+            row["sale"] = _int(raw["sale"] or 0, "sale", maximum=100)
+
+        if "subcategory" in raw:
+            subcategory = self.subcategories.get(str(raw["subcategory"]).strip())
+            if subcategory is None:
+                raise ValueError(f"unknown subcategory {raw['subcategory']!r}")
+            row["category_id"] = subcategory[0]
+
+        for key in LIST_FIELDS:
+            if isinstance(raw.get(key), Exception):
+                raise raw[key]
+        if "images" in raw:
+            row["images"] = [str(path) for path in raw["images"] or []]
+        if "filters" in raw:
+            row["filters"] = _filter_pairs(raw["filters"] or [])
+        if "properties" in raw:
+            row["properties"] = _children(
+                raw["properties"] or [],
+                "properties",
+                ("name", "name_ru", "value", "value_ru"),
+            )
+        if "description_items" in raw:
+            row["description_items"] = _children(
+                raw["description_items"] or [],
+                "description_items",
+                ("text", "text_ru"),
+            )
+        return row
+
+    def resolve_filters(self, pairs, category_id):
+        value_ids = []
+        for name, value in pairs:
+            pk = self.filter_values.get(
+                (category_id, name.strip().casefold(), str(value).strip().casefold())
+            )
+            if pk is None:
+                raise ValueError(f"unknown filter {name}={value}")
+            value_ids.append(pk)
+        return list(dict.fromkeys(value_ids))
+
+    # -----------------------------
+    # chunks
+    # -----------------------------
+
+    def import_chunk(self, chunk):
+        rows = {}
+        numbers = {}
+        for number, raw in chunk:
+            if raw is None:
+                continue
+            self.rows += 1
+            try:
+                row = self.clean(raw)
+            except ValueError as e:
+                self.error(number, str(e))
+                continue
+            # the last row of a vendor code wins
+            rows[row["vendor_code"]] = row
+            numbers[row["vendor_code"]] = number
+
+        existing = {}
+        for product in Product.objects.filter(vendor_code__in=rows).order_by("id"):
+            existing.setdefault(product.vendor_code, product)
+
+        now = timezone.now()
+        to_create = []
+        to_update = []
+        touched = {}
+        previous_subcategories = set()
+
+        for vendor_code, row in rows.items():
+            product = existing.get(vendor_code)
+            try:
+                if product is None:
+                    missing = [f for f in REQUIRED_ON_CREATE if not row.get(f)]
+                    if missing:
+                        raise ValueError(
+                            f"new product is missing {', '.join(missing)}"
+                        )
+                    product = Product(vendor_code=vendor_code)
+                else:
+                    previous_subcategories.add(product.category_id)
+
+                category_id = row.get("category_id", product.category_id)
+                if "filters" in row:
+                    row["filter_ids"] = self.resolve_filters(
+                        row["filters"], self.category_of.get(category_id)
+                    )
+            except ValueError as e:
+                self.error(numbers[vendor_code], str(e))
+                continue
+
+            for field in PRODUCT_FIELDS:
+                if field in row:
+                    setattr(product, field, row[field])
+
+            if product.pk is None:
+                product.slug = unique_slug(self.slug_field, product.name, self.taken)
+                if not product.vendor_code_public:
+                    product.vendor_code_public = public_vendor_code()
+                to_create.append(product)
+            else:
+                product.updated_at = now
+                to_update.append(product)
+            touched[vendor_code] = product
+
+        with transaction.atomic():
+            Product.objects.bulk_create(precomputed_slugs(to_create))
+            Product.objects.bulk_update(
+                to_update, PRODUCT_FIELDS + ("updated_at",)
+            )
+            ProductStatistic.objects.bulk_create(
+                [ProductStatistic(product=product) for product in to_create],
+                ignore_conflicts=True,
+            )
+            self.replace_children(touched, rows)
+
+        self.created += len(to_create)
+        self.updated += len(to_update)
+
+        product_ids = [product.id for product in touched.values()]
+        rebuild_product_projections(product_ids)
+        self._subcategory_ids |= {
+            product.category_id for product in touched.values()
+        } | previous_subcategories
+        self._subcategory_ids.discard(None)
+
+    def replace_children(self, products, rows):
+        """Swap the children of every list key present in the rows."""
+        def replaced(key):
+            return [
+                (product, rows[vendor_code][key])
+                for vendor_code, product in products.items()
+                if key in rows[vendor_code]
+            ]
+
+        through = Product.filters.through
+        for key, model, build in (
+            (
+                "images",
+                ProductImage,
+                lambda product, path: ProductImage(product=product, image=path),
+            ),
+            (
+                "properties",
+                ProductProperty,
+                lambda product, item: ProductProperty(product=product, **item),
+            ),
+            (
+                "description_items",
+                ProductDescriptionItem,
+                lambda product, item: ProductDescriptionItem(product=product, **item),
+            ),
+            (
+                "filter_ids",
+                through,
+                lambda product, pk: through(product_id=product.id, filtervalue_id=pk),
+            ),
+        ):
+            items = replaced(key)
+            if not items:
+                continue
+            model.objects.filter(
+                product_id__in=[product.id for product, _ in items]
+            ).delete()
+            model.objects.bulk_create([
+                build(product, value)
+                for product, values in items
+                for value in values
+            ])
+
+
+def import_products(stream, format, chunk_size=CHUNK_SIZE, progress=None):
+    """Import a text ``stream`` of ``format`` (``csv`` or ``jsonl``)."""
+    importer = ProductImporter(chunk_size=chunk_size, progress=progress)
+    stats = importer.run(READERS[format](stream))
+    return {**stats, "errors": importer.errors}
@@ -0,0 +1,98 @@
+"""
+One-language responses for the bilingual catalog models.
+
+Every text is stored twice (``name``/``name_ru``, ``description_en``/
+``description_ru``, ...) and serialized twice by default. A request asking
+for a language (``?lang=en|ru``, else ``Accept-Language``) gets a single
+copy under the unsuffixed name: ``name``, ``value``, ``text``,
+``description``. ``?lang=all`` keeps both copies.
+
+``?fields=`` (product list and detail) further limits each item to the
+named top-level fields, after localization.
+"""
+from django.utils.translation.trans_real import parse_accept_lang_header
+from rest_framework.exceptions import ValidationError
+
+
+LANGUAGES = ("en", "ru")
+
+# English field -> its Russian twin
+TRANSLATED_FIELDS = {
+    "name": "name_ru",
+    "value": "value_ru",
+    "text": "text_ru",
+    "description_en": "description_ru",
+}
+
+RUSSIAN_TWINS = {ru: en for en, ru in TRANSLATED_FIELDS.items()}
+
+# name the kept copy is emitted under
+LOCALIZED_NAMES = {
+    "description_en": "description",
+}
+
+
+def localized_name(field):
+    return LOCALIZED_NAMES.get(field, field)
+
+
+def request_language(request):
+    """Language the response is localized to, or None for both copies."""
+    lang = request.GET.get("lang")
+    if lang:
+        if lang == "all":
+            return None
+        if lang not in LANGUAGES:
+            raise ValidationError({
+                "lang": f"One of {', '.join(LANGUAGES)} or all"
+            })
+        return lang
+
+    for code, _ in parse_accept_lang_header(request.META.get("HTTP_ACCEPT_LANGUAGE", "")):
+        code = code.split("-")[0]
+        if code in LANGUAGES:
+            return code
+    return None
+
+
+def localize(data, lang):
+    """
+    Localize already serialized ``data`` (nested dicts and lists), for
+    prebuilt documents that cannot go through the serializers again.
+    """
+    if isinstance(data, list):
+        return [localize(item, lang) for item in data]
+    if not isinstance(data, dict):
+        return data
+
+    localized = {}
+    for key, value in data.items():
+        if key in TRANSLATED_FIELDS and TRANSLATED_FIELDS[key] in data:
+            if lang == "ru":
+                value = data[TRANSLATED_FIELDS[key]]
+            key = localized_name(key)
+        elif key in RUSSIAN_TWINS and RUSSIAN_TWINS[key] in data:
+            continue
+        localized[key] = localize(value, lang)
+    return localized
+
+
+# -----------------------------
+# sparse fieldsets
+# -----------------------------
+
+def parse_fields(value):
+    """Names of ``?fields=a,b``; None when every field is wanted."""
+    if not value:
+        return None
+    return frozenset(name.strip() for name in value.split(",") if name.strip()) or None
+
+
+def select_fields(mapping, requested):
+    """Entries of ``mapping`` (fields or serialized data) named in ``requested``."""
+    unknown = requested - mapping.keys()
+    if unknown:
+        raise ValidationError({
+            "fields": f"Unknown fields: {', '.join(sorted(unknown))}"
+        })
+    return {name: value for name, value in mapping.items() if name in requested}
@@ -0,0 +1,75 @@
+import json
+import subprocess
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from products.benchmarks import SCENARIOS, seed_shop
+from products.facets import build_indexes, drop_indexes
+from products.models import SubCategory
+
+
+def git_revision():
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a synthetic shop of each size inside a transaction, run a "
+        "benchmark scenario against it and roll everything back. The JSON "
+        "report is tagged with the git revision so runs can be diffed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("scenario", choices=sorted(SCENARIOS))
+        parser.add_argument(
+            "--products",
+            type=int,
+            nargs="+",
+            default=[1_000, 10_000, 100_000],
+        )
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--output", help="Write the JSON report to this file")
+
+    def handle(self, *args, **options):
+        scenario = SCENARIOS[options["scenario"]]
+        report = {
+            "scenario": options["scenario"],
+            "revision": git_revision(),
+            "repeat": options["repeat"],
+            "runs": [],
+        }
+
+        for size in options["products"]:
+            if size <= 0:
+                raise CommandError("--products must be positive")
+
+            self.stdout.write(f"Seeding {size} products...")
+            with transaction.atomic():
+                seed_shop(size)
+                if getattr(settings, "FACET_INDEX_ENABLED", True):
+                    # background builds cannot see the uncommitted catalog
+                    build_indexes(SubCategory.objects.values_list("id", flat=True))
+                results = scenario(options["repeat"])
+                transaction.set_rollback(True)
+            # slugs, counts, documents and indexes of the rolled back rows
+            cache.clear()
+            drop_indexes()
+
+            report["runs"].append({"products": size, "results": results})
+            self.stdout.write(json.dumps(report["runs"][-1], ensure_ascii=False, indent=2))
+
+        if options["output"]:
+            with open(options["output"], "w") as fh:
+                json.dump(report, fh, ensure_ascii=False, indent=2)
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from products.feeds import FEEDS, build_feeds
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-render the feed fragments of changed products and rewrite the "
+        "Google Merchant and Yandex YML files under MEDIA_ROOT/feeds/. "
+        "Run periodically (e.g. hourly from cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--feed",
+            nargs="+",
+            choices=sorted(FEEDS),
+            help="Rewrite only these feeds",
+        )
+
+    def handle(self, *args, **options):
+        result = build_feeds(options["feed"])
+        for name, path in result["files"].items():
+            self.stdout.write(f"{name}: {path}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Feeds built in {result['seconds']}s "
+            f"({result['rendered']} products re-rendered)"
+        ))
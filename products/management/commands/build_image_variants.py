@@ -0,0 +1,101 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from products.image_variants import (
+    IMAGE_FIELDS,
+    pending_images,
+    refresh_image_projections,
+    store_variants,
+)
+from products.images import render_variants
+
+
+MODELS = {model._meta.model_name: model for model in IMAGE_FIELDS}
+
+
+def _init_worker():
+    # spawned workers start without the app registry
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = (
+        "Render the responsive variants of every image that has none (or an "
+        "outdated set) on a process pool, then refresh the product cards and "
+        "documents embedding them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--model",
+            nargs="+",
+            choices=sorted(MODELS),
+            help="Only images of these models",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Rendering processes (1 renders in this process)",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Re-render images whose variants are current",
+        )
+
+    def handle(self, *args, **options):
+        models = [MODELS[name] for name in options["model"] or sorted(MODELS)]
+        workers = options["workers"]
+
+        pool = None
+        if workers > 1:
+            # workers only render; every query stays in this process
+            connections.close_all()
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+
+        try:
+            for model in models:
+                for field in IMAGE_FIELDS[model]:
+                    self.build(model, field, options["force"], pool, workers)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        self.stdout.write(self.style.SUCCESS("Image variants built"))
+
+    def build(self, model, field, force, pool, workers):
+        pending = list(pending_images(model, field, force))
+        label = f"{model._meta.model_name}.{field}"
+        if not pending:
+            self.stdout.write(f"{label}: up to date")
+            return
+
+        names = [name for _, name in pending]
+        if pool is None:
+            rendered = map(render_variants, names)
+        else:
+            rendered = pool.map(
+                render_variants,
+                names,
+                chunksize=max(1, len(names) // (workers * 4)),
+            )
+
+        saved, failed = [], 0
+        for done, ((pk, _), variants) in enumerate(zip(pending, rendered), 1):
+            if "error" in variants:
+                failed += 1
+            if store_variants(model, pk, field, variants):
+                saved.append(pk)
+            if done % 100 == 0 or done == len(pending):
+                self.stdout.write(f"{label}: {done}/{len(pending)}")
+
+        refresh_image_projections(model, saved)
+        if failed:
+            self.stdout.write(self.style.WARNING(
+                f"{label}: {failed} images could not be decoded"
+            ))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+
+from products.export import CHUNK_SIZE, WRITERS, export_rows
+from products.views import parse_updated_since
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream the whole catalog as NDJSON or CSV with a server-side "
+        "cursor; the output can be fed back to import_products."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=sorted(WRITERS), default="ndjson")
+        parser.add_argument("--output", help="File to write, stdout by default")
+        parser.add_argument(
+            "--updated-since",
+            help="Only products changed since this ISO date or datetime",
+        )
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            updated_since = parse_updated_since(options["updated_since"])
+        except ValidationError:
+            raise CommandError("--updated-since expects an ISO 8601 date or datetime")
+
+        lines = WRITERS[options["format"]](
+            export_rows(updated_since, chunk_size=options["chunk_size"])
+        )
+
+        if not options["output"]:
+            for line in lines:
+                self.stdout.write(line, ending="")
+            return
+
+        rows = -1 if options["format"] == "csv" else 0
+        with open(options["output"], "w", encoding="utf-8", newline="") as fh:
+            for line in lines:
+                fh.write(line)
+                rows += 1
+        self.stderr.write(f"Exported {rows} products to {options['output']}")
@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from orders.synthetic import SYNTHETIC_PASSWORD, generate_customers
+from products.synthetic import generate_catalog
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk insert a synthetic catalog (taxonomy, filters, products with "
+        "images, properties and reviews) and customers with carts, "
+        "wishlists and orders. Meant for local load and benchmark databases."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=10_000)
+        parser.add_argument("--categories", type=int, default=10)
+        parser.add_argument(
+            "--subcategories", type=int, default=5, help="Per category"
+        )
+        parser.add_argument(
+            "--filter-types", type=int, default=4, help="Per category"
+        )
+        parser.add_argument(
+            "--filter-values", type=int, default=6, help="Per filter type"
+        )
+        parser.add_argument(
+            "--reviews", type=int, default=3, help="Average per product"
+        )
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--cart-items", type=int, default=3, help="Per user")
+        parser.add_argument("--wishlist-items", type=int, default=3, help="Per user")
+        parser.add_argument("--orders", type=int, default=2, help="Per user")
+        parser.add_argument("--order-items", type=int, default=3, help="Per order")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options["products"] <= 0:
+            raise CommandError("--products must be positive")
+
+        with transaction.atomic():
+            product_ids = generate_catalog(
+                products=options["products"],
+                categories=options["categories"],
+                subcategories=options["subcategories"],
+                filter_types=options["filter_types"],
+                filter_values=options["filter_values"],
+                reviews=options["reviews"],
+                seed=options["seed"],
+            )
+            users = generate_customers(
+                product_ids,
+                users=options["users"],
+                cart_items=options["cart_items"],
+                wishlist_items=options["wishlist_items"],
+                orders=options["orders"],
+                order_items=options["order_items"],
+                seed=options["seed"],
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {len(product_ids)} products and {len(users)} users "
+            f"(password {SYNTHETIC_PASSWORD!r})"
+        ))
@@ -0,0 +1,50 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.importer import CHUNK_SIZE, READERS, detect_format, import_products
+
+
+class Command(BaseCommand):
+    help = (
+        "Upsert products by vendor_code from a CSV or JSON lines file, "
+        "streamed in bulk chunks (see products.importer for the row format)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument(
+            "--format",
+            choices=sorted(READERS),
+            help="Defaults to the file extension",
+        )
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            format = options["format"] or detect_format(options["path"])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        def progress(stats):
+            self.stdout.write(
+                f"{stats['rows']} rows ({stats['created']} created, "
+                f"{stats['updated']} updated, {stats['failed']} failed) "
+                f"in {stats['seconds']}s, {stats['rows_per_second']} rows/s"
+            )
+
+        with open(options["path"], encoding="utf-8-sig", newline="") as fh:
+            report = import_products(
+                fh,
+                format,
+                chunk_size=options["chunk_size"],
+                progress=progress,
+            )
+
+        for error in report["errors"]:
+            self.stderr.write(f"row {error['row']}: {error['error']}")
+        self.stdout.write(self.style.SUCCESS(
+            "Import finished: " + json.dumps(
+                {key: value for key, value in report.items() if key != "errors"}
+            )
+        ))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from products.models import Product
+from products.services import PROJECTIONS, rebuild_product_projections
+
+
+class Command(BaseCommand):
+    help = "Rebuild the read models derived from products (search index, cards, ...)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--only",
+            nargs="+",
+            choices=sorted(PROJECTIONS),
+            help="Rebuild only these projections",
+        )
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        product_ids = list(
+            Product.objects.order_by("id").values_list("id", flat=True)
+        )
+
+        for start in range(0, len(product_ids), chunk_size):
+            rebuild_product_projections(
+                product_ids[start:start + chunk_size],
+                only=options["only"],
+            )
+            self.stdout.write(
+                f"Rebuilt {min(start + chunk_size, len(product_ids))}"
+                f"/{len(product_ids)}"
+            )
+
+        self.stdout.write(self.style.SUCCESS("Projections rebuilt"))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from products.rollups import reconcile_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount the category and subcategory rollups (views, sales, "
+        "product and in-stock counts) from the products. Run periodically "
+        "to correct drift of the incremental counters."
+    )
+
+    def handle(self, *args, **options):
+        reconcile_rollups()
+        self.stdout.write(self.style.SUCCESS("Category rollups reconciled"))
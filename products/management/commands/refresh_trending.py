@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from products.trending import refresh_trending
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the global and per subcategory trending rankings. "
+        "Run periodically (e.g. hourly from cron): sales move products up "
+        "in between, but only this decays recent activity."
+    )
+
+    def handle(self, *args, **options):
+        rows = refresh_trending()
+        self.stdout.write(self.style.SUCCESS(f"Trending rankings refreshed ({rows} rows)"))
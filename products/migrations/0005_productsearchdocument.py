@@ -0,0 +1,36 @@
+# Generated by Django 5.1.3 on 2026-10-18 10:38
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_product_vendor_code_product_vendor_code_public'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.CreateModel(
+            name='ProductSearchDocument',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='products.product')),
+                ('name_en', models.TextField(blank=True)),
+                ('name_ru', models.TextField(blank=True)),
+                ('body_en', models.TextField(blank=True, help_text='Subcategory, filter values and properties')),
+                ('body_ru', models.TextField(blank=True)),
+                ('description_en', models.TextField(blank=True)),
+                ('description_ru', models.TextField(blank=True)),
+                ('names', models.TextField(blank=True, help_text='Both product names, used for typo tolerant matching')),
+                ('search_vector', django.contrib.postgres.search.SearchVectorField(null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='product_search_vector_idx'), django.contrib.postgres.indexes.GinIndex(fields=['names'], name='product_search_names_trgm_idx', opclasses=['gin_trgm_ops'])],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-18 10:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_productsearchdocument'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subcategory',
+            name='facet_version',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Bumped whenever products or filters of the subcategory change'),
+        ),
+    ]
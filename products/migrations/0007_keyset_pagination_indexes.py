@@ -0,0 +1,21 @@
+# Generated by Django 5.1.3 on 2026-10-18 10:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_subcategory_facet_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', '-created_at', '-id'], name='product_category_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productstatistic',
+            index=models.Index(fields=['-sold', '-product'], name='productstat_sold_idx'),
+        ),
+    ]
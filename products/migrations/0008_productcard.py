@@ -0,0 +1,46 @@
+# Generated by Django 5.1.3 on 2026-10-18 10:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductCard',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='card', serialize=False, to='products.product')),
+                ('name', models.CharField(max_length=255)),
+                ('name_ru', models.CharField(max_length=120)),
+                ('slug', models.CharField(max_length=50)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('discounted_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('sale', models.PositiveIntegerField(default=0)),
+                ('vendor_code_public', models.CharField(blank=True, max_length=255, null=True)),
+                ('image', models.CharField(blank=True, help_text='First product image', max_length=100, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('subcategory_id', models.BigIntegerField(null=True)),
+                ('subcategory_name', models.CharField(blank=True, max_length=120)),
+                ('subcategory_name_ru', models.CharField(blank=True, max_length=120)),
+                ('subcategory_slug', models.CharField(blank=True, max_length=50)),
+                ('subcategory_image', models.ImageField(blank=True, null=True, upload_to='')),
+                ('category_id', models.BigIntegerField(null=True)),
+                ('category_name', models.CharField(blank=True, max_length=120)),
+                ('category_name_ru', models.CharField(blank=True, max_length=120)),
+                ('category_slug', models.CharField(blank=True, max_length=50)),
+                ('category_image', models.ImageField(blank=True, null=True, upload_to='')),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('sold', models.PositiveIntegerField(default=0)),
+                ('rating', models.DecimalField(decimal_places=2, default=0, max_digits=3)),
+                ('reviews_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['subcategory_id', '-created_at', '-product'], name='card_subcategory_created_idx'), models.Index(fields=['-sold', '-product'], name='card_sold_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.3 on 2026-10-18 10:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_productcard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('sold', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity', to='products.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='productactivity_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'day'), name='unique_product_activity_day')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductRanking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(default=0)),
+                ('card', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rankings', to='products.productcard')),
+                ('subcategory', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='rankings', to='products.subcategory')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['subcategory', '-score', '-card'], name='ranking_scope_score_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('subcategory__isnull', True)), fields=('card',), name='unique_global_ranking_card'), models.UniqueConstraint(fields=('subcategory', 'card'), name='unique_subcategory_ranking_card')],
+            },
+        ),
+    ]
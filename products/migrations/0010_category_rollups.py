@@ -0,0 +1,74 @@
+# Generated by Django 5.1.3 on 2026-10-18 10:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def populate_rollups(apps, schema_editor):
+    Category = apps.get_model("products", "Category")
+    SubCategory = apps.get_model("products", "SubCategory")
+    CategoryStatistic = apps.get_model("products", "CategoryStatistic")
+    SubCategoryStatistic = apps.get_model("products", "SubCategoryStatistic")
+
+    totals = {}
+    subcategories = SubCategory.objects.annotate(
+        views=Sum("product__statistics__views"),
+        sold=Sum("product__statistics__sold"),
+        product_count=Count("product"),
+        in_stock_count=Count("product", filter=Q(product__quantity__gt=0)),
+    )
+    for subcategory in subcategories:
+        row = {
+            "views": subcategory.views or 0,
+            "sold": subcategory.sold or 0,
+            "product_count": subcategory.product_count,
+            "in_stock_count": subcategory.in_stock_count,
+        }
+        SubCategoryStatistic.objects.create(subcategory_id=subcategory.id, **row)
+        category = totals.setdefault(subcategory.category_id, dict.fromkeys(row, 0))
+        for field, value in row.items():
+            category[field] += value
+
+    for category_id in Category.objects.values_list("id", flat=True):
+        CategoryStatistic.objects.create(
+            category_id=category_id,
+            **totals.get(category_id, {}),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_trending_rankings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryStatistic',
+            fields=[
+                ('category', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='statistics', serialize=False, to='products.category')),
+                ('views', models.PositiveBigIntegerField(default=0)),
+                ('sold', models.PositiveBigIntegerField(default=0)),
+                ('product_count', models.PositiveIntegerField(default=0)),
+                ('in_stock_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-views'], name='categorystat_views_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SubCategoryStatistic',
+            fields=[
+                ('subcategory', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='statistics', serialize=False, to='products.subcategory')),
+                ('views', models.PositiveBigIntegerField(default=0)),
+                ('sold', models.PositiveBigIntegerField(default=0)),
+                ('product_count', models.PositiveIntegerField(default=0)),
+                ('in_stock_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-views'], name='subcategorystat_views_idx')],
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-18 10:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_category_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductDetailDocument',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='detail_document', serialize=False, to='products.product')),
+                ('slug', models.CharField(max_length=50, unique=True)),
+                ('body', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
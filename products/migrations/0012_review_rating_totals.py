@@ -0,0 +1,84 @@
+# Generated by Django 5.1.3 on 2026-10-18 10:55
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_rating_totals(apps, schema_editor):
+    ProductReview = apps.get_model("products", "ProductReview")
+    ProductStatistic = apps.get_model("products", "ProductStatistic")
+    ProductCard = apps.get_model("products", "ProductCard")
+
+    # only approved reviews count from now on
+    ProductStatistic.objects.update(reviews_count=0, rating=0)
+    ProductCard.objects.update(reviews_count=0, rating=0)
+
+    totals = (
+        ProductReview.objects
+        .filter(is_approved=True)
+        .order_by()
+        .values("product_id")
+        .annotate(**{
+            f"stars_{stars}": Count("id", filter=Q(rating=stars))
+            for stars in range(1, 6)
+        })
+    )
+    for row in totals:
+        product_id = row.pop("product_id")
+        count = sum(row.values())
+        rating_sum = sum(stars * row[f"stars_{stars}"] for stars in range(1, 6))
+        rating = (Decimal(rating_sum) / count).quantize(Decimal("0.01"))
+
+        ProductStatistic.objects.filter(product_id=product_id).update(
+            rating_sum=rating_sum,
+            reviews_count=count,
+            rating=rating,
+            **row,
+        )
+        ProductCard.objects.filter(product_id=product_id).update(
+            reviews_count=count,
+            rating=rating,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_productdetaildocument'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productstatistic',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='productstatistic',
+            name='stars_1',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='productstatistic',
+            name='stars_2',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='productstatistic',
+            name='stars_3',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='productstatistic',
+            name='stars_4',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='productstatistic',
+            name='stars_5',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rating_totals, migrations.RunPython.noop),
+    ]
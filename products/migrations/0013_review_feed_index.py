@@ -0,0 +1,17 @@
+# Generated by Django 5.1.3 on 2026-10-18 10:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0012_review_rating_totals'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productreview',
+            index=models.Index(fields=['product', 'is_approved', '-created_at', '-id'], name='review_feed_idx'),
+        ),
+    ]
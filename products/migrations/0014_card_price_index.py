@@ -0,0 +1,17 @@
+# Generated by Django 5.1.3 on 2026-10-18 10:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0013_review_feed_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productcard',
+            index=models.Index(fields=['subcategory_id', 'price'], name='card_subcategory_price_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-18 11:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0014_card_price_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductFeedFragment',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='feed_fragment', serialize=False, to='products.product')),
+                ('google', models.TextField()),
+                ('yandex', models.TextField()),
+                ('source_updated_at', models.DateTimeField()),
+            ],
+        ),
+    ]
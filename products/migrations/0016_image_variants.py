@@ -0,0 +1,53 @@
+# Generated by Django 5.1.3 on 2026-10-18 11:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0015_productfeedfragment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Responsive derivatives of image (products/images.py)'),
+        ),
+        migrations.AddField(
+            model_name='productcard',
+            name='category_image_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='productcard',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='productcard',
+            name='subcategory_image_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Responsive derivatives of image (products/images.py)'),
+        ),
+        migrations.AddField(
+            model_name='promobanner',
+            name='image_mobile_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Responsive derivatives of image_mobile (products/images.py)'),
+        ),
+        migrations.AddField(
+            model_name='promobanner',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Responsive derivatives of image (products/images.py)'),
+        ),
+        migrations.AddField(
+            model_name='subcategory',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Responsive derivatives of image (products/images.py)'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.3 on 2026-10-18 11:59
+
+import products.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0016_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='slug',
+            field=products.models.ProductSlugField(editable=False, populate_from='name', unique=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.3 on 2026-10-18 12:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0017_product_slug_field'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productranking',
+            index=models.Index(condition=models.Q(('subcategory__isnull', True)), fields=['-score', '-card'], name='ranking_global_score_idx'),
+        ),
+    ]
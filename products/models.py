@@ -1,4 +1,6 @@
 from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from autoslug import AutoSlugField
 from core.models.timestamped import TimeStampedModel
 from django.core.validators import MinValueValidator, MaxValueValidator
@@ -18,6 +20,12 @@ class Category(models.Model):
         null=False,
         blank=False,
     )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text="Responsive derivatives of image (products/images.py)",
+    )
 
     def __str__(self):
         return self.slug
@@ -40,6 +48,17 @@ class SubCategory(models.Model):
         null=True,
         blank=False,
     )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text="Responsive derivatives of image (products/images.py)",
+    )
+    facet_version = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Bumped whenever products or filters of the subcategory change",
+    )
 
     def __str__(self):
         return self.name
@@ -104,6 +123,18 @@ class PromoBanner(models.Model):
         null=True,
         blank=False,
     )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text="Responsive derivatives of image (products/images.py)",
+    )
+    image_mobile_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text="Responsive derivatives of image_mobile (products/images.py)",
+    )
     alt = models.CharField(max_length=255, verbose_name="Name")
     category = models.ForeignKey(
         Category,
@@ -116,11 +147,27 @@ class PromoBanner(models.Model):
         return self.category.name
 
 
+def public_vendor_code():
+    return uuid.uuid4().hex[:12].upper()
+
+
+class ProductSlugField(AutoSlugField):
+    """
+    AutoSlugField that keeps a slug already made unique in memory
+    (``bulk.precomputed_slugs``) instead of probing the table for it.
+    """
+
+    def pre_save(self, instance, add):
+        if getattr(instance, "_precomputed_slug", False):
+            return self.value_from_object(instance)
+        return super().pre_save(instance, add)
+
+
 class Product(TimeStampedModel):
     category = models.ForeignKey(SubCategory, on_delete=models.SET_NULL, null=True)
     name = models.CharField(max_length=255)
     name_ru = models.CharField(max_length=120)
-    slug = AutoSlugField(
+    slug = ProductSlugField(
         populate_from="name",
         unique=True,
         editable=False
@@ -150,9 +197,18 @@ class Product(TimeStampedModel):
     vendor_code = models.CharField(max_length=255, null=True, blank=False)
     vendor_code_public = models.CharField(max_length=255, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # keyset pagination of subcategory lists
+            models.Index(
+                fields=["category", "-created_at", "-id"],
+                name="product_category_created_idx",
+            ),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.vendor_code_public:
-            self.vendor_code_public = uuid.uuid4().hex[:12].upper()
+            self.vendor_code_public = public_vendor_code()
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -189,6 +245,12 @@ class ProductImage(models.Model):
         null=False,
         blank=False,
     )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text="Responsive derivatives of image (products/images.py)",
+    )
 
     def __str__(self):
         return self.product.name
@@ -209,9 +271,77 @@ class ProductStatistic(models.Model):
     )
     reviews_count = models.PositiveIntegerField(default=0)
 
+    # running totals of approved reviews, see products/ratings.py
+    rating_sum = models.PositiveIntegerField(default=0)
+    stars_1 = models.PositiveIntegerField(default=0)
+    stars_2 = models.PositiveIntegerField(default=0)
+    stars_3 = models.PositiveIntegerField(default=0)
+    stars_4 = models.PositiveIntegerField(default=0)
+    stars_5 = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # keyset pagination of the trending list
+            models.Index(
+                fields=["-sold", "-product"],
+                name="productstat_sold_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"Stats for {self.product.name}"
 
+    @property
+    def histogram(self):
+        return {
+            str(stars): getattr(self, f"stars_{stars}")
+            for stars in range(1, 6)
+        }
+
+
+class CategoryStatistic(models.Model):
+    """Rollup of the statistics and stock of a category's products."""
+    category = models.OneToOneField(
+        Category,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="statistics"
+    )
+    views = models.PositiveBigIntegerField(default=0)
+    sold = models.PositiveBigIntegerField(default=0)
+    product_count = models.PositiveIntegerField(default=0)
+    in_stock_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-views"], name="categorystat_views_idx"),
+        ]
+
+    def __str__(self):
+        return f"Stats for {self.category}"
+
+
+class SubCategoryStatistic(models.Model):
+    """Rollup of the statistics and stock of a subcategory's products."""
+    subcategory = models.OneToOneField(
+        SubCategory,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="statistics"
+    )
+    views = models.PositiveBigIntegerField(default=0)
+    sold = models.PositiveBigIntegerField(default=0)
+    product_count = models.PositiveIntegerField(default=0)
+    in_stock_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-views"], name="subcategorystat_views_idx"),
+        ]
+
+    def __str__(self):
+        return f"Stats for {self.subcategory}"
+
 
 class ProductReview(models.Model):
     product = models.ForeignKey(
@@ -249,6 +379,13 @@ class ProductReview(models.Model):
 
     class Meta:
         ordering = ("-created_at",)
+        indexes = [
+            # approved review feed of a product, see ProductReviewListAPIView
+            models.Index(
+                fields=["product", "is_approved", "-created_at", "-id"],
+                name="review_feed_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.product.name} – {self.rating}★"
@@ -284,3 +421,232 @@ class ProductProperty(models.Model):
 
     def __str__(self):
         return f"{self.name} - {self.value}"
+
+
+class ProductSearchDocument(models.Model):
+    """Denormalized search text of a product, kept in sync by signals."""
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="search_document",
+    )
+    name_en = models.TextField(blank=True)
+    name_ru = models.TextField(blank=True)
+    body_en = models.TextField(
+        blank=True,
+        help_text="Subcategory, filter values and properties",
+    )
+    body_ru = models.TextField(blank=True)
+    description_en = models.TextField(blank=True)
+    description_ru = models.TextField(blank=True)
+    names = models.TextField(
+        blank=True,
+        help_text="Both product names, used for typo tolerant matching",
+    )
+    search_vector = SearchVectorField(null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            GinIndex(
+                fields=["search_vector"],
+                name="product_search_vector_idx",
+            ),
+            GinIndex(
+                fields=["names"],
+                name="product_search_names_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ]
+
+    def __str__(self):
+        return f"Search document for {self.product_id}"
+
+
+class ProductFeedFragment(models.Model):
+    """
+    Pre-rendered ``<item>`` (Google Merchant) and ``<offer>`` (Yandex YML)
+    of a product, concatenated into the marketplace feeds. Re-rendered
+    when the product's updated_at moves past ``source_updated_at``, see
+    products/feeds.py.
+    """
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="feed_fragment",
+    )
+    google = models.TextField()
+    yandex = models.TextField()
+    source_updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Feed fragments of product {self.product_id}"
+
+
+class ProductDetailDocument(models.Model):
+    """
+    Rendered ProductBigSerializer JSON of a product without its
+    statistics, served as is by ProductDetailAPIView. Kept in sync by
+    signals, see products/documents.py.
+    """
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="detail_document",
+    )
+    slug = models.CharField(max_length=50, unique=True)
+    body = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Detail document of {self.slug}"
+
+
+class ProductCard(models.Model):
+    """
+    Flat copy of everything a product card shows (product, subcategory,
+    category, statistics and primary image), so card lists are a single
+    table read. Kept in sync by signals, see products/cards.py.
+    """
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="card",
+    )
+    name = models.CharField(max_length=255)
+    name_ru = models.CharField(max_length=120)
+    slug = models.CharField(max_length=50)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    discounted_price = models.DecimalField(max_digits=10, decimal_places=2)
+    sale = models.PositiveIntegerField(default=0)
+    vendor_code_public = models.CharField(max_length=255, null=True, blank=True)
+    image = models.CharField(
+        max_length=100,
+        null=True,
+        blank=True,
+        help_text="First product image",
+    )
+    image_variants = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField()
+
+    subcategory_id = models.BigIntegerField(null=True)
+    subcategory_name = models.CharField(max_length=120, blank=True)
+    subcategory_name_ru = models.CharField(max_length=120, blank=True)
+    subcategory_slug = models.CharField(max_length=50, blank=True)
+    subcategory_image = models.ImageField(null=True, blank=True)
+    subcategory_image_variants = models.JSONField(default=dict, blank=True)
+
+    category_id = models.BigIntegerField(null=True)
+    category_name = models.CharField(max_length=120, blank=True)
+    category_name_ru = models.CharField(max_length=120, blank=True)
+    category_slug = models.CharField(max_length=50, blank=True)
+    category_image = models.ImageField(null=True, blank=True)
+    category_image_variants = models.JSONField(default=dict, blank=True)
+
+    views = models.PositiveIntegerField(default=0)
+    sold = models.PositiveIntegerField(default=0)
+    rating = models.DecimalField(
+        max_digits=3,
+        decimal_places=2,
+        default=0
+    )
+    reviews_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["subcategory_id", "-created_at", "-product"],
+                name="card_subcategory_created_idx",
+            ),
+            models.Index(
+                fields=["-sold", "-product"],
+                name="card_sold_idx",
+            ),
+            # price bounds of the list and facet queries
+            models.Index(
+                fields=["subcategory_id", "price"],
+                name="card_subcategory_price_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Card of {self.name}"
+
+
+class ProductActivity(models.Model):
+    """Daily views and sales of a product, the recent part of trending scores."""
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name="activity"
+    )
+    day = models.DateField()
+    views = models.PositiveIntegerField(default=0)
+    sold = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "day"],
+                name="unique_product_activity_day",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["day"], name="productactivity_day_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} on {self.day}"
+
+
+class ProductRanking(models.Model):
+    """
+    Top TRENDING_SIZE cards by trending score, globally (no subcategory)
+    and per subcategory. Maintained by products/trending.py.
+    """
+    subcategory = models.ForeignKey(
+        SubCategory,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="rankings"
+    )
+    card = models.ForeignKey(
+        ProductCard,
+        on_delete=models.CASCADE,
+        related_name="rankings"
+    )
+    score = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["card"],
+                condition=models.Q(subcategory__isnull=True),
+                name="unique_global_ranking_card",
+            ),
+            models.UniqueConstraint(
+                fields=["subcategory", "card"],
+                name="unique_subcategory_ranking_card",
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["subcategory", "-score", "-card"],
+                name="ranking_scope_score_idx",
+            ),
+            # "subcategory IS NULL" does not pin the first column above, so
+            # the global list gets its own ordered index
+            models.Index(
+                fields=["-score", "-card"],
+                condition=models.Q(subcategory__isnull=True),
+                name="ranking_global_score_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.card_id} ({self.score})"
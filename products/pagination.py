@@ -0,0 +1,288 @@
+import base64
+import binascii
+import hashlib
+import json
+from collections import OrderedDict
+from datetime import date
+from decimal import Decimal
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def _encode_cursor_value(value):
+    # full precision: DjangoJSONEncoder would cut microseconds off datetimes
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Cannot encode {type(value).__name__} in a cursor")
+
+
+def cached_count(cache_key, compute):
+    """``compute()`` memoized for PRODUCT_COUNT_CACHE_TIMEOUT seconds."""
+    if not cache_key:
+        return compute()
+
+    count = cache.get(cache_key)
+    if count is None:
+        count = compute()
+        cache.set(cache_key, count, settings.PRODUCT_COUNT_CACHE_TIMEOUT)
+    return count
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator whose COUNT(*) is shared by every page of the same filter set."""
+
+    def __init__(self, *args, count_cache_key=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.count_cache_key = count_cache_key
+
+    @cached_property
+    def count(self):
+        return cached_count(
+            self.count_cache_key,
+            partial(Paginator.count.func, self),
+        )
+
+
+class ProductPagination(PageNumberPagination):
+    """
+    ``?page=N`` pagination plus a seek based ``?cursor=`` mode.
+
+    The view opts into cursors by setting ``keyset_ordering`` (the exact
+    ``order_by`` of its queryset, ending with a unique field) and into
+    cached totals by setting ``count_cache_key``. Without a cursor param
+    the classic page numbers keep working.
+    """
+    page_size = 48
+    page_size_query_param = None
+    max_page_size = 48
+    cursor_query_param = "cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.count_cache_key = getattr(view, "count_cache_key", None)
+        self.keyset_ordering = getattr(view, "keyset_ordering", None)
+        self.cursor_mode = (
+            self.cursor_query_param in request.query_params
+            and self.keyset_ordering is not None
+        )
+
+        if not self.cursor_mode:
+            self.django_paginator_class = partial(
+                CachedCountPaginator,
+                count_cache_key=self.count_cache_key,
+            )
+            return super().paginate_queryset(queryset, request, view)
+
+        return self.paginate_keyset(queryset, request)
+
+    # -----------------------------
+    # cursor (keyset) mode
+    # -----------------------------
+
+    def encode_cursor(self, obj, reverse):
+        values = [self._value(obj, field) for field in self.keyset_ordering]
+        payload = json.dumps(
+            {"v": values, "r": int(reverse)},
+            default=_encode_cursor_value,
+        )
+        cursor = base64.urlsafe_b64encode(payload.encode()).decode()
+        return replace_query_param(
+            remove_query_param(self.request.build_absolute_uri(), self.page_query_param),
+            self.cursor_query_param,
+            cursor,
+        )
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            values = payload["v"]
+            reverse = bool(payload.get("r"))
+        except (binascii.Error, ValueError, TypeError, KeyError):
+            raise NotFound("Invalid cursor.") from None
+
+        if not isinstance(values, list) or len(values) != len(self.keyset_ordering):
+            raise NotFound("Invalid cursor.")
+        return values, reverse
+
+    @staticmethod
+    def _ordering_field(queryset, name):
+        """Model field (or annotation output field) ordered on by ``name``."""
+        annotation = queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        model = queryset.model
+        *relations, last = name.split("__")
+        for attr in relations:
+            model = model._meta.get_field(attr).related_model
+        return model._meta.get_field(last)
+
+    def cursor_values(self, queryset, values):
+        """Decoded cursor ``values`` as the Python types of the ordering fields."""
+        try:
+            values = [
+                self._ordering_field(queryset, field.lstrip("-")).to_python(value)
+                for field, value in zip(self.keyset_ordering, values)
+            ]
+        except (ValidationError, TypeError, ValueError):
+            raise NotFound("Invalid cursor.") from None
+
+        if any(value is None for value in values):
+            raise NotFound("Invalid cursor.")
+        return values
+
+    @staticmethod
+    def _value(obj, field):
+        field = field.lstrip("-")
+        if isinstance(obj, dict):
+            # values() rows carry the ordering fields under their lookup
+            return obj[field]
+        for attr in field.split("__"):
+            obj = getattr(obj, attr)
+        return obj
+
+    def seek_filter(self, values, reverse):
+        """
+        Rows strictly after ``values`` in the (optionally reversed) ordering,
+        written as ``a <= x AND (a < x OR (a = x AND b < y))`` so the
+        leading bound can start an index range scan.
+        """
+        fields = [field.lstrip("-") for field in self.keyset_ordering]
+        lookups = [
+            "lt" if field.startswith("-") != reverse else "gt"
+            for field in self.keyset_ordering
+        ]
+
+        after = Q()
+        for i, (field, lookup) in enumerate(zip(fields, lookups)):
+            condition = Q(**{f"{field}__{lookup}": values[i]})
+            for previous, value in zip(fields[:i], values[:i]):
+                condition &= Q(**{previous: value})
+            after |= condition
+
+        bound = "lte" if lookups[0] == "lt" else "gte"
+        return Q(**{f"{fields[0]}__{bound}": values[0]}) & after
+
+    def paginate_keyset(self, queryset, request):
+        values, reverse = self.decode_cursor(
+            request.query_params.get(self.cursor_query_param)
+        )
+
+        ordering = self.keyset_ordering
+        if reverse:
+            ordering = [
+                field[1:] if field.startswith("-") else f"-{field}"
+                for field in ordering
+            ]
+
+        self.queryset = queryset
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            values = self.cursor_values(queryset, values)
+            queryset = queryset.filter(self.seek_filter(values, reverse))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        if reverse:
+            rows.reverse()
+            self.has_previous, self.has_next = has_more, True
+        else:
+            self.has_previous, self.has_next = values is not None, has_more
+
+        self.page_rows = rows
+        return rows
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if not self.has_next or not self.page_rows:
+            return None
+        return self.encode_cursor(self.page_rows[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.cursor_mode:
+            return super().get_previous_link()
+        if not self.has_previous or not self.page_rows:
+            return None
+        return self.encode_cursor(self.page_rows[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+
+        count = None
+        if self.wants_count():
+            count = cached_count(self.count_cache_key, self.queryset.count)
+
+        return Response(OrderedDict([
+            ("count", count),
+            ("next", self.get_next_link()),
+            ("previous", self.get_previous_link()),
+            ("results", data),
+        ]))
+
+    def wants_count(self):
+        return self.request.query_params.get("count") not in {"0", "false", "False"}
+
+
+class ReviewPagination(ProductPagination):
+    """
+    Cursor only pagination of a product's review feed; the first page
+    also carries ``view.get_summary()``.
+    """
+    page_size = 10
+    max_page_size = 10
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.view = view
+        self.count_cache_key = None
+        self.keyset_ordering = view.keyset_ordering
+        self.cursor_mode = True
+        return self.paginate_keyset(queryset, request)
+
+    def get_paginated_response(self, data):
+        payload = OrderedDict()
+        if not self.request.query_params.get(self.cursor_query_param):
+            payload["summary"] = self.view.get_summary()
+        payload["next"] = self.get_next_link()
+        payload["previous"] = self.get_previous_link()
+        payload["results"] = data
+        return Response(payload)
+
+
+CATALOG_COUNT_VERSION_KEY = "catalog:count:version"
+
+
+def catalog_count_key(**params):
+    """
+    Cache key of a list total, independent of param order and paging.
+    Keys embed a version, so ``invalidate_catalog_counts`` drops them all.
+    """
+    version = cache.get_or_set(CATALOG_COUNT_VERSION_KEY, 1, None)
+    raw = json.dumps(params, sort_keys=True, default=str)
+    return f"catalog:count:{version}:" + hashlib.md5(raw.encode()).hexdigest()
+
+
+def invalidate_catalog_counts(product_ids=None):
+    """Forget every cached list total after products were added, changed or removed."""
+    try:
+        cache.incr(CATALOG_COUNT_VERSION_KEY)
+    except ValueError:
+        # not cached yet (or evicted): every key is new anyway
+        cache.set(CATALOG_COUNT_VERSION_KEY, 1, None)
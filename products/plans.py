@@ -0,0 +1,227 @@
+"""
+EXPLAIN plan checks of the hot catalog queries (PostgreSQL only).
+
+Every query registered with ``@hot_query`` builds the queryset an
+endpoint runs for a sample of the seeded catalog, and declares the plan
+shape it must keep: tables that must never be read with a sequential
+scan, how many sort nodes are acceptable and a ceiling for the
+planner's total cost. A query can also name a ``requires`` check; it is
+skipped when the database cannot serve it as designed (e.g. without the
+pg_trgm operator class). ``check_hot_queries`` explains them all and
+reports every violation; it backs the plan regression test and
+``manage.py benchmark plans``.
+
+The cost ceilings were measured with ``manage.py benchmark plans
+--products 1000 10000 100000`` on the ``seed_shop`` catalog: the largest
+total cost seen at 10k and 100k products, times 1.5, rounded up. The 1k
+run is left out, on so few rows the planner rightly sorts instead of
+reading in index order. Re-measure when a query or its indexes change.
+"""
+import json
+
+from django.db import connection
+from django.db.models import Count
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from .models import FilterValue, Product, SubCategory
+from .search import subcategory_hits
+from .views import CategoryListAPIView, ProductListAPIView
+
+
+SORT_NODES = {"Sort", "Incremental Sort"}
+
+HOT_QUERIES = {}
+
+
+def hot_query(name, forbid_seq_scan=(), max_sorts=0, max_cost=None, requires=None):
+    def register(build):
+        HOT_QUERIES[name] = {
+            "build": build,
+            "forbid_seq_scan": set(forbid_seq_scan),
+            "max_sorts": max_sorts,
+            "max_cost": max_cost,
+            "requires": requires,
+        }
+        return build
+    return register
+
+
+def trigram_index_usable():
+    """
+    Whether ``%>`` matches can be answered from the trigram GIN index:
+    the index exists and pg_trgm is the real extension, which splits text
+    into trigrams (``show_trgm``) for the index to look up.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_indexes WHERE indexname = %s",
+            ["product_search_names_trgm_idx"],
+        )
+        if cursor.fetchone() is None:
+            return False
+        cursor.execute("SELECT 1 FROM pg_proc WHERE proname = 'show_trgm'")
+        return cursor.fetchone() is not None
+
+
+def view_queryset(view_class, params=None, **kwargs):
+    """The queryset ``view_class`` would paginate for a GET with ``params``."""
+    view = view_class()
+    view.setup(APIRequestFactory().get("/", params or {}), **kwargs)
+    view.request = Request(view.request)
+    view.format_kwarg = None
+    return view.get_queryset()
+
+
+def catalog_sample():
+    """Parameters of the hot queries picked from the current catalog."""
+    subcategory = (
+        SubCategory.objects
+        .annotate(products=Count("product"))
+        .order_by("-products")
+        .first()
+    )
+    filter_value = (
+        FilterValue.objects
+        .filter(filter__category=subcategory.category)
+        .annotate(products_count=Count("products"))
+        .order_by("-products_count")
+        .first()
+    )
+    product = Product.objects.filter(category=subcategory).first()
+
+    return {
+        "subcategory": subcategory,
+        "filter_value": filter_value,
+        "search": product.name.split()[0],
+    }
+
+
+# -----------------------------
+# registry
+# -----------------------------
+
+# measured: 187 (10k), 165 (100k)
+@hot_query(
+    "product_list_subcategory",
+    forbid_seq_scan={"products_productcard"},
+    max_cost=300,
+)
+def _product_list_subcategory(sample):
+    return view_queryset(ProductListAPIView, {
+        "subcategory": sample["subcategory"].slug,
+    })[:48]
+
+
+# measured: 488 (10k), 2519 (100k)
+@hot_query(
+    "product_list_filters",
+    forbid_seq_scan={"products_productcard", "products_product_filters"},
+    max_sorts=1,
+    max_cost=4000,
+)
+def _product_list_filters(sample):
+    return view_queryset(ProductListAPIView, {
+        "subcategory": sample["subcategory"].slug,
+        "filters": str(sample["filter_value"].id),
+        "price_min": "100",
+    })[:48]
+
+
+# measured: 343 (10k), 393 (100k)
+@hot_query(
+    "product_list_home",
+    forbid_seq_scan={"products_productcard"},
+    max_cost=600,
+)
+def _product_list_home(sample):
+    return view_queryset(ProductListAPIView, {"home": "1"})[:48]
+
+
+# measured: 3.55 at every size
+@hot_query(
+    "category_list",
+    forbid_seq_scan={"products_product", "products_productstatistic"},
+    max_sorts=1,
+    max_cost=10,
+)
+def _category_list(sample):
+    return view_queryset(CategoryListAPIView)
+
+
+# no cost ceiling until one is measured with a working trigram index;
+# the plan shape is still checked wherever the index is usable
+@hot_query(
+    "product_search_hits",
+    forbid_seq_scan={"products_product", "products_productsearchdocument"},
+    max_sorts=1,
+    requires=trigram_index_usable,
+)
+def _product_search_hits(sample):
+    return subcategory_hits(sample["search"])
+
+
+# -----------------------------
+# checks
+# -----------------------------
+
+def explain(queryset):
+    """Root node of ``EXPLAIN (FORMAT JSON)`` for ``queryset``."""
+    return json.loads(queryset.explain(format="json"))[0]["Plan"]
+
+
+def plan_nodes(node):
+    yield node
+    for child in node.get("Plans", ()):
+        yield from plan_nodes(child)
+
+
+def plan_problems(plan, forbid_seq_scan, max_sorts, max_cost):
+    problems = []
+    nodes = list(plan_nodes(plan))
+
+    for node in nodes:
+        if node["Node Type"] == "Seq Scan" and node.get("Relation Name") in forbid_seq_scan:
+            problems.append(f"sequential scan on {node['Relation Name']}")
+
+    sorts = sum(node["Node Type"] in SORT_NODES for node in nodes)
+    if sorts > max_sorts:
+        problems.append(f"{sorts} sort nodes, at most {max_sorts} expected")
+
+    if max_cost is not None and plan["Total Cost"] > max_cost:
+        problems.append(f"total cost {plan['Total Cost']} above {max_cost}")
+
+    return problems
+
+
+def check_hot_queries(names=None):
+    """
+    ``{name: {"cost": ..., "problems": [...], "plan": ...}}`` per hot query;
+    queries whose ``requires`` check fails get ``{"skipped": reason}``.
+    """
+    if connection.vendor != "postgresql":
+        raise RuntimeError("EXPLAIN plan checks need PostgreSQL")
+
+    sample = catalog_sample()
+    report = {}
+    for name, query in HOT_QUERIES.items():
+        if names and name not in names:
+            continue
+
+        requires = query["requires"]
+        if requires is not None and not requires():
+            report[name] = {"skipped": f"{requires.__name__}() is false"}
+            continue
+
+        plan = explain(query["build"](sample))
+        report[name] = {
+            "cost": plan["Total Cost"],
+            "problems": plan_problems(
+                plan,
+                query["forbid_seq_scan"],
+                query["max_sorts"],
+                query["max_cost"],
+            ),
+            "plan": plan,
+        }
+    return report
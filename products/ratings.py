@@ -0,0 +1,57 @@
+from decimal import Decimal
+
+from django.db.models import DecimalField, F, FloatField, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+from .models import ProductCard, ProductStatistic
+
+
+STAR_FIELDS = tuple(f"stars_{stars}" for stars in range(1, 6))
+
+
+def review_contribution(review):
+    """``(product_id, rating)`` a review adds to the aggregates, if any."""
+    if review is None or not review.is_approved:
+        return None
+    return review.product_id, review.rating
+
+
+def apply_rating(product_id, rating, sign):
+    """
+    Add (``sign=1``) or remove (``sign=-1``) one approved ``rating`` from
+    the product's running totals in a single UPDATE, then mirror the
+    result onto its card.
+    """
+    rating_sum = F("rating_sum") + sign * rating
+    reviews_count = F("reviews_count") + sign
+    star = f"stars_{rating}"
+
+    ProductStatistic.objects.filter(product_id=product_id).update(**{
+        "rating_sum": rating_sum,
+        "reviews_count": reviews_count,
+        star: F(star) + sign,
+        "rating": Coalesce(
+            Cast(
+                Cast(rating_sum, FloatField())
+                / NullIf(reviews_count, 0),
+                DecimalField(max_digits=3, decimal_places=2),
+            ),
+            Value(Decimal(0)),
+        ),
+    })
+
+    statistics = ProductStatistic.objects.filter(product_id=OuterRef("product_id"))
+    ProductCard.objects.filter(product_id=product_id).update(
+        rating=Subquery(statistics.values("rating")),
+        reviews_count=Subquery(statistics.values("reviews_count")),
+    )
+
+
+def apply_review_change(old, new):
+    """Move the aggregates from review state ``old`` to ``new``."""
+    if old == new:
+        return
+    if old is not None:
+        apply_rating(*old, sign=-1)
+    if new is not None:
+        apply_rating(*new, sign=1)
@@ -0,0 +1,120 @@
+from collections import Counter
+
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .bulk import add_by
+from .models import (
+    Category,
+    CategoryStatistic,
+    Product,
+    ProductStatistic,
+    SubCategory,
+    SubCategoryStatistic,
+)
+
+
+ROLLUP_FIELDS = ("views", "sold", "product_count", "in_stock_count")
+
+
+def _total(queryset, group_by, aggregate):
+    return Coalesce(
+        Subquery(
+            queryset
+            .order_by()
+            .values(group_by)
+            .annotate(total=aggregate)
+            .values("total")
+        ),
+        0,
+    )
+
+
+def bump_rollups(field, counts):
+    """Apply ``{product_id: delta}`` increments to the products' taxonomy."""
+    by_subcategory = Counter()
+    by_category = Counter()
+    for product_id, subcategory_id, category_id in (
+        Product.objects
+        .filter(id__in=counts, category__isnull=False)
+        .values_list("id", "category_id", "category__category_id")
+    ):
+        by_subcategory[subcategory_id] += counts[product_id]
+        by_category[category_id] += counts[product_id]
+
+    if not by_subcategory:
+        return
+
+    SubCategoryStatistic.objects.filter(
+        subcategory_id__in=by_subcategory
+    ).update(**{
+        field: F(field) + add_by("subcategory_id", by_subcategory)
+    })
+    CategoryStatistic.objects.filter(
+        category_id__in=by_category
+    ).update(**{
+        field: F(field) + add_by("category_id", by_category)
+    })
+
+
+def ensure_rollups():
+    """Create the missing rollup rows (e.g. after bulk inserts)."""
+    CategoryStatistic.objects.bulk_create(
+        [
+            CategoryStatistic(category_id=pk)
+            for pk in Category.objects.filter(
+                statistics__isnull=True
+            ).values_list("id", flat=True)
+        ],
+        ignore_conflicts=True,
+    )
+    SubCategoryStatistic.objects.bulk_create(
+        [
+            SubCategoryStatistic(subcategory_id=pk)
+            for pk in SubCategory.objects.filter(
+                statistics__isnull=True
+            ).values_list("id", flat=True)
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def refresh_rollups(subcategory_ids):
+    """
+    Recount the given subcategories from products, then every category.
+
+    Each level is a single UPDATE so concurrent increments are not lost
+    between reading and writing the totals.
+    """
+    subcategory_ids = list(subcategory_ids)
+    products = Product.objects.filter(category=OuterRef("subcategory_id"))
+    stats = ProductStatistic.objects.filter(
+        product__category=OuterRef("subcategory_id")
+    )
+
+    SubCategoryStatistic.objects.filter(
+        subcategory_id__in=subcategory_ids
+    ).update(
+        views=_total(stats, "product__category", Sum("views")),
+        sold=_total(stats, "product__category", Sum("sold")),
+        product_count=_total(products, "category", Count("id")),
+        in_stock_count=_total(
+            products.filter(quantity__gt=0), "category", Count("id")
+        ),
+    )
+
+    # a handful of rows: recounting all categories also covers moved and
+    # deleted subcategories
+    subcategories = SubCategoryStatistic.objects.filter(
+        subcategory__category=OuterRef("category_id")
+    )
+    CategoryStatistic.objects.update(**{
+        field: _total(subcategories, "subcategory__category", Sum(field))
+        for field in ROLLUP_FIELDS
+    })
+
+
+def reconcile_rollups():
+    """Rebuild every rollup from scratch; the counters drift otherwise."""
+    ensure_rollups()
+    refresh_rollups(SubCategory.objects.values_list("id", flat=True))
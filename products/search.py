@@ -0,0 +1,171 @@
+import re
+
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    TrigramWordSimilarity,
+)
+from django.db.models import Count, F, Q
+
+from .models import Product, ProductSearchDocument
+
+
+SEARCH_CHUNK_SIZE = 500
+
+# names (A) outrank taxonomy, filters and properties (B), which outrank
+# the free text descriptions (C)
+SEARCH_VECTOR = (
+    SearchVector("name_en", config="english", weight="A")
+    + SearchVector("name_ru", config="russian", weight="A")
+    + SearchVector("body_en", config="english", weight="B")
+    + SearchVector("body_ru", config="russian", weight="B")
+    + SearchVector("description_en", config="english", weight="C")
+    + SearchVector("description_ru", config="russian", weight="C")
+)
+
+DOCUMENT_FIELDS = (
+    "name_en",
+    "name_ru",
+    "body_en",
+    "body_ru",
+    "description_en",
+    "description_ru",
+    "names",
+    "updated_at",
+)
+
+TOKEN_RE = re.compile(r"[^\W_]+")
+
+
+def _join(*parts):
+    """
+    Parts joined by spaces and lowercased here, like the query text: left
+    to Postgres, lowercasing Cyrillic would depend on the server's ctype.
+    """
+    return " ".join(part for part in parts if part).lower()
+
+
+def build_search_document(product):
+    """Collect every searchable text of a prefetched product."""
+    subcategory = product.category
+    category = subcategory.category if subcategory else None
+    filters = list(product.filters.all())
+    properties = list(product.productproperty_set.all())
+    descriptions = list(product.productdescriptionitem_set.all())
+
+    return ProductSearchDocument(
+        product=product,
+        name_en=_join(product.name),
+        name_ru=_join(product.name_ru),
+        body_en=_join(
+            subcategory and subcategory.name,
+            category and category.name,
+            *(value.value for value in filters),
+            *(f"{prop.name} {prop.value}" for prop in properties),
+        ),
+        body_ru=_join(
+            subcategory and subcategory.name_ru,
+            category and category.name_ru,
+            *(value.value_ru for value in filters),
+            *(f"{prop.name_ru} {prop.value_ru}" for prop in properties),
+        ),
+        description_en=_join(
+            product.description_en,
+            *(item.text for item in descriptions),
+        ),
+        description_ru=_join(
+            product.description_ru,
+            *(item.text_ru for item in descriptions),
+        ),
+        names=_join(product.name, product.name_ru),
+    )
+
+
+def update_search_documents(product_ids):
+    """(Re)build the search documents of the given products."""
+    product_ids = list(product_ids)
+
+    for start in range(0, len(product_ids), SEARCH_CHUNK_SIZE):
+        chunk = product_ids[start:start + SEARCH_CHUNK_SIZE]
+        products = (
+            Product.objects
+            .filter(id__in=chunk)
+            .select_related("category__category")
+            .prefetch_related(
+                "filters",
+                "productproperty_set",
+                "productdescriptionitem_set",
+            )
+        )
+
+        ProductSearchDocument.objects.bulk_create(
+            [build_search_document(product) for product in products],
+            update_conflicts=True,
+            unique_fields=["product"],
+            update_fields=DOCUMENT_FIELDS,
+        )
+        ProductSearchDocument.objects.filter(
+            product_id__in=chunk
+        ).update(
+            search_vector=SEARCH_VECTOR
+        )
+
+
+def build_search_query(text):
+    """
+    Prefix query over both stemmers, so "kurtk" matches while the
+    shopper is still typing "kurtka".
+    """
+    tokens = TOKEN_RE.findall(text.lower())
+    if not tokens:
+        return None
+
+    raw = " & ".join(f"{token}:*" for token in tokens)
+    return (
+        SearchQuery(raw, config="english", search_type="raw")
+        | SearchQuery(raw, config="russian", search_type="raw")
+    )
+
+
+def search_products(text, queryset=None, document="search_document"):
+    """
+    Products matching ``text``, annotated with ``search_rank``.
+
+    Full text matches are ranked by weight; products that only match by
+    trigram similarity (typos) rank below them. ``document`` is the path
+    from the queryset's model to ProductSearchDocument, so card querysets
+    can be searched too.
+    """
+    if queryset is None:
+        queryset = Product.objects.all()
+
+    text = text.strip().lower()
+    query = build_search_query(text)
+    if query is None:
+        return queryset.none()
+
+    return (
+        queryset
+        .filter(
+            Q(**{f"{document}__search_vector": query})
+            | Q(**{f"{document}__names__trigram_word_similar": text})
+        )
+        .annotate(
+            search_rank=(
+                SearchRank(F(f"{document}__search_vector"), query)
+                + TrigramWordSimilarity(text, f"{document}__names") / 10
+            )
+        )
+    )
+
+
+def subcategory_hits(text):
+    """``(subcategory_id, hits)`` rows of the products matching ``text``."""
+    return (
+        search_products(text)
+        .filter(category__isnull=False)
+        .order_by()
+        .values_list("category")
+        .annotate(hits=Count("id"))
+    )
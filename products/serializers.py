@@ -1,4 +1,15 @@
-from rest_framework.serializers import ModelSerializer, SerializerMethodField
+from rest_framework.serializers import (
+    Field,
+    ListSerializer,
+    ModelSerializer,
+    Serializer,
+    SerializerMethodField,
+    IntegerField,
+    CharField,
+    DecimalField,
+    DictField,
+    ImageField,
+)
 from .models import (
     FilterType,
     FilterValue,
@@ -11,10 +22,80 @@ from .models import (
     ProductProperty,
     ProductImage,
     ProductDescriptionItem,
+    ProductCard,
+)
+from .images import srcset
+from .localization import (
+    RUSSIAN_TWINS,
+    TRANSLATED_FIELDS,
+    localized_name,
+    select_fields,
 )
 
 
-class FilterTypeSerializer(ModelSerializer):
+class LocalizedFieldsMixin:
+    """
+    Keeps one copy of every translated field when ``context["lang"]`` is
+    set and, on the serializer of the response items, only the fields of
+    ``context["fields"]`` (products/localization.py). Fields are picked
+    once per serializer, not per object.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+
+        lang = self.context.get("lang")
+        if lang is not None:
+            fields = self.localize_fields(fields, lang)
+
+        requested = self.context.get("fields")
+        if requested and self.serializes_items():
+            fields = select_fields(fields, requested)
+        return fields
+
+    @staticmethod
+    def localize_fields(fields, lang):
+        localized = {}
+        for name, field in fields.items():
+            twin = TRANSLATED_FIELDS.get(name)
+            if twin in fields:
+                key, source = localized_name(name), name
+                if lang == "ru":
+                    field, source = fields[twin], twin
+                if key != source and field.source is None:
+                    field.source = source
+                localized[key] = field
+            elif RUSSIAN_TWINS.get(name) not in fields:
+                localized[name] = field
+        return localized
+
+    def serializes_items(self):
+        parent = self.parent
+        return parent is None or (
+            isinstance(parent, ListSerializer) and parent.parent is None
+        )
+
+
+class LocalizedSerializer(LocalizedFieldsMixin, Serializer):
+    pass
+
+
+class LocalizedModelSerializer(LocalizedFieldsMixin, ModelSerializer):
+    pass
+
+
+class ImageVariantsField(Field):
+    """``srcset`` structure of an ``<image>_variants`` column (products/images.py)."""
+
+    def __init__(self, **kwargs):
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return srcset(value, self.context.get("request"))
+
+
+class FilterTypeSerializer(LocalizedModelSerializer):
     class Meta:
         model = FilterType
         fields = (
@@ -24,7 +105,7 @@ class FilterTypeSerializer(ModelSerializer):
         )
 
 
-class FilterValueSerializer(ModelSerializer):
+class FilterValueSerializer(LocalizedModelSerializer):
 
     class Meta:
         model = FilterValue
@@ -36,7 +117,9 @@ class FilterValueSerializer(ModelSerializer):
         )
 
 
-class CategorySerializer(ModelSerializer):
+class CategorySerializer(LocalizedModelSerializer):
+    image_srcset = ImageVariantsField(source="image_variants")
+
     class Meta:
         model = Category
         fields = (
@@ -45,11 +128,13 @@ class CategorySerializer(ModelSerializer):
             "name_ru",
             "slug",
             "image",
+            "image_srcset",
         )
 
 
-class SubCategorySerializer(ModelSerializer):
+class SubCategorySerializer(LocalizedModelSerializer):
     category = CategorySerializer(read_only=True)
+    image_srcset = ImageVariantsField(source="image_variants")
 
     class Meta:
         model = SubCategory
@@ -60,19 +145,45 @@ class SubCategorySerializer(ModelSerializer):
             "name_ru",
             "slug",
             "image",
+            "image_srcset",
         )
 
 
-class ProductImageSerializer(ModelSerializer):
+class CategoryListSerializer(CategorySerializer):
+    product_count = IntegerField(source="statistics.product_count", read_only=True)
+    in_stock_count = IntegerField(source="statistics.in_stock_count", read_only=True)
+
+    class Meta(CategorySerializer.Meta):
+        fields = CategorySerializer.Meta.fields + (
+            "product_count",
+            "in_stock_count",
+        )
+
+
+class SubCategoryListSerializer(SubCategorySerializer):
+    product_count = IntegerField(source="statistics.product_count", read_only=True)
+    in_stock_count = IntegerField(source="statistics.in_stock_count", read_only=True)
+
+    class Meta(SubCategorySerializer.Meta):
+        fields = SubCategorySerializer.Meta.fields + (
+            "product_count",
+            "in_stock_count",
+        )
+
+
+class ProductImageSerializer(LocalizedModelSerializer):
+    image_srcset = ImageVariantsField(source="image_variants")
+
     class Meta:
         model = ProductImage
         fields = (
             "id",
             "image",
+            "image_srcset",
         )
 
 
-class ProductPropertySerializer(ModelSerializer):
+class ProductPropertySerializer(LocalizedModelSerializer):
     class Meta:
         model = ProductProperty
         fields = (
@@ -84,7 +195,7 @@ class ProductPropertySerializer(ModelSerializer):
         )
 
 
-class ProductDescriptionItemSerializer(ModelSerializer):
+class ProductDescriptionItemSerializer(LocalizedModelSerializer):
     class Meta:
         model = ProductDescriptionItem
         fields = (
@@ -94,7 +205,7 @@ class ProductDescriptionItemSerializer(ModelSerializer):
         )
 
 
-class ProductStatisticSerializer(ModelSerializer):
+class ProductStatisticSerializer(LocalizedModelSerializer):
     class Meta:
         model = ProductStatistic
         fields = (
@@ -105,7 +216,27 @@ class ProductStatisticSerializer(ModelSerializer):
         )
 
 
-class ProductReviewSerializer(ModelSerializer):
+class ProductRatingStatisticSerializer(ProductStatisticSerializer):
+    """Statistics plus the star histogram of approved reviews."""
+    histogram = DictField(child=IntegerField(), read_only=True)
+
+    class Meta(ProductStatisticSerializer.Meta):
+        fields = ProductStatisticSerializer.Meta.fields + ("histogram",)
+
+
+class ReviewSummarySerializer(LocalizedSerializer):
+    """Approved review totals of a ProductStatistic."""
+    count = IntegerField(source="reviews_count", read_only=True)
+    average = DecimalField(
+        source="rating",
+        max_digits=3,
+        decimal_places=2,
+        read_only=True,
+    )
+    histogram = DictField(child=IntegerField(), read_only=True)
+
+
+class ProductReviewSerializer(LocalizedModelSerializer):
     class Meta:
         model = ProductReview
         fields = (
@@ -118,10 +249,11 @@ class ProductReviewSerializer(ModelSerializer):
         )
 
 
-class ProductSmallSerializer(ModelSerializer):
+class ProductSmallSerializer(LocalizedModelSerializer):
     category = SubCategorySerializer(read_only=True)
     statistics = ProductStatisticSerializer(read_only=True)
     image = SerializerMethodField()
+    image_srcset = SerializerMethodField()
 
     class Meta:
         model = Product
@@ -134,24 +266,120 @@ class ProductSmallSerializer(ModelSerializer):
             "sale",
             "category",
             "image",
+            "image_srcset",
             "statistics",
             "vendor_code_public",
         )
 
-    def get_image(self, obj):
-        image = (
-            ProductImage.objects
-            .filter(product=obj)
-            .values_list("image", flat=True)
-            .first()
-        )
-        return image
+    # columns read by the method fields (core/prefetch.py)
+    method_sources = {
+        "image": ("productimage_set.image", "productimage_set.image_variants"),
+        "image_srcset": ("productimage_set.image", "productimage_set.image_variants"),
+    }
+
+    def _first_image(self, obj):
+        """``(name, variants)`` of the product's first image, looked up once."""
+        if hasattr(obj, "_first_image"):
+            return obj._first_image
+
+        prefetched = getattr(obj, "_prefetched_objects_cache", {})
+        if "productimage_set" in prefetched:
+            images = sorted(prefetched["productimage_set"], key=lambda image: image.id)
+            first = (images[0].image.name, images[0].image_variants) if images else None
+        else:
+            first = (
+                ProductImage.objects
+                .filter(product=obj)
+                .values_list("image", "image_variants")
+                .first()
+            )
+        obj._first_image = first or (None, {})
+        return obj._first_image
 
+    def get_image(self, obj):
+        return self._first_image(obj)[0]
+
+    def get_image_srcset(self, obj):
+        return srcset(self._first_image(obj)[1], self.context.get("request"))
+
+
+class CardCategorySerializer(LocalizedSerializer):
+    id = IntegerField(source="category_id")
+    name = CharField(source="category_name")
+    name_ru = CharField(source="category_name_ru")
+    slug = CharField(source="category_slug")
+    image = ImageField(source="category_image")
+    image_srcset = ImageVariantsField(source="category_image_variants")
+
+
+class CardSubCategorySerializer(LocalizedSerializer):
+    id = IntegerField(source="subcategory_id")
+    category = CardCategorySerializer(source="*")
+    name = CharField(source="subcategory_name")
+    name_ru = CharField(source="subcategory_name_ru")
+    slug = CharField(source="subcategory_slug")
+    image = ImageField(source="subcategory_image")
+    image_srcset = ImageVariantsField(source="subcategory_image_variants")
+
+    # nested output -> (included collection, id column) (products/card_rows.py)
+    side_loaded = {"category": ("categories", "category_id")}
+
+
+class CardStatisticSerializer(LocalizedSerializer):
+    views = IntegerField()
+    sold = IntegerField()
+    rating = DecimalField(max_digits=3, decimal_places=2)
+    reviews_count = IntegerField()
+
+
+class ProductCardSerializer(LocalizedModelSerializer):
+    """
+    Same output as ProductSmallSerializer, read from the ProductCard
+    projection. Also accepts a Product (e.g. ``source="product"``) and
+    uses its card, falling back to ProductSmallSerializer when the card
+    has not been built yet.
+    """
+    id = IntegerField(source="product_id")
+    category = CardSubCategorySerializer(source="*")
+    statistics = CardStatisticSerializer(source="*")
+    image_srcset = ImageVariantsField(source="image_variants")
+
+    # nested output that is null when the column is (products/card_rows.py)
+    nullable_nested = {"category": "subcategory_id"}
+    side_loaded = {"category": ("subcategories", "subcategory_id")}
+    # a Product is serialized through its card (core/prefetch.py)
+    related_via = {"products.Product": "card"}
 
-class ProductBigSerializer(ModelSerializer):
+    class Meta:
+        model = ProductCard
+        fields = ProductSmallSerializer.Meta.fields
+
+    def to_representation(self, instance):
+        if isinstance(instance, Product):
+            try:
+                instance = instance.card
+            except ProductCard.DoesNotExist:
+                if instance.get_deferred_fields():
+                    # loaded with only() the columns the card needs
+                    instance = (
+                        Product.objects
+                        .select_related("category__category", "statistics")
+                        .get(pk=instance.pk)
+                    )
+                return ProductSmallSerializer(instance, context=self.context).data
+
+        data = super().to_representation(instance)
+        for key, column in self.nullable_nested.items():
+            if key in data and getattr(instance, column) is None:
+                data[key] = None
+        return data
+
+
+class ProductBigSerializer(LocalizedModelSerializer):
     category = SubCategorySerializer(read_only=True)
     filters = FilterValueSerializer(many=True, read_only=True)
-    statistics = ProductStatisticSerializer(read_only=True)
+    statistics = ProductRatingStatisticSerializer(read_only=True)
+    reviews = ReviewSummarySerializer(source="statistics", read_only=True)
 
     images = ProductImageSerializer(
         source="productimage_set",
@@ -195,7 +423,17 @@ class ProductBigSerializer(ModelSerializer):
         )
 
 
-class FilterTypeWithValuesSerializer(ModelSerializer):
+class ProductDetailDocumentSerializer(ProductBigSerializer):
+    """ProductBigSerializer minus the volatile statistics and review summary."""
+
+    class Meta(ProductBigSerializer.Meta):
+        fields = tuple(
+            field for field in ProductBigSerializer.Meta.fields
+            if field not in ("statistics", "reviews")
+        )
+
+
+class FilterTypeWithValuesSerializer(LocalizedModelSerializer):
     values = FilterValueSerializer(
         source="filtervalue_set",
         many=True,
@@ -212,15 +450,55 @@ class FilterTypeWithValuesSerializer(ModelSerializer):
         )
 
 
-class PromoBannerSerializer(ModelSerializer):
+class FilterValueCountSerializer(FilterValueSerializer):
+    count = SerializerMethodField()
+
+    class Meta(FilterValueSerializer.Meta):
+        fields = FilterValueSerializer.Meta.fields + ("count",)
+
+    def get_count(self, obj):
+        return self.context["counts"].get(obj.id, 0)
+
+
+class FilterTypeFacetSerializer(LocalizedModelSerializer):
+    """Filter type with only the values that still match products."""
+    values = SerializerMethodField()
+
+    class Meta:
+        model = FilterType
+        fields = (
+            "id",
+            "name",
+            "name_ru",
+            "values",
+        )
+
+    def get_values(self, obj):
+        counts = self.context["counts"]
+        values = [
+            value for value in obj.filtervalue_set.all()
+            if counts.get(value.id)
+        ]
+        return FilterValueCountSerializer(
+            values,
+            many=True,
+            context=self.context,
+        ).data
+
+
+class PromoBannerSerializer(LocalizedModelSerializer):
     category = CategorySerializer()
+    image_srcset = ImageVariantsField(source="image_variants")
+    image_mobile_srcset = ImageVariantsField(source="image_mobile_variants")
 
     class Meta:
         model = PromoBanner
         fields = (
             "id",
             "image",
+            "image_srcset",
             "image_mobile",
+            "image_mobile_srcset",
             "alt",
             "category",
         )
@@ -0,0 +1,87 @@
+from django.db import transaction
+from django.db.models import F
+
+from .bulk import add_by
+from .cards import bump_card_stats, refresh_cards
+from .documents import refresh_documents
+from .facets import refresh_products as refresh_facets
+from .models import Product, ProductStatistic
+from .pagination import invalidate_catalog_counts
+from .rollups import bump_rollups
+from .search import update_search_documents
+from .trending import record_activity, record_trending_sales
+
+
+# read models derived from products, in rebuild order
+PROJECTIONS = {
+    "search": update_search_documents,
+    "cards": refresh_cards,
+    "documents": refresh_documents,
+    "facets": refresh_facets,
+    "counts": invalidate_catalog_counts,
+}
+
+
+def rebuild_product_projections(product_ids, only=None):
+    """
+    Refresh every read model derived from the given products.
+
+    Used by bulk writers (imports, generators) that bypass the per-row
+    signals which keep these projections in sync.
+    """
+    product_ids = list(product_ids)
+    for name, refresh in PROJECTIONS.items():
+        if only is None or name in only:
+            refresh(product_ids)
+
+
+def record_product_views(counts):
+    """
+    Apply ``{product_id: views}`` (a flush of products.view_buffer) to the
+    statistics and everything derived from them, in a fixed number of
+    multi-row statements whatever the number of products.
+    """
+    existing = set(
+        Product.objects
+        .filter(id__in=[pk for pk, count in counts.items() if count])
+        .values_list("id", flat=True)
+    )
+    counts = {pk: count for pk, count in counts.items() if pk in existing}
+    if not counts:
+        return
+
+    # all or nothing: a failed flush puts the whole batch back in the buffer
+    with transaction.atomic():
+        ProductStatistic.objects.filter(
+            product_id__in=counts
+        ).update(
+            views=F("views") + add_by("product_id", counts)
+        )
+        bump_card_stats("views", counts)
+        record_activity("views", counts)
+        bump_rollups("views", counts)
+
+
+def record_product_sales(counts):
+    """
+    Apply ``{product_id: quantity}`` sold (a checkout) to the statistics
+    and everything derived from them, in a fixed number of multi-row
+    statements whatever the number of products.
+    """
+    counts = {pk: quantity for pk, quantity in counts.items() if quantity}
+    if not counts:
+        return
+
+    ProductStatistic.objects.filter(
+        product_id__in=counts
+    ).update(
+        sold=F("sold") + add_by("product_id", counts)
+    )
+    bump_card_stats("sold", counts)
+    record_activity("sold", counts)
+    bump_rollups("sold", counts)
+    record_trending_sales(counts)
+
+
+def record_product_sale(product_id, quantity):
+    record_product_sales({product_id: quantity})
@@ -0,0 +1,76 @@
+"""
+Side-loaded taxonomy (``?include=category``).
+
+A product card embeds its subcategory, which embeds its category, so a
+page from one subcategory repeats both objects on every card. With
+``?include=category`` the card carries ``category_id`` (its subcategory)
+instead, the subcategory carries ``category_id`` the same way, and the
+response gets a single ``included`` map holding each object once::
+
+    {"subcategories": {<id>: {...}}, "categories": {<id>: {...}}}
+
+products/card_rows.py builds side-loaded cards straight from rows;
+``side_load`` reshapes cards that went through the serializers.
+"""
+from rest_framework.exceptions import ValidationError
+
+
+INCLUDES = ("category",)
+
+
+def parse_include(value):
+    """Names of ``?include=a,b``."""
+    if not value:
+        return frozenset()
+    names = frozenset(name.strip() for name in value.split(",") if name.strip())
+    unknown = names - set(INCLUDES)
+    if unknown:
+        raise ValidationError({
+            "include": f"Unknown includes: {', '.join(sorted(unknown))}"
+        })
+    return names
+
+
+def request_includes(request):
+    return parse_include(request.query_params.get("include"))
+
+
+def new_included():
+    return {"subcategories": {}, "categories": {}}
+
+
+def _detach(data, collection, included, nested=None):
+    """
+    ``data`` with its ``category`` object replaced by ``category_id``, the
+    object itself stored once in ``included[collection]``.
+    """
+    if data is None or "category" not in data:
+        return data
+
+    detached = {}
+    for key, value in data.items():
+        if key != "category":
+            detached[key] = value
+            continue
+        if value is None:
+            detached["category_id"] = None
+            continue
+        detached["category_id"] = value["id"]
+        if value["id"] not in included[collection]:
+            included[collection][value["id"]] = nested(value) if nested else value
+    return detached
+
+
+def side_load(card, included):
+    """Serialized ``card`` in the side-loaded format, taxonomy moved to ``included``."""
+    return _detach(
+        card,
+        "subcategories",
+        included,
+        nested=lambda subcategory: _detach(subcategory, "categories", included),
+    )
+
+
+def side_load_items(items, included, key="product"):
+    """Serialized cart / wishlist / order items with their ``key`` card side-loaded."""
+    return [{**item, key: side_load(item[key], included)} for item in items]
@@ -1,9 +1,37 @@
-from django.db.models.signals import post_save
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
 from django.dispatch import receiver
-from django.db.models import Avg, F
+from django.core.cache import cache
 
-from orders.models import OrderItem
-from .models import Product, ProductStatistic, ProductReview
+from core.transactions import defer_for_ids
+from orders.models import CartItem, OrderItem, variant_key_for
+from .models import (
+    Category,
+    CategoryStatistic,
+    SubCategory,
+    SubCategoryStatistic,
+    FilterValue,
+    Product,
+    ProductStatistic,
+    ProductReview,
+    ProductProperty,
+    ProductDescriptionItem,
+    ProductImage,
+    PromoBanner,
+)
+from .cards import refresh_cards
+from .documents import refresh_documents
+from .facets import refresh_products as refresh_facets
+from .feeds import forget_feed_fragments
+from .image_variants import IMAGE_FIELDS, needs_variants, schedule_variants
+from .pagination import invalidate_catalog_counts
+from .ratings import apply_review_change, review_contribution
+from .rollups import refresh_rollups
+from .search import update_search_documents
+from .slugs import slug_cache_key
+from .services import record_product_sale
 
 
 @receiver(post_save, sender=Product)
@@ -12,35 +40,332 @@ def create_product_stats(sender, instance, created, **kwargs):
         ProductStatistic.objects.create(product=instance)
 
 
+@receiver(pre_save, sender=ProductReview)
+def remember_review_rating(sender, instance, **kwargs):
+    instance._previous_rating = None
+    if not instance._state.adding:
+        instance._previous_rating = review_contribution(
+            ProductReview.objects
+            .filter(pk=instance.pk)
+            .only("product_id", "rating", "is_approved")
+            .first()
+        )
+
+
 @receiver(post_save, sender=ProductReview)
 def update_product_rating(sender, instance, **kwargs):
-    stats = ProductStatistic.objects.filter(
-        product=instance.product
-    ).first()
+    apply_review_change(
+        getattr(instance, "_previous_rating", None),
+        review_contribution(instance),
+    )
+
+
+@receiver(post_delete, sender=ProductReview)
+def remove_product_rating(sender, instance, **kwargs):
+    apply_review_change(review_contribution(instance), None)
+
+
+@receiver(post_save, sender=OrderItem)
+def update_product_sales(sender, instance, created, **kwargs):
+    if not created:
+        return
+
+    record_product_sale(instance.product_id, instance.quantity)
+
+
+@receiver(m2m_changed, sender=CartItem.filter_values.through)
+@receiver(m2m_changed, sender=OrderItem.filter_values.through)
+def update_variant_key(sender, instance, action, reverse, **kwargs):
+    # keeps the key in step with filter values edited outside
+    # orders/services.py (admin); add_to_cart writes both itself
+    if reverse or action not in ("post_add", "post_remove", "post_clear"):
+        return
+    key = variant_key_for(instance.filter_values.values_list("id", flat=True))
+    if key != instance.variant_key:
+        instance.variant_key = key
+        type(instance).objects.filter(pk=instance.pk).update(variant_key=key)
+
+
+# -----------------------------
+# Search and facet index maintenance
+# -----------------------------
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    defer_for_ids(update_search_documents, [instance.pk])
+    defer_for_ids(refresh_facets, [instance.pk])
+    defer_for_ids(invalidate_catalog_counts, [instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    defer_for_ids(refresh_facets, [instance.pk])
+    defer_for_ids(invalidate_catalog_counts, [instance.pk])
+
 
-    if not stats:
+@receiver(post_save, sender=ProductProperty)
+@receiver(post_delete, sender=ProductProperty)
+@receiver(post_save, sender=ProductDescriptionItem)
+@receiver(post_delete, sender=ProductDescriptionItem)
+def index_product_child(sender, instance, **kwargs):
+    defer_for_ids(update_search_documents, [instance.product_id])
+
+
+@receiver(m2m_changed, sender=Product.filters.through)
+def index_product_filters(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        product_ids = [instance.pk] if action.startswith("post_") else []
+    elif action == "pre_clear":
+        # clearing from the FilterValue side carries no pk_set
+        product_ids = list(instance.products.values_list("id", flat=True))
+    elif action in ("post_add", "post_remove"):
+        product_ids = pk_set
+    else:
+        return
+
+    defer_for_ids(update_search_documents, product_ids)
+    defer_for_ids(refresh_facets, product_ids)
+    defer_for_ids(invalidate_catalog_counts, product_ids)
+
+
+@receiver(post_save, sender=FilterValue)
+def index_filter_value(sender, instance, created, **kwargs):
+    if created:
         return
 
-    agg = ProductReview.objects.filter(
-        product=instance.product
-    ).aggregate(
-        avg=Avg("rating")
+    defer_for_ids(
+        update_search_documents,
+        instance.products.values_list("id", flat=True),
     )
 
-    stats.reviews_count = ProductReview.objects.filter(
-        product=instance.product
-    ).count()
-    stats.rating = agg["avg"] or 0
-    stats.save(update_fields=["reviews_count", "rating"])
 
+@receiver(post_save, sender=SubCategory)
+def index_subcategory(sender, instance, created, **kwargs):
+    if created:
+        return
 
-@receiver(post_save, sender=OrderItem)
-def update_product_sales(sender, instance, created, **kwargs):
+    defer_for_ids(
+        update_search_documents,
+        Product.objects.filter(category=instance).values_list("id", flat=True),
+    )
+
+
+@receiver(post_save, sender=Category)
+def index_category(sender, instance, created, **kwargs):
+    if created:
+        return
+
+    defer_for_ids(
+        update_search_documents,
+        Product.objects.filter(
+            category__category=instance
+        ).values_list("id", flat=True),
+    )
+
+
+# -----------------------------
+# Product card maintenance
+# -----------------------------
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductStatistic)
+def refresh_product_card(sender, instance, **kwargs):
+    product_id = instance.pk if sender is Product else instance.product_id
+    defer_for_ids(refresh_cards, [product_id])
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def refresh_product_card_image(sender, instance, **kwargs):
+    defer_for_ids(refresh_cards, [instance.product_id])
+
+
+@receiver(post_save, sender=SubCategory)
+def refresh_subcategory_cards(sender, instance, created, **kwargs):
+    if created:
+        return
+
+    defer_for_ids(
+        refresh_cards,
+        Product.objects.filter(category=instance).values_list("id", flat=True),
+    )
+
+
+@receiver(post_save, sender=Category)
+def refresh_category_cards(sender, instance, created, **kwargs):
+    if created:
+        return
+
+    defer_for_ids(
+        refresh_cards,
+        Product.objects.filter(
+            category__category=instance
+        ).values_list("id", flat=True),
+    )
+
+
+# -----------------------------
+# Category and subcategory rollups
+# -----------------------------
+
+@receiver(post_save, sender=Category)
+def create_category_stats(sender, instance, created, **kwargs):
+    if created:
+        CategoryStatistic.objects.create(category=instance)
+
+
+@receiver(post_save, sender=SubCategory)
+def create_subcategory_stats(sender, instance, created, **kwargs):
+    if created:
+        SubCategoryStatistic.objects.create(subcategory=instance)
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_category(sender, instance, **kwargs):
+    instance._previous_category_id = None
+    if not instance._state.adding:
+        instance._previous_category_id = (
+            Product.objects
+            .filter(pk=instance.pk)
+            .values_list("category_id", flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def recount_product_rollups(sender, instance, **kwargs):
+    defer_for_ids(refresh_rollups, [
+        instance.category_id,
+        getattr(instance, "_previous_category_id", None),
+    ])
+
+
+@receiver(post_save, sender=SubCategory)
+@receiver(post_delete, sender=SubCategory)
+def recount_category_rollups(sender, instance, created=False, **kwargs):
     if not created:
+        defer_for_ids(refresh_rollups, [instance.pk])
+
+
+# -----------------------------
+# Product detail documents
+# -----------------------------
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=ProductProperty)
+@receiver(post_delete, sender=ProductProperty)
+@receiver(post_save, sender=ProductDescriptionItem)
+@receiver(post_delete, sender=ProductDescriptionItem)
+def refresh_product_document(sender, instance, **kwargs):
+    product_id = instance.pk if sender is Product else instance.product_id
+    defer_for_ids(refresh_documents, [product_id])
+
+
+@receiver(m2m_changed, sender=Product.filters.through)
+def refresh_product_filters_document(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith("post_"):
+        return
+    defer_for_ids(refresh_documents, (pk_set or ()) if reverse else [instance.pk])
+
+
+@receiver(post_save, sender=FilterValue)
+def refresh_filter_value_documents(sender, instance, created, **kwargs):
+    if created:
+        return
+
+    defer_for_ids(
+        refresh_documents,
+        instance.products.values_list("id", flat=True),
+    )
+
+
+@receiver(post_save, sender=SubCategory)
+def refresh_subcategory_documents(sender, instance, created, **kwargs):
+    if created:
         return
 
-    ProductStatistic.objects.filter(
-        product=instance.product
-    ).update(
-        sold=F("sold") + instance.quantity,
+    defer_for_ids(
+        refresh_documents,
+        Product.objects.filter(category=instance).values_list("id", flat=True),
     )
+
+
+@receiver(post_save, sender=Category)
+def refresh_category_documents(sender, instance, created, **kwargs):
+    if created:
+        return
+
+    defer_for_ids(
+        refresh_documents,
+        Product.objects.filter(
+            category__category=instance
+        ).values_list("id", flat=True),
+    )
+
+
+# -----------------------------
+# Marketplace feed fragments
+# -----------------------------
+
+# product saves move updated_at, which the feed build compares; these
+# changes do not
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=ProductProperty)
+@receiver(post_delete, sender=ProductProperty)
+def forget_product_feed_fragment(sender, instance, **kwargs):
+    defer_for_ids(forget_feed_fragments, [instance.product_id])
+
+
+@receiver(post_save, sender=SubCategory)
+def forget_subcategory_feed_fragments(sender, instance, created, **kwargs):
+    if created:
+        return
+
+    defer_for_ids(
+        forget_feed_fragments,
+        Product.objects.filter(category=instance).values_list("id", flat=True),
+    )
+
+
+@receiver(post_save, sender=Category)
+def forget_category_feed_fragments(sender, instance, created, **kwargs):
+    if created:
+        return
+
+    defer_for_ids(
+        forget_feed_fragments,
+        Product.objects.filter(
+            category__category=instance
+        ).values_list("id", flat=True),
+    )
+
+
+# -----------------------------
+# Slug → id lookups
+# -----------------------------
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def forget_product_slug(sender, instance, **kwargs):
+    cache.delete(slug_cache_key(instance.slug))
+
+
+# -----------------------------
+# Responsive image variants
+# -----------------------------
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=SubCategory)
+@receiver(post_save, sender=PromoBanner)
+def render_image_variants(sender, instance, **kwargs):
+    for field in IMAGE_FIELDS[sender]:
+        if needs_variants(instance, field):
+            transaction.on_commit(
+                partial(schedule_variants, sender, instance.pk, field)
+            )
@@ -0,0 +1,26 @@
+from django.core.cache import cache
+
+from .models import Product
+
+
+SLUG_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def slug_cache_key(slug):
+    return f"product:slug:{slug}"
+
+
+def product_id_for_slug(slug):
+    """Id of the product with ``slug`` (cached), or ``None``."""
+    key = slug_cache_key(slug)
+    product_id = cache.get(key)
+    if product_id is None:
+        product_id = (
+            Product.objects
+            .filter(slug=slug)
+            .values_list("id", flat=True)
+            .first()
+        )
+        if product_id is not None:
+            cache.set(key, product_id, SLUG_CACHE_TIMEOUT)
+    return product_id
@@ -0,0 +1,228 @@
+import random
+from collections import Counter
+from decimal import Decimal
+
+from django.db import connection
+
+from .bulk import precomputed_slugs, unique_slug
+from .models import (
+    Category,
+    SubCategory,
+    FilterType,
+    FilterValue,
+    Product,
+    ProductStatistic,
+    ProductImage,
+    ProductProperty,
+    ProductDescriptionItem,
+    ProductReview,
+)
+from .rollups import reconcile_rollups
+from .services import rebuild_product_projections
+
+
+WORDS = (
+    ("jacket", "куртка"),
+    ("shirt", "рубашка"),
+    ("boots", "ботинки"),
+    ("lamp", "лампа"),
+    ("chair", "стул"),
+    ("table", "стол"),
+    ("kettle", "чайник"),
+    ("blanket", "одеяло"),
+    ("backpack", "рюкзак"),
+    ("watch", "часы"),
+    ("phone", "телефон"),
+    ("mirror", "зеркало"),
+)
+
+ADJECTIVES = (
+    ("black", "чёрный"),
+    ("white", "белый"),
+    ("leather", "кожаный"),
+    ("wooden", "деревянный"),
+    ("warm", "тёплый"),
+    ("compact", "компактный"),
+    ("classic", "классический"),
+    ("smart", "умный"),
+)
+
+
+def _pick_name(rnd, index):
+    adjective, adjective_ru = rnd.choice(ADJECTIVES)
+    noun, noun_ru = rnd.choice(WORDS)
+    return f"{adjective} {noun} {index}", f"{adjective_ru} {noun_ru} {index}"
+
+
+def _rating_totals(ratings):
+    """ProductStatistic rating fields for a product's approved ``ratings``."""
+    stars = Counter(ratings)
+    totals = {f"stars_{rating}": stars[rating] for rating in range(1, 6)}
+    if ratings:
+        totals.update(
+            rating_sum=sum(ratings),
+            reviews_count=len(ratings),
+            rating=(Decimal(sum(ratings)) / len(ratings)).quantize(Decimal("0.01")),
+        )
+    return totals
+
+
+def generate_catalog(
+    products=1000,
+    categories=10,
+    subcategories=5,
+    filter_types=4,
+    filter_values=6,
+    reviews=0,
+    seed=0,
+    batch_size=2000,
+):
+    """
+    Bulk insert a synthetic bilingual catalog and return the new product ids.
+
+    ``subcategories``, ``filter_types`` and ``filter_values`` are per parent,
+    ``reviews`` is the average number of approved reviews per product.
+    Per-row signals are bypassed, so the rating totals are written with the
+    statistics and the derived projections are rebuilt once at the end.
+    """
+    rnd = random.Random(seed)
+
+    category_objs = Category.objects.bulk_create([
+        Category(
+            name=f"Synthetic category {seed}-{i}",
+            name_ru=f"Категория {seed}-{i}",
+            image="categories/synthetic.jpg",
+        )
+        for i in range(categories)
+    ])
+    subcategory_objs = SubCategory.objects.bulk_create([
+        SubCategory(
+            category=category,
+            name=f"{category.name} / {j}",
+            name_ru=f"{category.name_ru} / {j}",
+            image="subcategories/synthetic.jpg",
+        )
+        for category in category_objs
+        for j in range(subcategories)
+    ])
+    type_objs = FilterType.objects.bulk_create([
+        FilterType(
+            category=category,
+            name=f"Option {k}",
+            name_ru=f"Опция {k}",
+        )
+        for category in category_objs
+        for k in range(filter_types)
+    ])
+    value_objs = FilterValue.objects.bulk_create([
+        FilterValue(
+            filter=filter_type,
+            value=f"Value {v}",
+            value_ru=f"Значение {v}",
+        )
+        for filter_type in type_objs
+        for v in range(filter_values)
+    ])
+
+    values_by_type = {}
+    for value in value_objs:
+        values_by_type.setdefault(value.filter_id, []).append(value.id)
+    types_by_category = {}
+    for filter_type in type_objs:
+        types_by_category.setdefault(filter_type.category_id, []).append(filter_type.id)
+
+    slug_field = Product._meta.get_field("slug")
+    taken = set(Product.objects.values_list("slug", flat=True))
+    product_ids = []
+
+    for start in range(0, products, batch_size):
+        batch = []
+        for index in range(start, min(start + batch_size, products)):
+            name, name_ru = _pick_name(rnd, index)
+            batch.append(Product(
+                category=rnd.choice(subcategory_objs),
+                name=name,
+                name_ru=name_ru,
+                slug=unique_slug(slug_field, name, taken),
+                price=Decimal(rnd.randint(100, 100000)) / 100,
+                quantity=rnd.randint(0, 50),
+                description_en=f"A {name} for everyday use.",
+                description_ru=f"{name_ru} на каждый день.",
+                sale=rnd.choice((0, 0, 0, 10, 25)),
+                vendor_code=f"SYN-{seed}-{index}",
+                vendor_code_public=f"S{seed:03d}{index:08d}",
+            ))
+
+        batch = Product.objects.bulk_create(precomputed_slugs(batch))
+
+        ratings = {
+            product.id: [rnd.randint(1, 5) for _ in range(rnd.randint(0, 2 * reviews))]
+            for product in batch
+        }
+        ProductStatistic.objects.bulk_create([
+            ProductStatistic(
+                product=product,
+                views=rnd.randint(0, 5000),
+                sold=rnd.randint(0, 500),
+                **_rating_totals(ratings[product.id]),
+            )
+            for product in batch
+        ])
+        ProductReview.objects.bulk_create([
+            ProductReview(
+                product=product,
+                name=f"Reviewer {i}",
+                email=f"reviewer{i}@example.com",
+                rating=rating,
+                text=f"{rating} stars for {product.name}.",
+                is_approved=True,
+            )
+            for product in batch
+            for i, rating in enumerate(ratings[product.id])
+        ])
+        ProductImage.objects.bulk_create([
+            ProductImage(product=product, image=f"products/images/synthetic-{i}.jpg")
+            for product in batch
+            for i in range(rnd.randint(1, 3))
+        ])
+        ProductProperty.objects.bulk_create([
+            ProductProperty(
+                product=product,
+                name="Material",
+                name_ru="Материал",
+                value=rnd.choice(("cotton", "steel", "oak")),
+                value_ru=rnd.choice(("хлопок", "сталь", "дуб")),
+            )
+            for product in batch
+        ])
+        ProductDescriptionItem.objects.bulk_create([
+            ProductDescriptionItem(
+                product=product,
+                text=f"Feature of {product.name}",
+                text_ru=f"Особенность {product.name_ru}",
+            )
+            for product in batch
+        ])
+
+        through = Product.filters.through
+        links = []
+        for product in batch:
+            category_id = product.category.category_id
+            for type_id in types_by_category.get(category_id, ()):
+                links.append(through(
+                    product_id=product.id,
+                    filtervalue_id=rnd.choice(values_by_type[type_id]),
+                ))
+        through.objects.bulk_create(links)
+
+        product_ids.extend(product.id for product in batch)
+
+    if connection.vendor == "postgresql":
+        # the bulk loaded tables have no statistics yet, and the rollup
+        # recount below is a correlated UPDATE planned from them
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    rebuild_product_projections(product_ids)
+    reconcile_rollups()
+    return product_ids
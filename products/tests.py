@@ -1,3 +1,1114 @@
-from django.test import TestCase
+import base64
+import gzip
+import io
+import json
+from decimal import Decimal
+from xml.etree import ElementTree
 
-# Create your tests here.
+import pytest
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.db.models import F
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory
+
+from core.renderers import ORJSONRenderer, msgpack
+from core.transactions import defer_for_ids
+
+from products.benchmarks import bench_endpoints, missing_endpoints, seed_shop
+from products import facets
+from products.card_rows import CardRows
+from products.cards import refresh_cards
+from products.facets import SubCategoryFacetIndex, match_products
+from products.feeds import build_feeds
+from products.images import variant_name
+from products.importer import import_products
+from products.models import (
+    CategoryStatistic,
+    Product,
+    ProductActivity,
+    ProductCard,
+    ProductDescriptionItem,
+    ProductDetailDocument,
+    ProductImage,
+    ProductProperty,
+    ProductRanking,
+    ProductReview,
+    ProductStatistic,
+    SubCategory,
+    SubCategoryStatistic,
+)
+from users.models import User
+from products.pagination import ProductPagination, catalog_count_key
+from products.plans import check_hot_queries
+from products.rollups import reconcile_rollups
+from products.search import search_products
+from products.serializers import (
+    ProductBigSerializer,
+    ProductCardSerializer,
+    ProductSmallSerializer,
+)
+from products.services import record_product_sales, record_product_views
+from products.synthetic import generate_catalog
+from products.trending import record_activity, refresh_trending
+from products.view_buffer import ViewCounterBuffer, view_buffer
+from products.views import FilterListAPIView, with_all_filters
+
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def no_facet_index(settings):
+    # the bitmap index builds in a background thread; keep counts stable
+    settings.FACET_INDEX_ENABLED = False
+
+
+@pytest.fixture
+def catalog():
+    generate_catalog(products=60, categories=2, subcategories=2, seed=1)
+    return SubCategory.objects.order_by("id").first()
+
+
+@pytest.fixture
+def facet_index(catalog, settings, monkeypatch):
+    """Index of ``catalog`` built in the test; yields the scheduled rebuilds."""
+    settings.FACET_INDEX_ENABLED = True
+    scheduled = []
+    monkeypatch.setattr(facets, "_schedule_build", lambda *args: scheduled.append(args))
+    facets._indexes[catalog.id] = SubCategoryFacetIndex.build(catalog.id)
+    yield scheduled
+    facets._indexes.clear()
+
+
+def matched_by_orm(subcategory, filter_ids, price_min=None, price_max=None):
+    products = Product.objects.filter(category=subcategory)
+    if filter_ids:
+        products = products.filter(id__in=with_all_filters(filter_ids))
+    if price_min is not None:
+        products = products.filter(price__gte=price_min)
+    if price_max is not None:
+        products = products.filter(price__lte=price_max)
+    return sorted(products.values_list("id", flat=True))
+
+
+def filter_selections(subcategory):
+    """A few ``(filter_ids, price_min, price_max)`` worth comparing."""
+    product = max(
+        Product.objects.filter(category=subcategory).prefetch_related("filters"),
+        key=lambda product: len(product.filters.all()),
+    )
+    value_ids = sorted(value.id for value in product.filters.all())
+    prices = sorted(
+        Product.objects.filter(category=subcategory).values_list("price", flat=True)
+    )
+    low, high = prices[len(prices) // 4], prices[3 * len(prices) // 4]
+    return [
+        ([], None, None),
+        (value_ids[:1], None, None),
+        (value_ids[:2], None, None),
+        (value_ids, None, None),
+        ([], low, high),
+        (value_ids[:1], low, None),
+        (value_ids[:1], None, high),
+        ([], prices[0], prices[0]),
+        ([-1], None, None),
+    ]
+
+
+def test_product_list_query_budget(client, catalog, query_budget):
+    with query_budget("ProductListAPIView:subcategory"):
+        response = client.get("/api/products/", {"subcategory": catalog.slug})
+    assert response.status_code == 200
+
+    filter_id = catalog.category.filtertype_set.first().filtervalue_set.first().id
+    with query_budget("ProductListAPIView:filters"):
+        response = client.get("/api/products/", {
+            "subcategory": catalog.slug,
+            "filters": str(filter_id),
+            "price_min": "10",
+        })
+    assert response.status_code == 200
+
+    with query_budget("ProductListAPIView:home"):
+        response = client.get("/api/products/", {"home": 1, "cursor": ""})
+    assert response.status_code == 200
+
+
+def test_product_detail_query_budget(client, catalog, query_budget):
+    product = Product.objects.filter(category=catalog).first()
+
+    views = product.statistics.views
+
+    with query_budget("ProductDetailAPIView"):
+        response = client.get(f"/api/products/{product.slug}/")
+    assert response.status_code == 200
+
+    view_buffer.flush()
+    product.statistics.refresh_from_db()
+    assert product.statistics.views == views + 1
+
+
+def test_failed_view_flush_rolls_back_and_keeps_the_batch(catalog, monkeypatch):
+    product = Product.objects.filter(category=catalog).first()
+    views = product.statistics.views
+    card_views = ProductCard.objects.get(product=product).views
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("rollups unavailable")
+
+    # fails after the statistics and card updates already ran
+    monkeypatch.setattr("products.services.bump_rollups", broken)
+    buffer = ViewCounterBuffer(interval=60, max_events=100, max_pending=100)
+    buffer._timer = object()  # no background flushes
+    buffer.add(product.id, 3)
+    buffer.flush()
+
+    product.statistics.refresh_from_db()
+    assert product.statistics.views == views
+    assert ProductCard.objects.get(product=product).views == card_views
+    assert buffer.pending == 3
+    assert buffer.stats()["failures"] == 1
+
+    monkeypatch.undo()
+    buffer.flush()
+    product.statistics.refresh_from_db()
+    assert product.statistics.views == views + 3
+    assert buffer.pending == 0
+
+
+def test_review_feed_query_budget(client, catalog, query_budget):
+    product = Product.objects.filter(category=catalog).first()
+    for index in range(12):
+        ProductReview.objects.create(
+            product=product,
+            name="Reviewer",
+            rating=index % 5 + 1,
+            text="Text",
+            is_approved=True,
+        )
+
+    with query_budget("ProductReviewListAPIView"):
+        response = client.get(f"/api/products/{product.slug}/reviews/")
+    assert response.status_code == 200
+    assert response.json()["summary"]["count"] == 12
+
+    # the slug is cached now: reviews and the rating row only
+    with query_budget("ProductReviewListAPIView:cached"):
+        response = client.get(f"/api/products/{product.slug}/reviews/")
+    assert response.json()["summary"]["count"] == 12
+
+    with query_budget("ProductReviewListAPIView:next"):
+        response = client.get(response.json()["next"])
+    assert response.status_code == 200
+    assert "summary" not in response.json()
+    assert len(response.json()["results"]) == 2
+
+
+def test_taxonomy_query_budget(client, catalog, query_budget):
+    with query_budget("CategoryListAPIView"):
+        response = client.get("/api/products/categories/")
+    assert response.status_code == 200
+
+    with query_budget("SubCategoryListAPIView"):
+        response = client.get(
+            f"/api/products/categories/{catalog.category.slug}/subcategories/"
+        )
+    assert response.status_code == 200
+
+    with query_budget("FilterListAPIView"):
+        response = client.get("/api/products/filters/", {"subcategory": catalog.slug})
+    assert response.status_code == 200
+
+
+@override_settings(QUERY_METRICS_HEADERS=True)
+def test_query_metrics_headers(client, catalog):
+    response = client.get("/api/products/categories/")
+
+    assert int(response["X-DB-Queries"]) > 0
+    assert response["Server-Timing"].startswith("db;dur=")
+
+
+@pytest.mark.django_db(transaction=True)
+def test_hot_query_plans():
+    if connection.vendor != "postgresql":
+        pytest.skip("EXPLAIN plan checks need PostgreSQL")
+
+    # the catalog shape the ceilings in products/plans.py were measured on
+    seed_shop(20_000, seed=4)
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+    report = check_hot_queries()
+    problems = {
+        name: result["problems"]
+        for name, result in report.items()
+        if result.get("problems")
+    }
+    assert not problems, json.dumps(
+        {name: report[name]["plan"] for name in problems}, indent=2
+    )
+
+
+def test_benchmark_drives_every_endpoint():
+    assert missing_endpoints() == []
+
+    seed_shop(50)
+    results = bench_endpoints(repeat=2)
+
+    failed = [r for r in results if r["status"] >= 400]
+    assert not failed, failed
+
+
+def _import_rows(subcategory, count, start=0):
+    filter_type = subcategory.category.filtertype_set.first()
+    filter_value = filter_type.filtervalue_set.first().value
+    return [
+        {
+            "vendor_code": f"IMP-{i}",
+            "name": f"Imported lamp {i}",
+            "name_ru": f"Лампа {i}",
+            "price": "19.90",
+            "quantity": 3,
+            "subcategory": subcategory.slug,
+            "images": [f"products/images/imp-{i}.jpg"],
+            "filters": {filter_type.name: filter_value},
+            "properties": [
+                {"name": "Power", "name_ru": "Мощность", "value": "5W", "value_ru": "5Вт"},
+            ],
+        }
+        for i in range(start, start + count)
+    ]
+
+
+def _jsonl(rows):
+    return io.StringIO("\n".join(json.dumps(row, ensure_ascii=False) for row in rows))
+
+
+def test_import_products_upserts_by_vendor_code(catalog):
+    report = import_products(_jsonl(_import_rows(catalog, 5)), "jsonl")
+    assert (report["created"], report["updated"], report["failed"]) == (5, 0, 0)
+
+    product = Product.objects.get(vendor_code="IMP-0")
+    assert product.slug == "imported-lamp-0"
+    assert product.vendor_code_public
+    assert product.statistics.views == 0
+    assert product.filters.count() == 1
+    assert ProductCard.objects.get(product=product).name == "Imported lamp 0"
+
+    csv_file = io.StringIO(
+        "vendor_code,name,price,images\n"
+        "IMP-0,Renamed lamp,25.00,a.jpg|b.jpg\n"
+        "IMP-99,,1.00,\n"
+        "IMP-1,Cheap lamp,-1,\n"
+    )
+    report = import_products(csv_file, "csv")
+    assert (report["created"], report["updated"], report["failed"]) == (0, 1, 2)
+    assert [error["row"] for error in report["errors"]] == [2, 3]
+
+    product.refresh_from_db()
+    assert (product.name, product.slug) == ("Renamed lamp", "imported-lamp-0")
+    images = product.productimage_set.values_list("image", flat=True)
+    assert sorted(images) == ["a.jpg", "b.jpg"]
+    # children missing from the row are kept
+    assert product.productproperty_set.count() == 1
+    assert product.filters.count() == 1
+
+
+def test_import_reports_unusable_prices_as_row_errors(catalog):
+    prices = ["NaN", "sNaN", "Infinity", "1e400", "100000000", "99999999.999", "abc"]
+    csv_file = io.StringIO(
+        "vendor_code,name,name_ru,price\n"
+        + "".join(f"BAD-{i},Lamp,Лампа,{price}\n" for i, price in enumerate(prices))
+        + "OK-1,Lamp,Лампа,99999999.99\n"
+    )
+    report = import_products(csv_file, "csv")
+    assert (report["created"], report["failed"]) == (1, len(prices))
+    assert [error["row"] for error in report["errors"]] == list(range(1, len(prices) + 1))
+    assert Product.objects.get(vendor_code="OK-1").price == Decimal("99999999.99")
+
+
+def test_import_chunk_queries_do_not_grow_with_rows(catalog):
+    def queries(rows):
+        with CaptureQueriesContext(connection) as ctx:
+            import_products(_jsonl(rows), "jsonl")
+        return len(ctx.captured_queries)
+
+    few = queries(_import_rows(catalog, 5))
+    assert few == queries(_import_rows(catalog, 25, start=100))
+
+
+def test_export_streams_the_catalog(catalog):
+    client = APIClient()
+    assert client.get("/api/products/export/").status_code == 401
+
+    client.force_authenticate(User.objects.create_user("admin", is_staff=True))
+    response = client.get("/api/products/export/")
+    assert response.streaming
+    rows = [json.loads(line) for line in response.getvalue().decode().splitlines()]
+    assert len(rows) == Product.objects.count()
+    assert rows[0]["subcategory"] and rows[0]["images"] and rows[0]["filters"]
+
+    product = Product.objects.order_by("id").last()
+    Product.objects.filter(id=product.id).update(updated_at=product.updated_at.replace(year=2100))
+    response = client.get("/api/products/export/", {"updated_since": "2099-01-01"})
+    lines = response.getvalue().decode().splitlines()
+    assert [json.loads(line)["id"] for line in lines] == [product.id]
+
+    response = client.get("/api/products/export/", {"output": "csv"})
+    report = import_products(io.StringIO(response.getvalue().decode()), "csv")
+    assert (report["updated"], report["failed"]) == (len(rows), 0)
+
+
+def test_deferred_ids_merge_per_block_and_drop_with_rollback(
+    django_capture_on_commit_callbacks,
+):
+    calls = []
+    with django_capture_on_commit_callbacks(execute=True):
+        with transaction.atomic():
+            defer_for_ids(calls.append, [2, 1])
+            defer_for_ids(calls.append, [3, None])
+            with pytest.raises(RuntimeError), transaction.atomic():
+                defer_for_ids(calls.append, [4])
+                raise RuntimeError
+    assert calls == [[1, 2, 3]]
+
+    # the executed batch is closed, later ids get their own
+    with django_capture_on_commit_callbacks(execute=True):
+        defer_for_ids(calls.append, [5])
+    assert calls == [[1, 2, 3], [5]]
+
+
+def test_feeds_rebuild_only_changed_products(
+    catalog, settings, tmp_path, django_capture_on_commit_callbacks
+):
+    settings.MEDIA_ROOT = tmp_path
+
+    result = build_feeds()
+    assert result["rendered"] == Product.objects.count()
+    google = ElementTree.parse(result["files"]["google"]).getroot()
+    assert len(google.findall("channel/item")) == Product.objects.count()
+    yandex = ElementTree.parse(result["files"]["yandex"]).getroot()
+    assert len(yandex.findall("shop/offers/offer")) == Product.objects.count()
+
+    assert build_feeds()["rendered"] == 0
+
+    product = Product.objects.order_by("id").first()
+    Product.objects.filter(id=product.id).update(
+        name_ru="Лампа <новая> & яркая", updated_at=timezone.now()
+    )
+    with django_capture_on_commit_callbacks(execute=True):
+        product.productproperty_set.first().delete()
+    assert build_feeds()["rendered"] == 1
+
+    yandex = ElementTree.parse(result["files"]["yandex"]).getroot()
+    offer = yandex.find(f"shop/offers/offer[@id='{product.id}']")
+    assert offer.findtext("name") == "Лампа <новая> & яркая"
+    assert offer.find("param") is None
+
+
+def test_uploaded_images_get_responsive_variants(
+    catalog, settings, tmp_path, client, django_capture_on_commit_callbacks
+):
+    settings.MEDIA_ROOT = tmp_path
+    settings.IMAGE_VARIANTS_ASYNC = False
+    upload = io.BytesIO()
+    Image.new("RGBA", (900, 600), (255, 128, 0, 128)).save(upload, "PNG")
+
+    product = Product.objects.filter(category=catalog).order_by("id").first()
+    with django_capture_on_commit_callbacks(execute=True):
+        product.productimage_set.all().delete()
+        image = ProductImage.objects.create(
+            product=product,
+            image=SimpleUploadedFile("photo.png", upload.getvalue()),
+        )
+
+    image.refresh_from_db()
+    variants = image.image_variants
+    assert variants["source"] == image.image.name
+    assert (variants["width"], variants["height"]) == (900, 600)
+    assert [v["width"] for v in variants["webp"]] == [320, 640, 900]
+    assert variants["placeholder"].startswith("data:image/webp;base64,")
+    with Image.open(tmp_path / variants["jpeg"][0]["name"]) as thumbnail:
+        assert (thumbnail.format, thumbnail.size) == ("JPEG", (320, 213))
+    assert variants["jpeg"][0]["name"] == f"variants/{image.image.name}-320.jpg"
+    assert variant_name("photo.jpg", 320, "webp") != variant_name("photo.png", 320, "webp")
+
+    card = ProductCardSerializer(ProductCard.objects.get(product=product)).data
+    assert card == ProductSmallSerializer(product).data
+    assert card["image_srcset"]["srcset"]["webp"].endswith("-900.webp 900w")
+
+    response = client.get(f"/api/products/{product.slug}/")
+    srcset = response.json()["images"][0]["image_srcset"]["srcset"]
+    assert srcset["jpeg"].startswith("http://testserver/media/variants/products/images/photo")
+
+
+def test_localized_and_sparse_product_responses(client, catalog):
+    response = client.get("/api/products/", {
+        "subcategory": catalog.slug,
+        "lang": "ru",
+        "fields": "id,name,category",
+    })
+    assert response.status_code == 200
+    assert "Accept-Language" in response["Vary"]
+    item = response.json()["results"][0]
+    card = ProductCard.objects.get(product_id=item["id"])
+    assert set(item) == {"id", "name", "category"}
+    assert item["name"] == card.name_ru
+    assert item["category"]["name"] == card.subcategory_name_ru
+    assert "name_ru" not in item["category"]["category"]
+
+    product = card.product
+    assert (
+        ProductCardSerializer(card, context={"lang": "ru"}).data
+        == ProductSmallSerializer(product, context={"lang": "ru"}).data
+    )
+
+    url = f"/api/products/{product.slug}/"
+    detail = client.get(url, HTTP_ACCEPT_LANGUAGE="en-US,en;q=0.9").json()
+    assert detail["description"] == product.description_en
+    assert "name_ru" not in detail and "description_ru" not in detail
+    assert "value_ru" not in detail["properties"][0]
+
+    both = client.get(url, {"lang": "all"}, HTTP_ACCEPT_LANGUAGE="ru").json()
+    assert both["name_ru"] == product.name_ru
+
+    sparse = client.get(url, {"lang": "ru", "fields": "name,statistics"}).json()
+    assert sparse == {"name": product.name_ru, "statistics": both["statistics"]}
+
+    assert client.get(url, {"fields": "nope"}).status_code == 400
+    assert client.get(url, {"lang": "de"}).status_code == 400
+
+
+def test_orjson_rendering_and_compression(client, catalog):
+    product = Product.objects.filter(category=catalog).first()
+    for data in (
+        ProductBigSerializer(product).data,
+        {"price": Decimal("12.50"), "at": timezone.now(), "ids": {1: "a"}},
+    ):
+        assert ORJSONRenderer().render(data) == JSONRenderer().render(data)
+
+    response = client.get(
+        "/api/products/",
+        {"subcategory": catalog.slug},
+        HTTP_ACCEPT_ENCODING="gzip, deflate",
+    )
+    assert response["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response["Vary"]
+    assert json.loads(gzip.decompress(response.content))["results"]
+    # random length file name padding, as GZipMiddleware adds (BREACH)
+    assert response.content[3] & gzip.FNAME
+
+    small = client.get("/api/products/", HTTP_ACCEPT_ENCODING="gzip")
+    assert small.status_code == 400
+    assert not small.has_header("Content-Encoding")
+
+    if msgpack is not None:
+        packed = client.get(
+            "/api/products/",
+            {"subcategory": catalog.slug},
+            HTTP_ACCEPT="application/msgpack",
+        )
+        assert packed["Content-Type"] == "application/msgpack"
+        assert msgpack.unpackb(packed.content)["results"]
+
+
+@pytest.fixture
+def no_image_variants(monkeypatch):
+    # the test images are names without files: nothing to render
+    monkeypatch.setattr("products.signals.schedule_variants", lambda *args: None)
+
+
+def test_cards_follow_their_sources(
+    catalog, no_image_variants, django_capture_on_commit_callbacks
+):
+    product = Product.objects.filter(category=catalog).order_by("id").first()
+    other = SubCategory.objects.exclude(id=catalog.id).order_by("id").first()
+
+    def card_after(change):
+        with django_capture_on_commit_callbacks(execute=True):
+            change()
+        return ProductCard.objects.get(product=product)
+
+    def rename(obj, **fields):
+        for name, value in fields.items():
+            setattr(obj, name, value)
+        obj.save()
+
+    card = card_after(lambda: rename(product, name="Card lamp", price=Decimal("77.00")))
+    assert (card.name, card.price) == ("Card lamp", Decimal("77.00"))
+
+    statistic = ProductStatistic.objects.get(product=product)
+    assert card_after(lambda: rename(statistic, sold=41, views=7)).sold == 41
+    assert ProductCard.objects.get(product=product).views == 7
+
+    assert card_after(lambda: product.productimage_set.all().delete()).image is None
+    name = "products/images/card.jpg"
+    with django_capture_on_commit_callbacks(execute=True):
+        image = ProductImage.objects.create(product=product, image=name)
+    assert ProductCard.objects.get(product=product).image == name
+    assert card_after(image.delete).image is None
+
+    card = card_after(lambda: rename(catalog, name="Card shelf"))
+    assert card.subcategory_name == "Card shelf"
+    card = card_after(lambda: rename(catalog.category, name_ru="Карточки"))
+    assert card.category_name_ru == "Карточки"
+
+    card = card_after(lambda: rename(product, category=other))
+    assert (card.subcategory_id, card.subcategory_name) == (other.id, other.name)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        product.delete()
+    assert not ProductCard.objects.filter(product_id=product.id).exists()
+
+
+def test_detail_documents_follow_their_sources(
+    catalog, no_image_variants, django_capture_on_commit_callbacks
+):
+    product = Product.objects.filter(category=catalog).order_by("id").first()
+
+    def document_after(change):
+        with django_capture_on_commit_callbacks(execute=True):
+            change()
+        body = ProductDetailDocument.objects.get(product=product).body
+        return json.loads(bytes(body))
+
+    def rename(obj, **fields):
+        for name, value in fields.items():
+            setattr(obj, name, value)
+        obj.save()
+
+    def ids(items):
+        return sorted(item["id"] for item in items)
+
+    document = document_after(lambda: rename(product, name="Document lamp"))
+    assert document["name"] == "Document lamp"
+
+    image = ProductImage(product=product, image="products/images/doc.jpg")
+    prop = ProductProperty(
+        product=product, name="Fabric", name_ru="Ткань", value="Linen", value_ru="Лён",
+    )
+    item = ProductDescriptionItem(
+        product=product, text="Hand washed", text_ru="Ручная стирка",
+    )
+    document = document_after(lambda: (image.save(), prop.save(), item.save()))
+    assert image.id in ids(document["images"])
+    assert {"id": prop.id, "name": "Fabric", "name_ru": "Ткань",
+            "value": "Linen", "value_ru": "Лён"} in document["properties"]
+    assert {"id": item.id, "text": "Hand washed", "text_ru": "Ручная стирка"} in (
+        document["descriptions"]
+    )
+
+    document = document_after(lambda: (image.delete(), prop.delete(), item.delete()))
+    assert image.id not in ids(document["images"])
+    assert prop.id not in ids(document["properties"])
+    assert item.id not in ids(document["descriptions"])
+
+    # filter links, from both sides
+    value = catalog.category.filtertype_set.first().filtervalue_set.first()
+    document = document_after(lambda: product.filters.set([value]))
+    assert ids(document["filters"]) == [value.id]
+    assert document_after(lambda: value.products.remove(product))["filters"] == []
+    document = document_after(lambda: value.products.add(product))
+    assert ids(document["filters"]) == [value.id]
+
+    document = document_after(lambda: rename(value, value="Document blue"))
+    assert document["filters"][0]["value"] == "Document blue"
+    document = document_after(lambda: rename(catalog, name="Document shelf"))
+    assert document["category"]["name"] == "Document shelf"
+    document = document_after(lambda: rename(catalog.category, name_ru="Документы"))
+    assert document["category"]["category"]["name_ru"] == "Документы"
+
+
+def test_card_rows_match_product_small_serializer(catalog):
+    orphan = Product.objects.order_by("id").last()
+    Product.objects.filter(id=orphan.id).update(category=None)
+    refresh_cards([orphan.id])
+
+    request = APIRequestFactory().get("/api/products/")
+    products = (
+        Product.objects
+        .select_related("category__category", "statistics")
+        .prefetch_related("productimage_set")
+        .order_by("id")
+    )
+    for context in (
+        {"request": request},
+        {"request": request, "lang": "ru"},
+        {"lang": "en", "fields": frozenset({"id", "name", "category", "statistics"})},
+    ):
+        cards = CardRows(context)
+        rows = ProductCard.objects.order_by("product_id").values(*cards.columns)
+        render = ORJSONRenderer().render
+        assert render([cards(row) for row in rows]) == render(
+            ProductSmallSerializer(products, many=True, context=context).data
+        )
+
+
+def test_card_rows_product_list_matches_serializer(client, catalog, settings):
+    for params in (
+        {"subcategory": catalog.slug},
+        {"subcategory": catalog.slug, "cursor": "", "lang": "ru"},
+        {"home": 1, "fields": "id,name,price"},
+    ):
+        settings.CARD_ROWS_ENABLED = True
+        fast = client.get("/api/products/", params)
+        settings.CARD_ROWS_ENABLED = False
+        slow = client.get("/api/products/", params)
+        assert fast.status_code == 200
+        assert fast.content == slow.content
+
+
+def test_side_loaded_product_list(client, catalog, settings):
+    params = {"subcategory": catalog.slug}
+    nested = client.get("/api/products/", params).json()
+    side_loaded = client.get("/api/products/", {**params, "include": "category"}).json()
+
+    subcategory = dict(nested["results"][0]["category"])
+    category = subcategory.pop("category")
+    assert side_loaded["included"] == {
+        "subcategories": {str(catalog.id): {**subcategory, "category_id": category["id"]}},
+        "categories": {str(category["id"]): category},
+    }
+    for card, full in zip(side_loaded["results"], nested["results"]):
+        assert "category" not in card
+        assert card["category_id"] == catalog.id
+        assert card == {
+            ("category_id" if key == "category" else key): (
+                catalog.id if key == "category" else value
+            )
+            for key, value in full.items()
+        }
+
+    for params in (
+        {"subcategory": catalog.slug, "include": "category"},
+        {"home": 1, "cursor": "", "lang": "ru", "include": "category"},
+    ):
+        settings.CARD_ROWS_ENABLED = True
+        fast = client.get("/api/products/", params)
+        settings.CARD_ROWS_ENABLED = False
+        slow = client.get("/api/products/", params)
+        assert fast.status_code == 200
+        assert fast.content == slow.content
+
+    response = client.get("/api/products/", {**params, "include": "brand"})
+    assert response.status_code == 400
+
+
+def test_facet_index_matches_the_orm(catalog, facet_index):
+    catalog.refresh_from_db()
+    for filter_ids, price_min, price_max in filter_selections(catalog):
+        matched = match_products(catalog, filter_ids, price_min, price_max)
+        assert sorted(matched) == matched_by_orm(catalog, filter_ids, price_min, price_max)
+    assert facet_index == []
+
+
+def test_facet_index_follows_product_changes(
+    catalog, facet_index, django_capture_on_commit_callbacks
+):
+    other = SubCategory.objects.exclude(id=catalog.id).first()
+    products = list(Product.objects.filter(category=catalog).order_by("id")[:4])
+    value = products[0].filters.first()
+    version = catalog.facet_version
+
+    with django_capture_on_commit_callbacks(execute=True):
+        products[0].filters.remove(value)
+    with django_capture_on_commit_callbacks(execute=True):
+        products[1].filters.add(value)
+        products[1].price = Decimal("0.01")
+        products[1].save()
+    with django_capture_on_commit_callbacks(execute=True):
+        products[2].category = other
+        products[2].save()
+    with django_capture_on_commit_callbacks(execute=True):
+        products[3].delete()
+    with django_capture_on_commit_callbacks(execute=True):
+        added = Product.objects.create(
+            category=catalog, name="Added", name_ru="Новый", price=Decimal("5.00")
+        )
+        added.filters.add(value)
+
+    catalog.refresh_from_db()
+    assert catalog.facet_version > version
+    # patched in place: still current, nothing rebuilt
+    assert facets._indexes[catalog.id].version == catalog.facet_version
+    assert facet_index == []
+
+    matched = match_products(catalog, [value.id])
+    assert products[0].id not in matched
+    assert products[1].id in matched
+    assert added.id in matched
+    assert products[1].id in match_products(catalog, [], None, Decimal("0.01"))
+    assert products[2].id not in match_products(catalog, [])
+    assert products[3].id not in match_products(catalog, [])
+    for filter_ids, price_min, price_max in filter_selections(catalog):
+        matched = match_products(catalog, filter_ids, price_min, price_max)
+        assert sorted(matched) == matched_by_orm(catalog, filter_ids, price_min, price_max)
+
+
+def test_stale_facet_index_falls_back_to_the_orm(
+    catalog, facet_index, django_capture_on_commit_callbacks
+):
+    # another process changed the subcategory
+    SubCategory.objects.filter(id=catalog.id).update(facet_version=F("facet_version") + 1)
+    catalog.refresh_from_db()
+
+    assert match_products(catalog, []) is None
+    assert facets.facet_counts(catalog, []) is None
+    assert facet_index[-1] == (catalog.id,)
+
+    # a local change cannot be patched onto an index that missed one
+    with django_capture_on_commit_callbacks(execute=True):
+        product = Product.objects.filter(category=catalog).first()
+        product.price = Decimal("1.00")
+        product.save()
+    assert catalog.id not in facets._indexes
+
+
+def test_facet_index_carries_the_version_it_was_built_from(catalog):
+    SubCategory.objects.filter(id=catalog.id).update(facet_version=F("facet_version") + 2)
+    catalog.refresh_from_db()
+
+    index = SubCategoryFacetIndex.build(catalog.id)
+    assert index.version == catalog.facet_version
+    assert index.size == Product.objects.filter(category=catalog).count()
+
+    # a subcategory the build cannot see is never cached under a version
+    assert SubCategoryFacetIndex.build(-1) is None
+
+
+def test_facet_counts_match_the_orm(client, catalog, facet_index, settings):
+    catalog.refresh_from_db()
+    for filter_ids, price_min, price_max in filter_selections(catalog):
+        settings.FACET_INDEX_ENABLED = True
+        counts = facets.facet_counts(catalog, filter_ids, price_min, price_max)
+        orm_counts = FilterListAPIView.count_with_orm(
+            catalog, filter_ids, price_min, price_max
+        )
+        assert counts[0] == orm_counts[0]
+
+        params = {
+            "subcategory": catalog.slug,
+            "filters": ",".join(map(str, filter_ids)),
+            "price_min": price_min or "",
+            "price_max": price_max or "",
+        }
+        indexed = client.get("/api/products/filters/", params)
+        settings.FACET_INDEX_ENABLED = False
+        orm = client.get("/api/products/filters/", params)
+        assert indexed.status_code == 200
+        assert indexed.json() == orm.json()
+    assert facet_index == []
+
+
+def searched(text):
+    return list(
+        search_products(text)
+        .order_by("-search_rank", "id")
+        .values_list("id", flat=True)
+    )
+
+
+@pytest.fixture
+def search_catalog(catalog, django_capture_on_commit_callbacks):
+    if connection.vendor != "postgresql":
+        pytest.skip("Full-text search needs PostgreSQL")
+
+    with django_capture_on_commit_callbacks(execute=True):
+        named = Product.objects.create(
+            category=catalog, name="Zephyrcoat", name_ru="Зефиркоут",
+            price=Decimal("10.00"),
+        )
+        described = Product.objects.create(
+            category=catalog, name="Plain thing", name_ru="Вещь",
+            price=Decimal("10.00"), description_en="Goes well with a zephyrcoat.",
+        )
+        jackets = Product.objects.create(
+            category=catalog, name="Winter jackets", name_ru="Куртки зимние",
+            price=Decimal("10.00"),
+        )
+    return named, described, jackets
+
+
+def test_search_ranks_names_above_descriptions(search_catalog):
+    named, described, jackets = search_catalog
+
+    assert searched("zephyrcoat")[:2] == [named.id, described.id]
+    # prefix matching while typing
+    assert searched("zephyr")[:2] == [named.id, described.id]
+    assert jackets.id not in searched("zephyrcoat")
+
+
+def test_search_stems_russian(search_catalog):
+    named, described, jackets = search_catalog
+
+    for text in ("куртка", "куртки", "Куртку", "зимняя куртка"):
+        assert jackets.id in searched(text), text
+    assert named.id not in searched("куртка")
+
+
+def test_search_documents_follow_product_changes(
+    search_catalog, django_capture_on_commit_callbacks
+):
+    named, described, jackets = search_catalog
+
+    with django_capture_on_commit_callbacks(execute=True):
+        named.name = "Quillcloak"
+        named.save()
+    assert named.id in searched("quillcloak")
+    assert named.id not in searched("zephyrcoat")
+
+    with django_capture_on_commit_callbacks(execute=True):
+        ProductProperty.objects.create(
+            product=jackets, name="Fabric", name_ru="Ткань",
+            value="Velvetine", value_ru="Вельветин",
+        )
+    assert searched("velvetine") == [jackets.id]
+    assert searched("вельветин") == [jackets.id]
+
+    value = jackets.category.category.filtertype_set.first().filtervalue_set.first()
+    with django_capture_on_commit_callbacks(execute=True):
+        described.filters.add(value)
+    with django_capture_on_commit_callbacks(execute=True):
+        value.value = "Glimmergrey"
+        value.save()
+    matched = searched("glimmergrey")
+    assert described.id in matched
+    assert set(matched) == set(value.products.values_list("id", flat=True))
+
+
+def walk_pages(client, url, params, link):
+    pages = []
+    while url:
+        data = client.get(url, params).json()
+        pages.append([card["id"] for card in data["results"]])
+        url, params = data[link], None
+    return pages
+
+
+def test_keyset_pages_with_equal_sort_keys(client, catalog, monkeypatch):
+    monkeypatch.setattr(ProductPagination, "page_size", 4)
+    # every card shares created_at, only the product id breaks ties
+    ProductCard.objects.filter(subcategory_id=catalog.id).update(created_at=timezone.now())
+    expected = list(
+        ProductCard.objects
+        .filter(subcategory_id=catalog.id)
+        .order_by("-product_id")
+        .values_list("product_id", flat=True)
+    )
+    assert len(expected) > 8
+
+    pages = walk_pages(
+        client, "/api/products/", {"subcategory": catalog.slug, "cursor": ""}, "next"
+    )
+    assert [pk for page in pages for pk in page] == expected
+    assert all(len(page) == 4 for page in pages[:-1])
+
+    # back from the last page through the reversed cursors
+    last = client.get("/api/products/", {"subcategory": catalog.slug, "cursor": ""})
+    while last.json()["next"]:
+        last = client.get(last.json()["next"])
+    assert last.json()["previous"] is not None
+    backwards = walk_pages(client, last.json()["previous"], None, "previous")
+    assert backwards == pages[-2::-1]
+
+    first = client.get(last.json()["previous"]).json()
+    assert first["results"][0]["id"] == pages[-2][0]
+    assert first["next"] is not None
+
+
+def test_malformed_cursors_are_not_found(client, catalog):
+    def cursor(payload):
+        return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+    for bad in (
+        "not base64!",
+        cursor({"v": ["x", 1]}),
+        cursor({"v": [[1], 1]}),
+        cursor({"v": [None, 1]}),
+        cursor({"v": [timezone.now().isoformat(), "x"]}),
+        cursor({"v": [1]}),
+        cursor({"r": 1}),
+    ):
+        params = {"subcategory": catalog.slug, "cursor": bad}
+        assert client.get("/api/products/", params).status_code == 404, bad
+
+    params["cursor"] = cursor({"v": [timezone.now().isoformat(), 1]})
+    assert client.get("/api/products/", params).status_code == 200
+
+
+def test_cached_catalog_counts_are_invalidated(
+    client, catalog, django_capture_on_commit_callbacks
+):
+    cache.clear()
+    params = {"subcategory": catalog.slug, "cursor": ""}
+    count = client.get("/api/products/", params).json()["count"]
+    assert count == ProductCard.objects.filter(subcategory_id=catalog.id).count()
+    key = catalog_count_key(
+        subcategory=catalog.slug, search=None, filters=[],
+        price_min=None, price_max=None,
+    )
+    assert cache.get(key) == count
+    # independent of param order
+    assert key == catalog_count_key(
+        price_max=None, price_min=None, filters=[],
+        search=None, subcategory=catalog.slug,
+    )
+
+    # a write bypassing the signals keeps the cached total
+    ProductCard.objects.filter(
+        product_id=ProductCard.objects.filter(subcategory_id=catalog.id).first().product_id
+    ).delete()
+    assert client.get("/api/products/", params).json()["count"] == count
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Product.objects.create(
+            category=catalog, name="Fresh", name_ru="Новинка", price=Decimal("1.00")
+        )
+    assert catalog_count_key(
+        subcategory=catalog.slug, search=None, filters=[],
+        price_min=None, price_max=None,
+    ) != key
+    assert client.get("/api/products/", params).json()["count"] == (
+        ProductCard.objects.filter(subcategory_id=catalog.id).count()
+    )
+    assert client.get("/api/products/", {**params, "count": "0"}).json()["count"] is None
+
+
+def rankings():
+    ranked = {}
+    for subcategory_id, card_id, score in (
+        ProductRanking.objects
+        .order_by("subcategory_id", "-score", "-card_id")
+        .values_list("subcategory_id", "card_id", "score")
+    ):
+        ranked.setdefault(subcategory_id, []).append((card_id, pytest.approx(score)))
+    return ranked
+
+
+def test_incremental_trending_matches_a_refresh(catalog, settings):
+    settings.TRENDING_SIZE = 5
+    refresh_trending()
+    ranked = set(ProductRanking.objects.values_list("card_id", flat=True))
+    unranked = list(
+        ProductCard.objects
+        .exclude(product_id__in=ranked)
+        .order_by("product_id")
+        .values_list("product_id", flat=True)
+    )
+    top = ProductRanking.objects.filter(subcategory=None).order_by("-score").first()
+
+    # views only feed the next refresh, through today's activity rows
+    record_product_views({unranked[0]: 2})
+    record_activity("views", {unranked[0]: 3})
+    assert ProductActivity.objects.get(product_id=unranked[0]).views == 5
+    refresh_trending()
+    before = rankings()
+
+    record_product_sales({
+        top.card_id: 1,
+        # enough to enter the global and subcategory top 5, trimming others
+        unranked[1]: 500,
+        unranked[2]: 700,
+        # too little to rank anywhere
+        unranked[3]: 1,
+    })
+    incremental = rankings()
+    assert incremental != before
+    assert all(len(cards) == 5 for cards in incremental.values())
+    assert unranked[2] == incremental[None][0][0]
+    assert unranked[3] not in {
+        card_id for cards in incremental.values() for card_id, _ in cards
+    }
+
+    refresh_trending()
+    assert rankings() == incremental
+
+
+def rollup_totals():
+    return (
+        list(CategoryStatistic.objects.order_by("category_id").values()),
+        list(SubCategoryStatistic.objects.order_by("subcategory_id").values()),
+    )
+
+
+def test_incremental_rollups_match_a_reconcile(catalog, django_capture_on_commit_callbacks):
+    reconcile_rollups()
+    products = list(Product.objects.filter(category=catalog).order_by("id")[:3])
+    elsewhere = SubCategory.objects.exclude(category=catalog.category).first()
+    before = rollup_totals()
+
+    record_product_views({products[0].id: 7, products[1].id: 2})
+    record_product_sales({products[0].id: 3})
+    with django_capture_on_commit_callbacks(execute=True):
+        products[2].delete()
+    with django_capture_on_commit_callbacks(execute=True):
+        # moving recounts the old subcategory through _previous_category_id
+        products[0].category = elsewhere
+        products[0].quantity = 0
+        products[0].save()
+
+    incremental = rollup_totals()
+    assert incremental != before
+    counts = dict(
+        SubCategoryStatistic.objects.values_list("subcategory_id", "product_count")
+    )
+    old_counts = {row["subcategory_id"]: row["product_count"] for row in before[1]}
+    assert counts[catalog.id] == old_counts[catalog.id] - 2
+    assert counts[elsewhere.id] == old_counts[elsewhere.id] + 1
+
+    reconcile_rollups()
+    assert rollup_totals() == incremental
+
+
+def test_review_changes_keep_rating_totals(catalog):
+    product = Product.objects.filter(category=catalog).first()
+    ProductReview.objects.filter(product=product).delete()
+
+    def totals():
+        statistic = ProductStatistic.objects.get(product=product)
+        card = ProductCard.objects.get(product=product)
+        assert (card.rating, card.reviews_count) == (
+            statistic.rating, statistic.reviews_count
+        )
+        return statistic.reviews_count, statistic.rating, statistic.histogram
+
+    def stars(**counts):
+        return {str(star): counts.get(f"s{star}", 0) for star in range(1, 6)}
+
+    start = totals()
+    assert start == (0, Decimal("0"), stars())
+
+    five = ProductReview.objects.create(
+        product=product, name="A", rating=5, text="Text", is_approved=False
+    )
+    assert totals() == start
+
+    five.is_approved = True
+    five.save()
+    two = ProductReview.objects.create(
+        product=product, name="B", rating=2, text="Text", is_approved=True
+    )
+    assert totals() == (2, Decimal("3.50"), stars(s5=1, s2=1))
+
+    two.rating = 4
+    two.save()
+    assert totals() == (2, Decimal("4.50"), stars(s5=1, s4=1))
+
+    five.is_approved = False
+    five.save()
+    assert totals() == (1, Decimal("4.00"), stars(s4=1))
+
+    # edits of an unapproved review change nothing
+    five.rating = 1
+    five.save()
+    assert totals() == (1, Decimal("4.00"), stars(s4=1))
+
+    two.delete()
+    five.delete()
+    assert totals() == start
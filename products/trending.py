@@ -0,0 +1,215 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (
+    ExpressionWrapper,
+    F,
+    FloatField,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+    Window,
+)
+from django.db.models.functions import Coalesce, RowNumber
+from django.utils import timezone
+
+from .bulk import add_by
+from .models import ProductActivity, ProductCard, ProductRanking
+
+
+def window_start():
+    return timezone.localdate() - timedelta(days=settings.TRENDING_WINDOW_DAYS - 1)
+
+
+def _recent(field, since):
+    return Coalesce(
+        Subquery(
+            ProductActivity.objects
+            .filter(product=OuterRef("product_id"), day__gte=since)
+            .order_by()
+            .values("product")
+            .annotate(total=Sum(field))
+            .values("total")
+        ),
+        0,
+    )
+
+
+def scored_cards():
+    """
+    Cards annotated with ``trending_score``: all-time sales blended with
+    sales and views of the last TRENDING_WINDOW_DAYS days.
+    """
+    weights = settings.TRENDING_WEIGHTS
+    since = window_start()
+
+    return ProductCard.objects.annotate(
+        trending_score=ExpressionWrapper(
+            F("sold") * Value(weights["sold"])
+            + _recent("sold", since) * Value(weights["recent_sold"])
+            + _recent("views", since) * Value(weights["recent_views"]),
+            output_field=FloatField(),
+        )
+    )
+
+
+def refresh_trending():
+    """Recompute every ranking from scratch; returns the number of rows."""
+    size = settings.TRENDING_SIZE
+    scored = scored_cards()
+
+    top = (
+        scored
+        .order_by("-trending_score", "-product_id")
+        .values_list("product_id", "trending_score")[:size]
+    )
+    per_subcategory = (
+        scored
+        .filter(subcategory_id__isnull=False)
+        .annotate(row=Window(
+            RowNumber(),
+            partition_by=[F("subcategory_id")],
+            order_by=[F("trending_score").desc(), F("product_id").desc()],
+        ))
+        .filter(row__lte=size)
+        .values_list("subcategory_id", "product_id", "trending_score")
+    )
+
+    rankings = [
+        ProductRanking(subcategory_id=None, card_id=card_id, score=score)
+        for card_id, score in top
+    ] + [
+        ProductRanking(subcategory_id=subcategory_id, card_id=card_id, score=score)
+        for subcategory_id, card_id, score in per_subcategory
+    ]
+
+    with transaction.atomic():
+        ProductRanking.objects.all().delete()
+        ProductRanking.objects.bulk_create(rankings, batch_size=2000)
+
+    ProductActivity.objects.filter(day__lt=window_start()).delete()
+    return len(rankings)
+
+
+def has_ranking(subcategory_id=None):
+    return ProductRanking.objects.filter(subcategory_id=subcategory_id).exists()
+
+
+def _scopes(subcategory_ids):
+    """Rankings of ``subcategory_ids``, ``None`` being the overall one."""
+    scopes = Q(subcategory_id__in=[pk for pk in subcategory_ids if pk is not None])
+    if None in subcategory_ids:
+        scopes |= Q(subcategory_id__isnull=True)
+    return (
+        ProductRanking.objects
+        .filter(scopes)
+        .annotate(place=Window(
+            RowNumber(),
+            partition_by=[F("subcategory_id")],
+            order_by=[F("score").desc(), F("card_id").desc()],
+        ))
+    )
+
+
+def _offer(offers):
+    """
+    Insert ``[(subcategory_id, card_id, score)]`` into the rankings they
+    now qualify for, then cut those rankings back to TRENDING_SIZE.
+    """
+    size = settings.TRENDING_SIZE
+    subcategory_ids = {subcategory_id for subcategory_id, _, _ in offers}
+    floors = dict(
+        _scopes(subcategory_ids)
+        .filter(place=size)
+        .values_list("subcategory_id", "score")
+    )
+    rankings = [
+        ProductRanking(subcategory_id=subcategory_id, card_id=card_id, score=score)
+        for subcategory_id, card_id, score in offers
+        if subcategory_id not in floors or score > floors[subcategory_id]
+    ]
+    if not rankings:
+        return
+
+    ProductRanking.objects.bulk_create(rankings, ignore_conflicts=True)
+    overflow = list(
+        _scopes({ranking.subcategory_id for ranking in rankings})
+        .filter(place__gt=size)
+        .values_list("id", flat=True)
+    )
+    if overflow:
+        ProductRanking.objects.filter(id__in=overflow).delete()
+
+
+def record_trending_sales(counts):
+    """
+    Move sold products (``{product_id: quantity}``) up their rankings
+    without waiting for the next ``refresh_trending``, in a fixed number of
+    queries. Ranked rows get the score delta of the sale; rankings a
+    product is missing from get it when the new score beats their last
+    place.
+    """
+    weights = settings.TRENDING_WEIGHTS
+    deltas = {
+        product_id: quantity * (weights["sold"] + weights["recent_sold"])
+        for product_id, quantity in counts.items()
+    }
+
+    ranked = defaultdict(set)
+    for card_id, subcategory_id in (
+        ProductRanking.objects
+        .filter(card_id__in=deltas)
+        .values_list("card_id", "subcategory_id")
+    ):
+        ranked[card_id].add(subcategory_id)
+    if ranked:
+        ProductRanking.objects.filter(card_id__in=ranked).update(
+            score=F("score") + add_by(
+                "card_id",
+                {card_id: deltas[card_id] for card_id in ranked},
+                output_field=FloatField(),
+            )
+        )
+
+    missing = {
+        product_id: {None, subcategory_id} - ranked[product_id]
+        for product_id, subcategory_id in (
+            ProductCard.objects
+            .filter(product_id__in=deltas)
+            .values_list("product_id", "subcategory_id")
+        )
+    }
+    missing = {product_id: scopes for product_id, scopes in missing.items() if scopes}
+    if not missing:
+        return
+
+    scores = dict(
+        scored_cards()
+        .filter(product_id__in=missing)
+        .values_list("product_id", "trending_score")
+    )
+    _offer([
+        (subcategory_id, product_id, scores[product_id])
+        for product_id, scopes in missing.items()
+        for subcategory_id in scopes
+    ])
+
+
+def record_activity(field, counts):
+    """Add ``{product_id: delta}`` to today's ProductActivity ``field``."""
+    today = timezone.localdate()
+    # rows are created empty first so one UPDATE covers new and old days
+    ProductActivity.objects.bulk_create(
+        [ProductActivity(product_id=pk, day=today) for pk in counts],
+        ignore_conflicts=True,
+    )
+    ProductActivity.objects.filter(
+        product_id__in=counts,
+        day=today,
+    ).update(**{
+        field: F(field) + add_by("product_id", counts)
+    })
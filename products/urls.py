@@ -11,6 +11,8 @@ from .views import (
     CategoryRetrieveAPIView,
     BannersListAPIView,
     ProductSearchAPIView,
+    ViewBufferStatsAPIView,
+    ProductExportAPIView,
 )
 
 
@@ -32,6 +34,8 @@ urlpatterns = [
         name="subcategory-list",
     ),
     path("filters/", FilterListAPIView.as_view(), name="filter-list"),
+    path("metrics/view-buffer/", ViewBufferStatsAPIView.as_view()),
+    path("export/", ProductExportAPIView.as_view()),
     path("", ProductListAPIView.as_view()),
     path("<slug:slug>/", ProductDetailAPIView.as_view()),
     path("<slug:slug>/reviews/", ProductReviewListAPIView.as_view()),
@@ -0,0 +1,141 @@
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+
+from .services import record_product_views
+
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCounterBuffer:
+    """
+    Per-process write-behind buffer of product views.
+
+    ``add`` only bumps an in-memory counter; the counts are written in one
+    batch (``services.record_product_views``) when ``max_events`` views
+    piled up, every ``interval`` seconds from a daemon thread, and when
+    the worker exits. A failed batch is retried with the next flush unless
+    that would keep more than ``max_pending`` views, then it is counted
+    as dropped.
+    """
+
+    def __init__(self, interval, max_events, max_pending):
+        self.interval = interval
+        self.max_events = max_events
+        self.max_pending = max_pending
+
+        self._counts = Counter()
+        self._events = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer = None
+
+        self.metrics = {
+            "flushed": 0,
+            "flushes": 0,
+            "failures": 0,
+            "dropped": 0,
+        }
+
+    @property
+    def pending(self):
+        return self._events
+
+    def stats(self):
+        with self._lock:
+            return {**self.metrics, "pending": self._events}
+
+    def add(self, product_id, count=1):
+        with self._lock:
+            self._counts[product_id] += count
+            self._events += count
+            full = self._events >= self.max_events
+        self._ensure_timer()
+
+        if full:
+            self.flush()
+
+    def _take(self):
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+            events, self._events = self._events, 0
+        return counts, events
+
+    def _restore(self, counts, events):
+        with self._lock:
+            if self._events + events > self.max_pending:
+                self.metrics["dropped"] += events
+                logger.warning("View buffer full, dropped %s views", events)
+                return
+            self._counts.update(counts)
+            self._events += events
+
+    def flush(self):
+        # one writer at a time; concurrent callers leave it to the current one
+        if not self._flush_lock.acquire(blocking=False):
+            return
+
+        try:
+            counts, events = self._take()
+            if not counts:
+                return
+
+            try:
+                record_product_views(counts)
+            except Exception:
+                logger.exception("Flushing %s buffered views failed", events)
+                with self._lock:
+                    self.metrics["failures"] += 1
+                self._restore(counts, events)
+                return
+
+            with self._lock:
+                self.metrics["flushed"] += events
+                self.metrics["flushes"] += 1
+            logger.debug("Flushed %s views, %s", events, self.stats())
+        finally:
+            self._flush_lock.release()
+
+    def _ensure_timer(self):
+        if self._timer is not None:
+            return
+        with self._lock:
+            if self._timer is not None:
+                return
+            self._timer = threading.Thread(
+                target=self._run,
+                name="product-view-buffer",
+                daemon=True,
+            )
+            self._timer.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            finally:
+                connection.close()
+
+
+view_buffer = ViewCounterBuffer(
+    interval=settings.VIEW_BUFFER_FLUSH_INTERVAL,
+    max_events=settings.VIEW_BUFFER_MAX_EVENTS,
+    max_pending=settings.VIEW_BUFFER_MAX_PENDING,
+)
+
+atexit.register(view_buffer.flush)
+
+try:
+    # uWSGI workers skip atexit on reload
+    import uwsgi
+except ImportError:
+    pass
+else:
+    uwsgi.atexit = view_buffer.flush
@@ -1,39 +1,124 @@
+from datetime import datetime, time
+from decimal import Decimal
+
+import orjson
+from django.conf import settings
 from django.db.models import Min, Max
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.dateparse import parse_date, parse_datetime
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.exceptions import ValidationError
 from rest_framework.generics import ListAPIView, RetrieveAPIView, CreateAPIView
-from rest_framework.permissions import AllowAny
-from django.db.models import Sum, F
+from rest_framework.permissions import AllowAny, IsAdminUser
+from django.db.models import F, FilteredRelation
 from django.db.models import Q, Count, Case, When, IntegerField, Value
 
-from django.db.models.functions import Coalesce
 from django.db.models import Value
+from core.prefetch import PlannedQuerysetMixin
+from core.renderers import ORJSONRenderer
 from .models import (
     Product,
     Category,
     SubCategory,
     FilterType,
-    ProductStatistic,
     PromoBanner,
+    ProductCard,
+    ProductStatistic,
 )
 from .serializers import (
-    ProductSmallSerializer,
+    ProductCardSerializer,
     ProductBigSerializer,
     ProductReviewSerializer,
     ProductReview,
+    ReviewSummarySerializer,
     CategorySerializer,
+    CategoryListSerializer,
     SubCategorySerializer,
-    FilterTypeWithValuesSerializer,
+    SubCategoryListSerializer,
+    FilterTypeFacetSerializer,
     PromoBannerSerializer,
 )
-from rest_framework.pagination import PageNumberPagination
-
-
-class ProductPagination(PageNumberPagination):
-    page_size = 48
-    page_size_query_param = None
-    max_page_size = 48
+from .card_rows import CardRows
+from .facets import facet_counts, match_products
+from .pagination import ProductPagination, ReviewPagination, catalog_count_key
+from .search import search_products, subcategory_hits
+from .sideload import new_included, request_includes, side_load
+from .slugs import product_id_for_slug
+from .documents import load_document, with_origin
+from .export import CONTENT_TYPES, WRITERS, export_rows
+from .localization import localize, parse_fields, request_language, select_fields
+from .trending import has_ranking
+from .view_buffer import view_buffer
+
+
+def parse_updated_since(value):
+    """Aware datetime of an ISO date or datetime ``updated_since`` param."""
+    if not value:
+        return None
+    try:
+        moment = parse_datetime(value)
+        if moment is None and (day := parse_date(value)):
+            moment = datetime.combine(day, time.min)
+    except ValueError:
+        moment = None
+    if moment is None:
+        raise ValidationError({
+            "updated_since": "Expected an ISO 8601 date or datetime"
+        })
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def parse_filter_ids(value):
+    """Distinct FilterValue ids of a comma separated ``filters`` param."""
+    if not value:
+        return []
+    return sorted({int(f) for f in value.split(",") if f.isdigit()})
+
+
+def with_all_filters(filter_ids):
+    """Subquery of the ids of products having every given FilterValue."""
+    return (
+        Product.filters.through.objects
+        .filter(filtervalue_id__in=filter_ids)
+        .values("product_id")
+        .annotate(matched=Count("filtervalue_id"))
+        .filter(matched=len(filter_ids))
+        .values("product_id")
+    )
+
+
+class LocalizedViewMixin:
+    """
+    Hands the negotiated language (and ``?fields=`` where ``sparse_fields``,
+    ``?include=`` where ``side_loading``) to the serializers; responses
+    vary on Accept-Language.
+    """
+    sparse_fields = False
+    side_loading = False
+
+    def get_localization_context(self):
+        context = {"lang": request_language(self.request)}
+        if self.sparse_fields:
+            context["fields"] = parse_fields(self.request.query_params.get("fields"))
+        if self.side_loading:
+            context["include"] = request_includes(self.request)
+        return context
+
+    def get_serializer_context(self):
+        return {
+            **super().get_serializer_context(),
+            **self.get_localization_context(),
+        }
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        patch_vary_headers(response, ("Accept-Language",))
+        return response
 
 
 # class ProductListAPIView(ListAPIView):
@@ -91,7 +176,7 @@ class ProductPagination(PageNumberPagination):
 #         return qs.order_by("-created_at")
 
 
-class ProductSearchAPIView(APIView):
+class ProductSearchAPIView(LocalizedViewMixin, APIView):
     permission_classes = [AllowAny]
 
     def get(self, request):
@@ -103,7 +188,7 @@ class ProductSearchAPIView(APIView):
         q = query.strip()
 
         # -----------------------------
-        # 1. SubCategory relevance
+        # 1. SubCategory name relevance
         # -----------------------------
         subcategories = (
             SubCategory.objects
@@ -116,78 +201,95 @@ class ProductSearchAPIView(APIView):
                     default=Value(0),
                     output_field=IntegerField(),
                 ),
-                product_hits=Count(
-                    "product",
-                    filter=Q(product__name__icontains=q) |
-                           Q(product__name_ru__icontains=q),
-                    distinct=True,
-                ),
             )
-            .filter(
-                Q(name__icontains=q) |
-                Q(name_ru__icontains=q) |
-                Q(product__name__icontains=q) |
-                Q(product__name_ru__icontains=q)
-            )
-            .order_by("-relevance", "-product_hits")
-            .distinct()
+            .filter(relevance__gt=0)
         )
+        relevance = {
+            subcategory.id: subcategory.relevance
+            for subcategory in subcategories
+        }
+
+        # -----------------------------
+        # 2. Product hits per SubCategory (search index)
+        # -----------------------------
+        product_hits = dict(subcategory_hits(q))
 
-        best_subcategory = subcategories.first()
+        candidates = set(relevance) | set(product_hits)
+        if not candidates:
+            return Response(None)
 
+        best_subcategory_id = max(
+            candidates,
+            key=lambda pk: (relevance.get(pk, 0), product_hits.get(pk, 0)),
+        )
+        best_subcategory = (
+            SubCategory.objects
+            .select_related("category")
+            .get(id=best_subcategory_id)
+        )
 
-        return Response(SubCategorySerializer(best_subcategory).data if best_subcategory else None)
+        return Response(SubCategorySerializer(
+            best_subcategory,
+            context={"request": request, **self.get_localization_context()},
+        ).data)
 
 
-class ProductListAPIView(ListAPIView):
-    serializer_class = ProductSmallSerializer
+class ProductListAPIView(PlannedQuerysetMixin, LocalizedViewMixin, ListAPIView):
+    serializer_class = ProductCardSerializer
     permission_classes = [AllowAny]
     pagination_class = ProductPagination
+    sparse_fields = True
+    side_loading = True
+    keyset_ordering = None
+    count_cache_key = None
+
+    def list(self, request, *args, **kwargs):
+        context = self.get_serializer_context()
+        queryset = self.get_queryset()
+
+        if settings.CARD_ROWS_ENABLED:
+            # flat values() rows to cards, no model or serializer instances
+            cards = CardRows(context)
+            ordering = [field.lstrip("-") for field in self.keyset_ordering or ()]
+            page = self.paginate_queryset(
+                queryset.values(*dict.fromkeys([*cards.columns, *ordering]))
+            )
+            data = [cards(row) for row in page]
+            included = cards.included
+        else:
+            page = self.paginate_queryset(self.filter_queryset(queryset))
+            data = self.get_serializer(page, many=True, context=context).data
+            included = None
+            if "category" in context["include"]:
+                included = new_included()
+                data = [side_load(card, included) for card in data]
+
+        response = self.get_paginated_response(data)
+        # 🧩 ?include=category: each subcategory / category once per page
+        if included is not None:
+            response.data["included"] = included
+        return response
 
     def get_queryset(self):
         params = self.request.query_params
 
-        qs = (
-            Product.objects
-            .select_related("category", "statistics")
-            .prefetch_related("productimage_set", "filters")
-        )
-
-        # 🔥 HOME PAGE (TRENDING)
-        if params.get("home") in {"1", "true", "True"}:
-            return qs.order_by("-statistics__sold")
+        # 🃏 cards are a single table: no joins, no per-row image queries
+        qs = ProductCard.objects.all()
 
         subcategory_slug = params.get("subcategory")
         search = params.get("search")
 
+        # 🔥 HOME PAGE (TRENDING)
+        if params.get("home") in {"1", "true", "True"}:
+            return self.get_trending_queryset(qs, subcategory_slug)
+
         if not subcategory_slug and not search:
             raise ValidationError({
                 "detail": "Either 'subcategory' or 'search' query param is required"
             })
 
-        # 🔍 SEARCH FLOW → resolve closest subcategory
-        if search:
-            subcategory = (
-                SubCategory.objects
-                .annotate(
-                    relevance=Case(
-                        When(name__iexact=search, then=3),
-                        When(name_ru__iexact=search, then=3),
-                        When(name__icontains=search, then=2),
-                        When(name_ru__icontains=search, then=2),
-                        default=0,
-                    )
-                )
-                .filter(relevance__gt=0)
-                .order_by("-relevance")
-                .first()
-            )
-
-            if not subcategory:
-                return Product.objects.none()
-
         # 📂 SUBCATEGORY FLOW
-        else:
+        if subcategory_slug:
             subcategory = SubCategory.objects.filter(
                 slug=subcategory_slug
             ).first()
@@ -197,171 +299,349 @@ class ProductListAPIView(ListAPIView):
                     "subcategory": "Invalid subcategory slug"
                 })
 
-        qs = qs.filter(category=subcategory)
+            qs = qs.filter(subcategory_id=subcategory.id)
 
-        # 🧩 FILTER VALUES (AND logic)
-        filters = params.get("filters")
-        if filters:
-            filter_ids = [int(f) for f in filters.split(",") if f.isdigit()]
+        # 🔍 SEARCH FLOW → ranked products from the search index
+        if search:
+            qs = search_products(search, qs, document="product__search_document")
 
-            if filter_ids:
-                qs = (
-                    qs.filter(filters__id__in=filter_ids)
-                    .annotate(
-                        matched_filters=Count(
-                            "filters",
-                            filter=Q(filters__id__in=filter_ids),
-                            distinct=True,
-                        )
-                    )
-                    .filter(matched_filters=len(filter_ids))
-                )
-
-        # 💰 PRICE FILTER
+        filter_ids = parse_filter_ids(params.get("filters"))
         price_min = params.get("price_min")
-        if price_min:
-            qs = qs.filter(price__gte=price_min)
-
         price_max = params.get("price_max")
-        if price_max:
-            qs = qs.filter(price__lte=price_max)
 
-        return qs.order_by("-created_at")
+        matched_ids = None
+        if filter_ids and subcategory_slug:
+            matched_ids = match_products(
+                subcategory, filter_ids, price_min, price_max
+            )
 
-class ProductDetailAPIView(RetrieveAPIView):
-    serializer_class = ProductBigSerializer
-    permission_classes = [AllowAny]
-    lookup_field = "slug"
+        if matched_ids is not None:
+            # facet index: filters and price bounds resolved in memory
+            qs = qs.filter(product_id__in=matched_ids)
+        else:
+            # 🧩 FILTER VALUES (AND logic)
+            if filter_ids:
+                qs = qs.filter(product_id__in=with_all_filters(filter_ids))
 
-    def get_queryset(self):
-        return (
-            Product.objects
-            .select_related(
-                "category",
-                "statistics",
-            )
-            .prefetch_related(
-                "filters",
-                "productimage_set",
-                "productproperty_set",
-                "productdescriptionitem_set",
+            # 💰 PRICE FILTER
+            if price_min:
+                qs = qs.filter(price__gte=price_min)
+
+            if price_max:
+                qs = qs.filter(price__lte=price_max)
+
+        self.count_cache_key = catalog_count_key(
+            subcategory=subcategory_slug,
+            search=search.strip().lower() if search else None,
+            filters=filter_ids,
+            price_min=price_min or None,
+            price_max=price_max or None,
+        )
+
+        if search:
+            return qs.order_by("-search_rank", "-created_at", "-product_id")
+
+        # ⏩ keyset (cursor) pagination on (created_at, id)
+        self.keyset_ordering = ("-created_at", "-product_id")
+        return qs.order_by(*self.keyset_ordering)
+
+    def get_trending_queryset(self, qs, subcategory_slug=None):
+        subcategory_id = None
+        if subcategory_slug:
+            subcategory_id = (
+                SubCategory.objects
+                .filter(slug=subcategory_slug)
+                .values_list("id", flat=True)
+                .first()
             )
+            if subcategory_id is None:
+                raise ValidationError({
+                    "subcategory": "Invalid subcategory slug"
+                })
+            qs = qs.filter(subcategory_id=subcategory_id)
+
+        self.count_cache_key = catalog_count_key(
+            home=True,
+            subcategory=subcategory_slug,
         )
 
-    def get_object(self):
-        product = super().get_object()
+        # rankings not computed yet → all-time sales straight from the cards
+        if not has_ranking(subcategory_id):
+            self.keyset_ordering = ("-sold", "-product_id")
+            return qs.order_by(*self.keyset_ordering)
 
-        ProductStatistic.objects.filter(
-            product=product
-        ).update(
-            views=F("views") + 1
+        # 📈 precomputed top list (see products/trending.py)
+        self.keyset_ordering = ("-trending_score", "-product_id")
+        return (
+            qs
+            .annotate(ranking=FilteredRelation(
+                "rankings",
+                condition=Q(rankings__subcategory_id=subcategory_id),
+            ))
+            .filter(ranking__isnull=False)
+            .annotate(trending_score=F("ranking__score"))
+            .order_by(*self.keyset_ordering)
         )
 
-        return product
 
+class ProductDetailAPIView(LocalizedViewMixin, RetrieveAPIView):
+    serializer_class = ProductBigSerializer
+    permission_classes = [AllowAny]
+    lookup_field = "slug"
+    sparse_fields = True
+
+    def retrieve(self, request, *args, **kwargs):
+        shape = self.get_localization_context()
+
+        # 📄 prebuilt document, only the statistics are read per request
+        document = load_document(kwargs[self.lookup_field])
+        if document is None:
+            raise Http404
+
+        product_id, body = document
+        body = with_origin(body, f"{request.scheme}://{request.get_host()}")
+
+        # 🌐 the document holds both languages and every field; reshape
+        # it only when asked to
+        if shape["lang"] or shape["fields"]:
+            data = orjson.loads(body)
+            if shape["lang"]:
+                data = localize(data, shape["lang"])
+            if shape["fields"]:
+                data = select_fields(data, shape["fields"])
+            body = ORJSONRenderer().render(data)
+
+        view_buffer.add(product_id)
+
+        response = HttpResponse(body, content_type="application/json")
+        patch_cache_control(
+            response,
+            public=True,
+            max_age=settings.PRODUCT_DETAIL_CACHE_TIMEOUT,
+        )
+        return response
 
-class ProductReviewListAPIView(ListAPIView):
+
+class ProductReviewListAPIView(PlannedQuerysetMixin, ListAPIView):
+    """
+    Approved reviews of a product, newest first, ``?cursor=`` paginated.
+    The first page starts with the review summary.
+    """
     permission_classes = [AllowAny]
     serializer_class = ProductReviewSerializer
+    pagination_class = ReviewPagination
+    keyset_ordering = ("-created_at", "-id")
+
+    def get_product_id(self):
+        if not hasattr(self, "_product_id"):
+            self._product_id = product_id_for_slug(self.kwargs["slug"])
+            if self._product_id is None:
+                raise Http404
+        return self._product_id
+
+    def get_statistic(self):
+        """The product's rating row (running review totals)."""
+        if not hasattr(self, "_statistic"):
+            self._statistic = ProductStatistic.objects.filter(
+                product_id=self.get_product_id()
+            ).first()
+        return self._statistic
 
     def get_queryset(self):
         return (
             ProductReview.objects
             .filter(
-                product__slug=self.kwargs["slug"],
-                rating__gte=4,
+                product_id=self.get_product_id(),
+                is_approved=True,
             )
-            .order_by("-created_at")[:10]
+            .order_by(*self.keyset_ordering)
         )
 
+    def get_summary(self):
+        statistic = self.get_statistic()
+        if statistic is None:
+            return None
+        return ReviewSummarySerializer(statistic).data
+
 
 class ProductReviewCreateAPIView(CreateAPIView):
     serializer_class = ProductReviewSerializer
     permission_classes = [AllowAny]
 
     def perform_create(self, serializer):
-        product = Product.objects.get(slug=self.kwargs["slug"])
-        serializer.save(product=product)
+        product_id = product_id_for_slug(self.kwargs["slug"])
+        if product_id is None:
+            raise Http404
+        serializer.save(product_id=product_id)
+
+
+class ProductExportAPIView(APIView):
+    """
+    Whole catalog as NDJSON (default) or CSV (``?output=csv``), streamed
+    row by row from a server-side cursor; ``updated_since`` limits it to
+    products changed since then.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        output = request.query_params.get("output", "ndjson")
+        if output not in WRITERS:
+            raise ValidationError({"output": f"One of {', '.join(sorted(WRITERS))}"})
+        updated_since = parse_updated_since(request.query_params.get("updated_since"))
+
+        response = StreamingHttpResponse(
+            WRITERS[output](export_rows(updated_since)),
+            content_type=CONTENT_TYPES[output],
+        )
+        response["Content-Disposition"] = f'attachment; filename="products.{output}"'
+        return response
+
+
+class ViewBufferStatsAPIView(APIView):
+    """Pending, flushed and dropped view counts of the serving worker."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(view_buffer.stats())
 
 
-class CategoryListAPIView(ListAPIView):
+class CategoryListAPIView(PlannedQuerysetMixin, LocalizedViewMixin, ListAPIView):
     queryset = Category.objects.all()
-    serializer_class = CategorySerializer
+    serializer_class = CategoryListSerializer
     permission_classes = [AllowAny]
 
     def get_queryset(self):
-        queryset = Category.objects.annotate(
-                _views=Coalesce(
-                    Sum("subcategory__product__statistics__views"),
-                    Value(0),
-                )
-            ).order_by("-_views")
+        # 📊 popularity comes from the rollup rows (products/rollups.py)
+        queryset = (
+            Category.objects
+            .order_by(F("statistics__views").desc(nulls_last=True), "id")
+        )
         if self.request.query_params.get("home"):
             queryset = queryset[:10]
         return queryset
 
 
-class SubCategoryListAPIView(ListAPIView):
-    serializer_class = SubCategorySerializer
+class SubCategoryListAPIView(PlannedQuerysetMixin, LocalizedViewMixin, ListAPIView):
+    serializer_class = SubCategoryListSerializer
 
     def get_queryset(self):
         return (
             SubCategory.objects
             .filter(category__slug=self.kwargs["slug"])
-            .annotate(
-                _views=Coalesce(
-                    Sum("product__statistics__views"),
-                    Value(0),
-                )
-            )
-            .order_by("-_views")
+            .order_by(F("statistics__views").desc(nulls_last=True), "id")
         )
 
 
-class FilterListAPIView(APIView):
+class FilterListAPIView(LocalizedViewMixin, APIView):
+    """
+    Filters of the subcategory's category with live match counts.
+
+    Accepts the ``filters``/``price_min``/``price_max`` params of
+    ProductListAPIView; every value carries the number of products the
+    selection would return with it added, values (and filter types)
+    without products are hidden. ``min_price``/``max_price`` describe the
+    filter selection regardless of the price bounds.
+    """
     permission_classes = [AllowAny]
 
     def get(self, request):
-        subcategory_slug = request.query_params.get("subcategory")
+        params = request.query_params
+        subcategory_slug = params.get("subcategory")
         if not subcategory_slug:
             raise ValidationError({
                 "subcategory": "This query param is required (category=<slug>)"
             })
 
-        subcategory = SubCategory.objects.filter(
-            slug=subcategory_slug
-        ).first()
-        category = subcategory.category
+        subcategory = (
+            SubCategory.objects
+            .select_related("category")
+            .filter(slug=subcategory_slug)
+            .first()
+        )
 
-        if not category:
+        if not subcategory or not subcategory.category:
             raise ValidationError({
                 "subcategory": "Invalid subcategory slug"
             })
 
+        filter_ids = parse_filter_ids(params.get("filters"))
+        price_min = params.get("price_min") or None
+        price_max = params.get("price_max") or None
+
+        # one pass over the facet index, or one grouped query
+        facets = facet_counts(subcategory, filter_ids, price_min, price_max)
+        if facets is None:
+            facets = self.count_with_orm(
+                subcategory, filter_ids, price_min, price_max
+            )
+        counts, (min_price, max_price) = facets
+
         filters = (
             FilterType.objects
-            .filter(category=category)
+            .filter(category=subcategory.category)
             .prefetch_related("filtervalue_set")
             .order_by("id")
         )
+        data = FilterTypeFacetSerializer(
+            filters,
+            many=True,
+            context={"counts": counts, **self.get_localization_context()},
+        ).data
 
-        price = (
-            Product.objects
-            .filter(category=subcategory)
-            .aggregate(
+        return Response({
+            "min_price": self.as_price(min_price),
+            "max_price": self.as_price(max_price),
+            "filters": [item for item in data if item["values"]],
+        })
+
+    @staticmethod
+    def as_price(value):
+        if value is None:
+            return None
+        return Decimal(value).quantize(Decimal("0.01"))
+
+    @staticmethod
+    def count_with_orm(subcategory, filter_ids, price_min, price_max):
+        """
+        Counts per FilterValue and the price range in a single grouped
+        query; the ``filters=None`` group covers products without values.
+        """
+        products = Product.objects.filter(category=subcategory)
+
+        if filter_ids:
+            products = products.filter(id__in=with_all_filters(filter_ids))
+
+        in_bounds = Q()
+        if price_min:
+            in_bounds &= Q(price__gte=price_min)
+        if price_max:
+            in_bounds &= Q(price__lte=price_max)
+
+        rows = (
+            products
+            .order_by()
+            .values("filters")
+            .annotate(
+                count=Count("id", filter=in_bounds),
                 min_price=Min("price"),
                 max_price=Max("price"),
             )
         )
 
-        return Response({
-            "min_price": price["min_price"],
-            "max_price": price["max_price"],
-            "filters": FilterTypeWithValuesSerializer(filters, many=True).data,
-        })
+        counts = {}
+        min_price = max_price = None
+        for row in rows:
+            if row["filters"] is not None and row["count"]:
+                counts[row["filters"]] = row["count"]
+            if min_price is None or row["min_price"] < min_price:
+                min_price = row["min_price"]
+            if max_price is None or row["max_price"] > max_price:
+                max_price = row["max_price"]
+
+        return counts, (min_price, max_price)
 
 
-class CategoryRetrieveAPIView(RetrieveAPIView):
+class CategoryRetrieveAPIView(PlannedQuerysetMixin, LocalizedViewMixin, RetrieveAPIView):
     serializer_class = CategorySerializer
     lookup_field = "slug"
 
@@ -369,7 +649,7 @@ class CategoryRetrieveAPIView(RetrieveAPIView):
         return Category.objects.all()
 
 
-class SubCategoryRetrieveAPIView(RetrieveAPIView):
+class SubCategoryRetrieveAPIView(PlannedQuerysetMixin, LocalizedViewMixin, RetrieveAPIView):
     serializer_class = SubCategorySerializer
     lookup_field = "slug"
 
@@ -377,7 +657,7 @@ class SubCategoryRetrieveAPIView(RetrieveAPIView):
         return SubCategory.objects.all()
 
 
-class BannersListAPIView(ListAPIView):
+class BannersListAPIView(PlannedQuerysetMixin, LocalizedViewMixin, ListAPIView):
     serializer_class = PromoBannerSerializer
     model = PromoBanner
     queryset = PromoBanner.objects.all()
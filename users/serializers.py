@@ -7,7 +7,7 @@ from rest_framework.serializers import (
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.contrib.auth import get_user_model
 from orders.models import Wishlist
-from products.serializers import ProductSmallSerializer
+from products.serializers import ProductCardSerializer
 
 User = get_user_model()
 
@@ -85,7 +85,7 @@ class RegisterSerializer(ModelSerializer):
 
 
 class WishlistSerializer(ModelSerializer):
-    product = ProductSmallSerializer()
+    product = ProductCardSerializer()
 
     class Meta:
         model = Wishlist
@@ -1,3 +1,76 @@
-from django.test import TestCase
+import pytest
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from orders.models import Wishlist
+from products.models import Product, ProductCard
+from products.synthetic import generate_catalog
+from users.models import User
+
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def client():
+    return APIClient()
+
+
+def test_wishlist_query_budget(client, query_budget):
+    user = User.objects.create_user(username="buyer", password="secret")
+    client.force_authenticate(user)
+    generate_catalog(products=10, categories=1, subcategories=1, seed=3)
+    Wishlist.objects.bulk_create(
+        Wishlist(user=user, product=product) for product in Product.objects.all()
+    )
+
+    with query_budget("WishlistListAPIView"):
+        response = client.get("/api/users/wishlist/")
+    assert response.status_code == 200
+
+
+def test_wishlist_card_rows_match_serializer(client, settings):
+    user = User.objects.create_user(username="buyer", password="secret")
+    client.force_authenticate(user)
+    generate_catalog(products=10, categories=1, subcategories=1, seed=3)
+    Wishlist.objects.bulk_create(
+        Wishlist(user=user, product=product) for product in Product.objects.all()
+    )
+    # a product whose card is not built yet falls back to the serializer
+    ProductCard.objects.filter(product=Product.objects.first()).delete()
+
+    settings.CARD_ROWS_ENABLED = True
+    fast = client.get("/api/users/wishlist/")
+    settings.CARD_ROWS_ENABLED = False
+    slow = client.get("/api/users/wishlist/")
+    assert len(fast.json()) == 10
+    assert fast.content == slow.content
+
+    settings.CARD_ROWS_ENABLED = True
+    fast = client.get("/api/users/wishlist/", {"include": "category"})
+    settings.CARD_ROWS_ENABLED = False
+    slow = client.get("/api/users/wishlist/", {"include": "category"})
+    assert len(fast.json()["included"]["subcategories"]) == 1
+    assert fast.content == slow.content
+
+
+def test_token_responses_are_not_compressed(client, settings):
+    settings.COMPRESSION_MIN_SIZE = 0
+    User.objects.create_user(username="buyer", password="secret")
+
+    login = client.post(
+        "/api/users/login/",
+        {"username": "buyer", "password": "secret"},
+        format="json",
+        HTTP_ACCEPT_ENCODING="br, gzip",
+    )
+    assert login.status_code == 200
+    assert not login.has_header("Content-Encoding")
+
+    refresh = client.post(
+        "/api/users/refresh/",
+        {"refresh": login.json()["refresh"]},
+        format="json",
+        HTTP_ACCEPT_ENCODING="br, gzip",
+    )
+    assert refresh.status_code == 200
+    assert not refresh.has_header("Content-Encoding")
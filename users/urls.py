@@ -1,11 +1,10 @@
 from django.urls import path
-from rest_framework_simplejwt.views import TokenRefreshView
-from .views import LoginAPIView, RegisterAPIView, MeAPIView, WishlistAddAPIView, WishlistRemoveAPIView, ChangePasswordAPIView, WishlistListAPIView
+from .views import LoginAPIView, RefreshAPIView, RegisterAPIView, MeAPIView, WishlistAddAPIView, WishlistRemoveAPIView, ChangePasswordAPIView, WishlistListAPIView
 
 urlpatterns = [
     path("register/", RegisterAPIView.as_view(), name="auth-register"),
     path("login/", LoginAPIView.as_view(), name="auth-login"),
-    path("refresh/", TokenRefreshView.as_view(), name="auth-refresh"),
+    path("refresh/", RefreshAPIView.as_view(), name="auth-refresh"),
 path(
         "change-password/",
         ChangePasswordAPIView.as_view(),
@@ -1,11 +1,15 @@
+from django.conf import settings
+from core.prefetch import PlannedQuerysetMixin
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.generics import CreateAPIView, RetrieveUpdateAPIView, ListAPIView
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from orders.models import Wishlist
+from products.card_rows import CardRows
 from products.models import Product
+from products.sideload import new_included, request_includes, side_load_items
 
 
 from .serializers import RegisterSerializer, LoginSerializer, ProfileSerializer, ChangePasswordSerializer, WishlistSerializer
@@ -18,6 +22,12 @@ class RegisterAPIView(CreateAPIView):
 
 class LoginAPIView(TokenObtainPairView):
     serializer_class = LoginSerializer
+    # tokens next to the submitted username: no compression (BREACH)
+    compress_response = False
+
+
+class RefreshAPIView(TokenRefreshView):
+    compress_response = False
 
 
 class MeAPIView(RetrieveUpdateAPIView):
@@ -83,12 +93,45 @@ class WishlistAddAPIView(APIView):
         )
 
 
-class WishlistListAPIView(ListAPIView):
+class WishlistListAPIView(PlannedQuerysetMixin, ListAPIView):
     serializer_class = WishlistSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Wishlist.objects.filter(user=self.request.user)
+        return (
+            Wishlist.objects
+            .filter(user=self.request.user)
+            .order_by("id")
+        )
+
+    def list(self, request, *args, **kwargs):
+        include = request_includes(request)
+
+        if settings.CARD_ROWS_ENABLED:
+            # cards straight from values() rows (products/card_rows.py)
+            cards = CardRows(
+                {**self.get_serializer_context(), "include": include},
+                prefix="product__card__",
+                product_column="product_id",
+            )
+            rows = self.get_queryset().values("id", "product_id", *cards.columns)
+            data = [
+                {"id": row["id"], "product": cards(row)}
+                for row in rows
+            ]
+            included = cards.included
+        else:
+            queryset = self.filter_queryset(self.get_queryset())
+            data = self.get_serializer(queryset, many=True).data
+            included = None
+            if "category" in include:
+                included = new_included()
+                data = side_load_items(data, included)
+
+        # 🧩 ?include=category: the items and their taxonomy once
+        if included is not None:
+            return Response({"results": data, "included": included})
+        return Response(data)
 
 
 class WishlistRemoveAPIView(APIView):